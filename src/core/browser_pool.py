@@ -0,0 +1,202 @@
+"""
+跨用户共享的 Chromium 浏览器与上下文池
+
+任务进程只启动一个长期存活的 Chromium，各用户的扫描从池中借出一个 BrowserContext：
+- 同一时刻每个用户独占一个上下文；归还时关闭其所有页面并清空 Cookie，供下一个用户复用
+  (复用可保留已建立的连接与页面脚本编译缓存，省去冷启动)
+- 归还时检查浏览器进程树的常驻内存，超过阈值才关闭该上下文，由下次借出时重新创建
+- 新建的上下文按 resource_profile 挂载 ResourceBlocker (默认 "x-scan")，不加载扫描用不到的图片、视频与字体
+- read_page_metrics 采样单个页面的 JS 堆与 DOM 节点数，供长时间滚动的扫描判断是否换新页面
+- 可注入任务已有的浏览器 (如夸克上传器使用的浏览器)，此时池不负责关闭浏览器；
+  未注入时在首次借出时才启动 Playwright，免浏览器模式下不会产生任何浏览器开销
+"""
+
+import os
+import asyncio
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from core.resource_blocker import ResourceBlocker
+
+
+def default_memory_limit_mb() -> int:
+    """上下文回收的内存阈值 (环境变量 X_BROWSER_MEMORY_LIMIT_MB，默认 1536)"""
+    return int(os.getenv("X_BROWSER_MEMORY_LIMIT_MB", "1536"))
+
+
+def process_tree_rss_mb(root_pid: int = None) -> float | None:
+    """
+    统计当前进程所有子孙进程 (Playwright 驱动与 Chromium) 的常驻内存，单位 MB。
+    依赖 Linux 的 /proc；无法读取时返回 None。
+    """
+    root_pid = root_pid or os.getpid()
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+
+    children = {}
+    rss_kb = {}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            continue
+        children.setdefault(int(fields.get("PPid", "0").strip() or 0), []).append(pid)
+        rss_kb[pid] = int(fields.get("VmRSS", "0 kB").split()[0])
+
+    total = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        total += rss_kb.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total / 1024
+
+
+def default_page_heap_limit_mb() -> int:
+    """单个页面 JS 堆的回收阈值 (环境变量 X_PAGE_HEAP_LIMIT_MB，默认 512)"""
+    return int(os.getenv("X_PAGE_HEAP_LIMIT_MB", "512"))
+
+
+PAGE_MEMORY_SCRIPT = """
+() => ({
+  heap: performance.memory ? performance.memory.usedJSHeapSize : null,
+  nodes: document.getElementsByTagName('*').length,
+})
+"""
+
+
+async def read_page_metrics(page) -> dict | None:
+    """
+    读取页面的 JS 堆占用 (MB) 与 DOM 节点数: {"heap_mb": ..., "nodes": ...}。
+    优先使用 CDP Performance.getMetrics；非 Chromium 或 CDP 不可用时退回页面内的 performance.memory，
+    均失败时返回 None。
+    """
+    try:
+        session = await page.context.new_cdp_session(page)
+        try:
+            await session.send("Performance.enable")
+            result = await session.send("Performance.getMetrics")
+        finally:
+            await session.detach()
+        metrics = {m["name"]: m["value"] for m in result.get("metrics", [])}
+        return {"heap_mb": metrics.get("JSHeapUsedSize", 0) / 1024 / 1024, "nodes": int(metrics.get("Nodes", 0))}
+    except Exception:
+        pass
+    try:
+        sample = await page.evaluate(PAGE_MEMORY_SCRIPT)
+    except Exception:
+        return None
+    heap = sample.get("heap")
+    return {"heap_mb": heap / 1024 / 1024 if heap is not None else 0.0, "nodes": int(sample.get("nodes") or 0)}
+
+
+class BrowserPool:
+    """长期存活的浏览器及可复用的上下文池"""
+
+    LAUNCH_ARGS = ['--disable-blink-features=AutomationControlled', '--no-sandbox', '--disable-dev-shm-usage']
+    CONTEXT_OPTIONS = {"viewport": {"width": 1920, "height": 1080}}
+
+    def __init__(self, browser=None, memory_limit_mb: int = None, context_options: dict = None,
+                 resource_profile: str | None = "x-scan"):
+        """
+        Args:
+            browser: 任务已启动的 Playwright Browser；不传时由池在首次使用时自行启动并在 close() 时关闭
+            memory_limit_mb: 浏览器进程树内存超过该值时回收归还的上下文，默认读取 X_BROWSER_MEMORY_LIMIT_MB
+            context_options: 新建上下文的参数，默认 1920x1080 视口
+            resource_profile: 新建上下文使用的资源拦截配置 (见 core.resource_blocker.PROFILES)，None 表示不拦截
+        """
+        self._browser = browser
+        self._owns_browser = browser is None
+        self._playwright = None
+        self.memory_limit_mb = memory_limit_mb or default_memory_limit_mb()
+        self.context_options = context_options or self.CONTEXT_OPTIONS
+        self.blocker = ResourceBlocker(resource_profile) if resource_profile else None
+        self._idle = []
+        self._launch_lock = asyncio.Lock()
+        self.stats = {"created": 0, "reused": 0, "recycled": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _ensure_browser(self):
+        async with self._launch_lock:
+            if self._browser is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True, args=self.LAUNCH_ARGS)
+
+    async def get_browser(self):
+        """返回池使用的浏览器 (必要时启动)，供任务创建不参与复用的专用上下文"""
+        await self._ensure_browser()
+        return self._browser
+
+    async def acquire(self):
+        """借出一个上下文，优先复用空闲上下文"""
+        await self._ensure_browser()
+        if self._idle:
+            self.stats["reused"] += 1
+            return self._idle.pop()
+        self.stats["created"] += 1
+        context = await self._browser.new_context(**self.context_options)
+        if self.blocker:
+            await self.blocker.attach(context)
+        return context
+
+    async def release(self, context):
+        """归还上下文：关闭页面、清空 Cookie；内存超过阈值时直接关闭"""
+        try:
+            for page in list(context.pages):
+                await page.close()
+            await context.clear_cookies()
+        except Exception as e:
+            print(f"  ⚠️ 浏览器上下文清理失败，将直接关闭: {e}")
+            await self._close_context(context)
+            return
+
+        rss_mb = process_tree_rss_mb()
+        if rss_mb is not None and rss_mb > self.memory_limit_mb:
+            print(f"  ♻️ 浏览器内存 {rss_mb:.0f} MB 超过阈值 {self.memory_limit_mb} MB，回收上下文")
+            self.stats["recycled"] += 1
+            await self._close_context(context)
+            return
+        self._idle.append(context)
+
+    @asynccontextmanager
+    async def context(self):
+        """
+        借出上下文的便捷写法:
+            async with pool.context() as context:
+                ...
+        """
+        context = await self.acquire()
+        try:
+            yield context
+        finally:
+            await self.release(context)
+
+    @staticmethod
+    async def _close_context(context):
+        try:
+            await context.close()
+        except Exception:
+            pass
+
+    async def close(self):
+        """关闭空闲上下文；浏览器由池自行启动时一并关闭"""
+        if self.blocker:
+            self.blocker.report()
+        while self._idle:
+            await self._close_context(self._idle.pop())
+        if self._owns_browser:
+            if self._browser is not None:
+                await self._browser.close()
+                self._browser = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
@@ -0,0 +1,177 @@
+"""
+并发下载工作池
+
+GalleryDlPool 把推文 URL 切成若干批，每批交给一个 gallery-dl 子进程 (asyncio.create_subprocess_exec)，
+多批并发执行；按目标主机限制并发数，失败的 URL 以指数退避重试，
+并通过 DownloadProgress 统计文件数与字节数的吞吐速率。
+gallery-dl 以 --write-metadata 为每个文件写出元数据，进程池据此为每个文件产出 MediaItem 清单记录。
+"""
+
+import os
+import time
+import asyncio
+import itertools
+from urllib.parse import urlparse
+
+from core.media_manifest import MediaItem, read_gallery_dl_metadata
+
+
+class DownloadProgress:
+    """下载进度计数器：累计文件数与字节数，按间隔打印速率"""
+
+    def __init__(self, label: str, report_interval: float = 10.0):
+        self.label = label
+        self.report_interval = report_interval
+        self.files = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    def add_file(self, size: int):
+        self.files += 1
+        self.bytes += size
+        now = time.monotonic()
+        if now - self._last_report >= self.report_interval:
+            self._last_report = now
+            self.report()
+
+    def report(self, final: bool = False):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        mark = "📦 下载完成" if final else "📦 下载进度"
+        print(f"  {mark} [{self.label}]: {self.files} 个文件 / {self.bytes / 1024 / 1024:.1f} MB | "
+              f"{self.files / elapsed:.2f} 个/s, {self.bytes / 1024 / 1024 / elapsed:.2f} MB/s")
+
+
+class HostLimiter:
+    """按主机名分配信号量，限制同一主机的并发数"""
+
+    def __init__(self, per_host_limit: int):
+        self.per_host_limit = per_host_limit
+        self._semaphores = {}
+
+    def __call__(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).hostname or ""
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._semaphores[host]
+
+
+def default_concurrency() -> int:
+    """单主机默认并发数 (环境变量 X_DOWNLOAD_CONCURRENCY，默认 3)"""
+    return int(os.getenv("X_DOWNLOAD_CONCURRENCY", "3"))
+
+
+class GalleryDlPool:
+    """以有界并发运行多个批量 gallery-dl 进程"""
+
+    def __init__(self, directory: str, work_dir: str, label: str, cookie_file: str = None,
+                 per_host_limit: int = None, max_retries: int = 2, backoff_seconds: float = 5.0, on_file=None,
+                 filter_expression: str = None):
+        """
+        Args:
+            directory: gallery-dl 的 --directory 下载目录
+            work_dir: 存放批次 URL 列表/错误列表的目录 (不能在下载目录内)
+            label: 日志标识 (通常是用户名)
+            cookie_file: Netscape 格式 Cookie 文件
+            per_host_limit: 同一主机的并发进程数，默认读取环境变量 X_DOWNLOAD_CONCURRENCY (默认 3)
+            max_retries: 失败 URL 的最大重试轮数
+            backoff_seconds: 重试退避基数，第 n 轮等待 backoff_seconds * 2^(n-1) 秒
+            on_file: 每个文件下载完成后调用的协程函数 on_file(item: MediaItem)；
+                     其未返回前不再读取 gallery-dl 输出，下游处理慢时会自然反压下载
+            filter_expression: gallery-dl --filter 表达式 (媒体筛选策略)，不满足的文件不下载
+        """
+        self.directory = directory
+        self.work_dir = work_dir
+        self.label = label
+        self.cookie_file = cookie_file
+        self.per_host_limit = per_host_limit or default_concurrency()
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.progress = DownloadProgress(label)
+        self._host_limiter = HostLimiter(self.per_host_limit)
+        self._batch_ids = itertools.count(1)
+        self.on_file = on_file
+        self.filter_expression = filter_expression
+
+    def _split_batches(self, urls: list) -> list:
+        """按主机分组后每组均分为 per_host_limit 批，使每个并发槽位恰好领到一批"""
+        by_host = {}
+        for url in urls:
+            by_host.setdefault(urlparse(url).hostname or "", []).append(url)
+        batches = []
+        for host_urls in by_host.values():
+            size = -(-len(host_urls) // self.per_host_limit)
+            batches.extend(host_urls[i:i + size] for i in range(0, len(host_urls), size))
+        return batches
+
+    async def run(self, urls: list) -> dict:
+        """下载全部 URL，返回 {url: 是否成功}"""
+        pending = list(urls)
+        failed = set()
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self.backoff_seconds * 2 ** (attempt - 1)
+                print(f"  🔁 [{self.label}] {len(pending)} 条推文下载失败，{delay:.0f}s 后第 {attempt} 次重试...")
+                await asyncio.sleep(delay)
+
+            results = await asyncio.gather(*(self._run_batch(batch) for batch in self._split_batches(pending)))
+            failed = set().union(*results) if results else set()
+            pending = [url for url in pending if url in failed]
+            if not pending:
+                break
+
+        self.progress.report(final=True)
+        if failed:
+            print(f"⚠️ [{self.label}] {len(failed)}/{len(urls)} 条推文下载失败:")
+            for url in sorted(failed):
+                print(f"    ❌ {url}")
+        return {url: url not in failed for url in urls}
+
+    async def _run_batch(self, urls: list) -> set:
+        """
+        把一批 URL 通过 --input-file 交给单个 gallery-dl 进程，
+        从标准输出逐行读取已下载文件以统计进度，返回 --error-file 中记录的失败 URL。
+        """
+        async with self._host_limiter(urls[0]):
+            batch_prefix = os.path.join(self.work_dir, f".{self.label}_batch{next(self._batch_ids)}")
+            input_file = f"{batch_prefix}_urls.txt"
+            error_file = f"{batch_prefix}_errors.txt"
+            with open(input_file, "w", encoding="utf-8") as f:
+                f.write("\n".join(urls) + "\n")
+
+            cmd = [
+                "gallery-dl",
+                "--input-file", input_file,
+                "--error-file", error_file,
+                "--directory", self.directory,
+                "--write-metadata",
+            ]
+            if self.cookie_file:
+                cmd.extend(["--cookies", self.cookie_file])
+            if self.filter_expression:
+                cmd.extend(["--filter", self.filter_expression])
+
+            try:
+                process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE)
+                # gallery-dl 在非终端输出下每下载一个文件打印一行路径，已跳过的文件以 "# " 开头
+                async for raw_line in process.stdout:
+                    path = raw_line.decode("utf-8", errors="ignore").strip()
+                    if path and not path.startswith("#") and os.path.isfile(path):
+                        item = MediaItem.from_gallery_dl(path, read_gallery_dl_metadata(path))
+                        self.progress.add_file(item.size if item else os.path.getsize(path))
+                        if not item:
+                            print(f"  ⚠️ [{self.label}] 无法识别推文的文件，不计入清单: {path}")
+                        elif self.on_file:
+                            await self.on_file(item)
+                returncode = await process.wait()
+
+                if os.path.exists(error_file):
+                    with open(error_file, "r", encoding="utf-8") as f:
+                        return {line.strip() for line in f if line.strip()}
+                if returncode != 0:
+                    print(f"⚠️ [{self.label}] gallery-dl 退出码 {returncode}，但未生成错误列表")
+                return set()
+            finally:
+                for path in (input_file, error_file):
+                    if os.path.exists(path):
+                        os.remove(path)
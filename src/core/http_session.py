@@ -0,0 +1,181 @@
+"""
+进程内共享的同步 HTTP 会话
+
+给 MagnetScraper 这类同步抓取器使用，取代每次请求都新建连接的 urllib.request.urlopen：
+- 基于连接池化的 httpx.Client，同一主机保持长连接 (安装 h2 时启用 HTTP/2)，省去重复的 TLS 握手
+- 声明 gzip / deflate (安装 brotli 时再加 br) 并由 httpx 自动解压
+- 429 与 5xx 按指数退避重试，退避时间加随机抖动，服务端给出 Retry-After 时以其为准
+- 按主机的令牌桶限速 (环境变量 X_HTTP_HOST_RATE / X_HTTP_HOST_BURST)，多个线程共用同一个桶
+- stream() 以流的方式读取响应体，调用方边接收边解析，不必等整个响应体下载完
+- HttpSession.shared() 返回进程级单例，httpx.Client 本身线程安全，可在 asyncio.to_thread 中并发调用
+"""
+
+import os
+import time
+import random
+import threading
+import importlib.util
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import httpx
+
+
+def default_host_rate() -> float:
+    """单主机每秒请求数 (环境变量 X_HTTP_HOST_RATE，默认 1)"""
+    return float(os.getenv("X_HTTP_HOST_RATE", "1"))
+
+
+def default_host_burst() -> int:
+    """单主机令牌桶容量，即允许的瞬时突发请求数 (环境变量 X_HTTP_HOST_BURST，默认 3)"""
+    return int(os.getenv("X_HTTP_HOST_BURST", "3"))
+
+
+class TokenBucket:
+    """线程安全的令牌桶：acquire() 阻塞到拿到一个令牌为止"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """取得一个令牌，返回等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 令牌可以透支：先预订，再在锁外等待，排队的线程按预订顺序依次放行
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class HttpSession:
+    """带重试与按主机限速的连接池化 HTTP 会话"""
+
+    USER_AGENT = (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/133.0.0.0 Safari/537.36"
+    )
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    MAX_CONNECTIONS = 10
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, timeout: float = 15, max_retries: int = 3, backoff_seconds: float = 1.0,
+                 host_rate: float = None, host_burst: int = None, user_agent: str = None):
+        """
+        Args:
+            timeout: 单次请求超时秒数
+            max_retries: 429/5xx/网络错误的最大重试次数
+            backoff_seconds: 退避基数，第 n 次重试等待约 backoff_seconds * 2^(n-1) 秒 (±50% 抖动)
+            host_rate: 单主机每秒请求数，默认读取 X_HTTP_HOST_RATE
+            host_burst: 单主机令牌桶容量，默认读取 X_HTTP_HOST_BURST
+            user_agent: 请求使用的 User-Agent
+        """
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.host_rate = host_rate or default_host_rate()
+        self.host_burst = host_burst or default_host_burst()
+        encodings = "gzip, deflate, br" if importlib.util.find_spec("brotli") else "gzip, deflate"
+        self._client = httpx.Client(
+            http2=importlib.util.find_spec("h2") is not None,
+            follow_redirects=True,
+            timeout=timeout,
+            headers={"User-Agent": user_agent or self.USER_AGENT, "Accept-Encoding": encodings},
+            limits=httpx.Limits(max_connections=self.MAX_CONNECTIONS, max_keepalive_connections=self.MAX_CONNECTIONS),
+        )
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        # 多个 asyncio.to_thread 线程并发更新，计数需在锁内累加
+        self.stats = {"requests": 0, "retries": 0, "throttled_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "HttpSession":
+        """进程级共享会话 (首次调用时创建)"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _count(self, name: str, value: float = 1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlparse(url).hostname or ""
+        with self._buckets_lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.host_rate, self.host_burst)
+            return self._buckets[host]
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        """
+        发送 GET 请求，遇到 429/5xx 或网络错误时退避重试。
+        重试耗尽后抛出 httpx.HTTPError (状态码错误为 httpx.HTTPStatusError)。
+        """
+        return self._send(url, stream=False, **kwargs)
+
+    @contextmanager
+    def stream(self, url: str, **kwargs):
+        """
+        发送 GET 请求并以流的方式读取响应体 (response.iter_bytes())，退出时关闭响应。
+        重试规则同 get()，只在读取响应体之前重试。
+
+        用法:
+            with session.stream(url) as response:
+                for chunk in response.iter_bytes():
+                    ...
+        """
+        response = self._send(url, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            response.close()
+
+    def _send(self, url: str, stream: bool, **kwargs) -> httpx.Response:
+        bucket = self._bucket(url)
+        for attempt in range(self.max_retries + 1):
+            self._count("throttled_seconds", bucket.acquire())
+            self._count("requests")
+            try:
+                response = self._client.send(self._client.build_request("GET", url, **kwargs), stream=stream)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"  ⚠️ 请求失败 ({e.__class__.__name__})，{delay:.1f}s 后重试: {url}")
+            else:
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    if response.is_error:
+                        response.close()
+                        response.raise_for_status()
+                    return response
+                response.close()
+                delay = self._retry_after(response) or self._backoff(attempt)
+                print(f"  ⚠️ HTTP {response.status_code}，{delay:.1f}s 后重试: {url}")
+            self._count("retries")
+            time.sleep(delay)
+
+    def get_text(self, url: str, **kwargs) -> str:
+        """GET 并返回解码后的文本"""
+        return self.get(url, **kwargs).text
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_seconds * 2 ** attempt * random.uniform(0.5, 1.5)
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> float | None:
+        value = response.headers.get("retry-after", "")
+        return float(value) if value.isdigit() else None
+
+    def close(self):
+        self._client.close()
@@ -1,14 +1,141 @@
 """
 磁力链接搜索引擎抓取器 (数据源: sukebei.nyaa.si)
 
-无需 Playwright 浏览器引擎，纯 HTTP 请求 + HTML 解析。
+无需 Playwright 浏览器引擎，纯 HTTP 请求 + 解析。
 在 GitHub Actions 数据中心 IP 上完全可达。
+请求经由进程共享的 HttpSession (长连接、压缩传输、429/5xx 重试与按主机限速)。
+
+两种结果后端 (MagnetScraper(backend=...) 或环境变量 MAGNET_BACKEND)：
+- rss (默认): 同一搜索 URL 加 page=rss&magnets，边接收边以 XMLPullParser 逐条解析，取够 max_results 条即关闭连接；
+  字段按名称读取 (nyaa:infoHash / nyaa:size / nyaa:seeders / pubDate)，不依赖页面布局
+- html: 解析搜索结果页表格，按列序号定位字段
+RSS 不支持 p= 翻页，追赶搜索 (find_new_releases) 固定使用 html 后端。
+两者产出相同的结果字典: title, magnet, size (原始文本), size_bytes, seeders；
+rss 另有 infohash 与 published (datetime)。
 """
 
+import os
 import re
-import urllib.request
 import urllib.parse
+import xml.etree.ElementTree as ET
+from datetime import timezone
+from email.utils import parsedate_to_datetime
 from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Iterable
+from functools import partial
+
+import httpx
+
+from core.http_session import HttpSession
+
+BACKENDS = ("rss", "html")
+
+SIZE_UNITS = {
+    "B": 1, "KIB": 1024, "MIB": 1024 ** 2, "GIB": 1024 ** 3, "TIB": 1024 ** 4,
+    "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4,
+}
+
+# RSS 条目未带磁力链接时，由 infohash 拼出磁力所附带的 tracker (与 sukebei 页面上的磁力一致)
+TRACKERS = (
+    "http://sukebei.tracker.wf:8888/announce",
+    "udp://open.stealth.si:80/announce",
+    "udp://tracker.opentrackr.org:1337/announce",
+    "udp://exodus.desync.com:6969/announce",
+    "udp://tracker.torrent.eu.org:451/announce",
+)
+
+
+def default_backend() -> str:
+    """结果后端 (环境变量 MAGNET_BACKEND，默认 rss)"""
+    return os.getenv("MAGNET_BACKEND", "rss").strip().lower()
+
+
+def parse_size_bytes(size_text: str) -> int:
+    """把 "1.2 GiB" 这类大小文本换算为字节数，无法识别时为 0"""
+    parts = (size_text or "").split()
+    if len(parts) != 2 or parts[1].upper() not in SIZE_UNITS:
+        return 0
+    try:
+        return int(float(parts[0]) * SIZE_UNITS[parts[1].upper()])
+    except ValueError:
+        return 0
+
+
+def parse_nyaa_rss(data: bytes | Iterable[bytes], max_results: int = None) -> list[dict]:
+    """
+    逐条解析 nyaa RSS。data 可以是完整内容，也可以是响应体的分块迭代器 (response.iter_bytes())：
+    每收到一块即解析其中完整的 <item>，解析完即释放，取够 max_results 条后不再读取剩余分块。
+    标签按去掉命名空间后的本地名匹配，sukebei 与 nyaa 主站的 nyaa: 命名空间均可识别。
+    """
+    chunks = [data] if isinstance(data, bytes) else data
+    parser = ET.XMLPullParser(events=("start", "end"))
+    results = []
+    fields = None
+
+    def consume() -> bool:
+        """处理已解析出的事件，取够 max_results 条时返回 True"""
+        nonlocal fields
+        for event, elem in parser.read_events():
+            tag = elem.tag.rsplit("}", 1)[-1]
+            if event == "start":
+                if tag == "item":
+                    fields = {}
+                continue
+            if fields is None:
+                # <channel> 自身的 title / link 等字段
+                continue
+            if tag != "item":
+                fields[tag] = (elem.text or "").strip()
+                continue
+            result = _rss_result(fields)
+            fields = None
+            elem.clear()
+            if result:
+                results.append(result)
+                if max_results and len(results) >= max_results:
+                    return True
+        return False
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        if consume():
+            return results
+    parser.close()
+    consume()
+    return results
+
+
+def _rss_result(fields: dict) -> dict | None:
+    """由一个 <item> 的字段构造结果字典；既没有磁力也没有 infohash 时返回 None"""
+    infohash = fields.get("infoHash", "").lower()
+    link = fields.get("link", "")
+    title = fields.get("title", "")
+    if link.startswith("magnet:"):
+        magnet = link
+    elif infohash:
+        trackers = "".join(f"&tr={urllib.parse.quote(t, safe='')}" for t in TRACKERS)
+        magnet = f"magnet:?xt=urn:btih:{infohash}&dn={urllib.parse.quote(title)}{trackers}"
+    else:
+        return None
+    try:
+        # nyaa 的 pubDate 时区写作 -0000 (解析结果不带时区)，按 UTC 处理
+        published = parsedate_to_datetime(fields["pubDate"])
+        if published.tzinfo is None:
+            published = published.replace(tzinfo=timezone.utc)
+    except (KeyError, TypeError, ValueError):
+        published = None
+    size = fields.get("size", "")
+    seeders = fields.get("seeders", "")
+    return {
+        "title": title,
+        "magnet": magnet,
+        "size": size,
+        "size_bytes": parse_size_bytes(size),
+        "seeders": int(seeders) if seeders.isdigit() else 0,
+        "infohash": infohash,
+        "published": published,
+    }
 
 
 class NyaaResultParser(HTMLParser):
@@ -30,7 +157,7 @@ class NyaaResultParser(HTMLParser):
         if tag == 'tr':
             self._in_tr = True
             self._td_index = 0
-            self._current = {"title": "", "magnet": "", "size": "", "seeders": 0}
+            self._current = {"title": "", "magnet": "", "size": "", "size_bytes": 0, "seeders": 0}
 
         elif tag == 'td' and self._in_tr:
             self._td_index += 1
@@ -61,6 +188,7 @@ class NyaaResultParser(HTMLParser):
                 text = data.strip()
                 if text and any(u in text for u in ['GiB', 'MiB', 'KiB', 'TiB', 'GB', 'MB']):
                     self._current["size"] = text
+                    self._current["size_bytes"] = parse_size_bytes(text)
             elif self._in_seeders_cell:
                 text = data.strip()
                 if text.isdigit():
@@ -83,12 +211,23 @@ class MagnetScraper:
     """基于 sukebei.nyaa.si 的磁力链接搜索引擎（纯 HTTP，无需浏览器）"""
 
     BASE_URL = "https://sukebei.nyaa.si/"
-    REQUEST_TIMEOUT = 15
-    USER_AGENT = (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/133.0.0.0 Safari/537.36"
-    )
+    # nyaa 每页结果数；追赶搜索每批并行抓取的页数与总页数上限
+    PAGE_SIZE = 75
+    CATCH_UP_PAGES = 3
+    CATCH_UP_MAX_PAGES = 12
+    # 批量搜索时编码后 q 参数的长度上限 (整条 URL 保持在常见 2000 字符限制以内)
+    MAX_QUERY_LENGTH = 1500
+
+    def __init__(self, session: HttpSession = None, backend: str = None):
+        """
+        Args:
+            session: HTTP 会话，默认使用进程级共享的 HttpSession.shared()
+            backend: 结果后端 rss / html，默认读取 MAGNET_BACKEND
+        """
+        self.session = session or HttpSession.shared()
+        self.backend = backend or default_backend()
+        if self.backend not in BACKENDS:
+            raise ValueError(f"未知的结果后端: {self.backend} (可选: {', '.join(BACKENDS)})")
 
     def search_keyword(self, keyword: str, max_results: int = 10) -> list[dict]:
         """
@@ -99,28 +238,95 @@ class MagnetScraper:
             max_results: 最多返回的结果数量
 
         Returns:
-            包含 title, magnet, size, seeders 的字典列表
+            包含 title, magnet, size, size_bytes, seeders 的字典列表 (rss 后端另有 infohash, published)
         """
         encoded = urllib.parse.quote(keyword)
         # f=0 全部, c=0_0 全分类, s=seeders 按做种数排序, o=desc 降序
         url = f"{self.BASE_URL}?q={encoded}&f=0&c=0_0&s=seeders&o=desc"
         print(f"  🔎 搜索: {url}")
 
+        results = self._fetch_results(url, max_results)
+        if results is None:
+            return []
+
+        print(f"  📋 找到 {len(results)} 条有效结果")
+        return results
+
+    def _fetch_results(self, url: str, max_results: int = None, backend: str = None) -> list[dict] | None:
+        """
+        按后端 (默认为当前后端) 请求搜索结果并解析，最多返回 max_results 条；请求或解析失败时返回 None。
+        rss 后端边接收边解析，取够 max_results 条即关闭连接。
+        """
+        backend = backend or self.backend
         try:
-            req = urllib.request.Request(url, headers={"User-Agent": self.USER_AGENT})
-            resp = urllib.request.urlopen(req, timeout=self.REQUEST_TIMEOUT)
-            html = resp.read().decode('utf-8', errors='ignore')
-        except Exception as e:
+            if backend == "rss":
+                with self.session.stream(f"{url}&page=rss&magnets") as response:
+                    return parse_nyaa_rss(response.iter_bytes(), max_results)
+            text = self.session.get_text(url)
+        except httpx.HTTPError as e:
             print(f"  ❌ HTTP 请求失败: {e}")
-            return []
+            return None
+        except ET.ParseError as e:
+            print(f"  ❌ RSS 解析失败: {e}")
+            return None
 
-        # 解析 HTML
         parser = NyaaResultParser()
-        parser.feed(html)
-        results = parser.results[:max_results]
+        parser.feed(text)
+        return parser.results[:max_results] if max_results else parser.results
 
-        print(f"  📋 找到 {len(results)} 条有效结果")
-        return results
+    @staticmethod
+    def release_pattern(prefix: str) -> re.Pattern:
+        """匹配标题中 PREFIX-NNN / PREFIXNNN / PREFIX_NNN 编号的正则，编号为第 1 组"""
+        base = re.escape(prefix.rstrip("-_ ").upper())
+        return re.compile(rf"(?<![A-Z0-9]){base}[-_ ]?0*(\d{{1,5}})(?!\d)", re.IGNORECASE)
+
+    def find_new_releases(self, prefix: str, last_number: int, pages: int = None) -> dict[int, dict]:
+        """
+        追赶搜索：以裸前缀按发布时间倒序搜索，每批并行抓取 pages 页，
+        从标题中解析出所有大于 last_number 的编号，每个编号按评分保留最优结果。
+        一批中最后一页仍满页且含有新编号时继续抓取下一批 (总页数不超过 CATCH_UP_MAX_PAGES)。
+        RSS 会忽略 p= 而每页返回相同内容，因此翻页固定使用 html 后端。
+
+        Returns:
+            {编号: 最优结果字典}
+        """
+        pages = pages or self.CATCH_UP_PAGES
+        pattern = self.release_pattern(prefix)
+        keyword_prefix = prefix.rstrip("-_ ").upper()
+        encoded = urllib.parse.quote(keyword_prefix)
+        best = {}
+
+        with ThreadPoolExecutor(max_workers=pages) as executor:
+            for first_page in range(1, self.CATCH_UP_MAX_PAGES + 1, pages):
+                # s=id 按发布顺序排序，o=desc 最新在前
+                urls = [
+                    f"{self.BASE_URL}?q={encoded}&f=0&c=0_0&s=id&o=desc&p={page}"
+                    for page in range(first_page, min(first_page + pages, self.CATCH_UP_MAX_PAGES + 1))
+                ]
+                print(f"  🔎 追赶搜索 {keyword_prefix}: 第 {first_page}~{first_page + len(urls) - 1} 页")
+                page_results = list(executor.map(partial(self._fetch_results, backend="html"), urls))
+
+                for results in page_results:
+                    for result in results or []:
+                        numbers = {int(n) for n in pattern.findall(result.get("title", ""))}
+                        for number in numbers:
+                            if number <= last_number:
+                                continue
+                            keyword = f"{keyword_prefix}-{number:03d}"
+                            scored = (self.score_result(result, keyword), result)
+                            if number not in best or scored[0] > best[number][0]:
+                                best[number] = scored
+
+                last = page_results[-1] or []
+                more = len(last) >= self.PAGE_SIZE and any(
+                    int(n) > last_number for r in last for n in pattern.findall(r.get("title", ""))
+                )
+                if not more:
+                    break
+
+        print(f"  📋 {keyword_prefix} 发现 {len(best)} 个新编号: "
+              f"{', '.join(str(n) for n in sorted(best)) or '无'}")
+        return {number: result for number, (_, result) in best.items()}
 
     def score_result(self, result: dict, keyword: str) -> int:
         """
@@ -166,33 +372,11 @@ class MagnetScraper:
             score += 1
 
         # 文件体积评分
-        size_gb = self._parse_size_gb(result.get("size", ""))
+        size_gb = result.get("size_bytes", 0) / 1024 ** 3
         score += min(int(size_gb * 2), 6)  # 封顶 6 分
 
         return score
 
-    @staticmethod
-    def _parse_size_gb(size_text: str) -> float:
-        """将文件大小文本解析为 GB 单位的浮点数"""
-        if not size_text:
-            return 0.0
-        try:
-            match = re.search(r'([\d.]+)\s*(GiB|MiB|KiB|TiB|GB|MB|KB|TB)', size_text, re.IGNORECASE)
-            if match:
-                value = float(match.group(1))
-                unit = match.group(2).upper()
-                if unit in ("TIB", "TB"):
-                    return value * 1024
-                elif unit in ("GIB", "GB"):
-                    return value
-                elif unit in ("MIB", "MB"):
-                    return value / 1024
-                elif unit in ("KIB", "KB"):
-                    return value / (1024 * 1024)
-        except Exception:
-            pass
-        return 0.0
-
     def search_best_magnet(self, keyword: str) -> str | None:
         """
         高层级便捷方法：搜索 -> 评分 -> 返回最优磁力链接
@@ -203,7 +387,10 @@ class MagnetScraper:
         Returns:
             最优磁力链接字符串，或 None
         """
-        results = self.search_keyword(keyword)
+        return self._pick_best(self.search_keyword(keyword), keyword)
+
+    def _pick_best(self, results: list[dict], keyword: str) -> str | None:
+        """对结果评分并返回最优磁力链接"""
         if not results:
             return None
 
@@ -223,3 +410,93 @@ class MagnetScraper:
 
         print(f"  😞 最优结果无有效磁力链接")
         return None
+
+    # =========================================================
+    # 批量搜索：多个番号合并为 nyaa 的 OR 查询
+    # =========================================================
+
+    @staticmethod
+    def _split_code(keyword: str) -> tuple[str, int] | None:
+        """把 "ABC-001" / "ABC001" 拆为 ("ABC", 1)，无法识别时返回 None"""
+        match = re.fullmatch(r"([A-Za-z]+)[-_ ]?(\d+)", keyword.strip())
+        return (match.group(1).upper(), int(match.group(2))) if match else None
+
+    @classmethod
+    def keyword_variants(cls, keyword: str) -> list[str]:
+        """番号的常见写法 (ABC-001 / ABC001)，无法识别的关键字原样返回"""
+        code = cls._split_code(keyword)
+        if not code:
+            return [keyword]
+        digits = re.search(r"\d+$", keyword.strip()).group(0)
+        return [f"{code[0]}-{digits}", f"{code[0]}{digits}"]
+
+    def matches_keyword(self, keyword: str, title: str) -> bool:
+        """标题是否对应该番号 (忽略分隔符与前导零，前后不能紧接其它字母数字)"""
+        code = self._split_code(keyword)
+        if not code:
+            normalize = lambda text: re.sub(r"[^0-9A-Z]", "", text.upper())
+            return normalize(keyword) in normalize(title)
+        prefix, number = code
+        return any(int(n) == number for n in self.release_pattern(prefix).findall(title))
+
+    def _or_query(self, keywords: list[str]) -> str:
+        return "|".join(variant for keyword in keywords for variant in self.keyword_variants(keyword))
+
+    def _pack_queries(self, keywords: list[str]) -> list[list[str]]:
+        """按 URL 长度上限把关键字装入尽量少的 OR 查询"""
+        batches, current = [], []
+        for keyword in keywords:
+            candidate = current + [keyword]
+            if current and len(urllib.parse.quote(self._or_query(candidate))) > self.MAX_QUERY_LENGTH:
+                batches.append(current)
+                candidate = [keyword]
+            current = candidate
+        if current:
+            batches.append(current)
+        return batches
+
+    def _search_batch(self, keywords: list[str]) -> list[dict] | None:
+        encoded = urllib.parse.quote(self._or_query(keywords))
+        url = f"{self.BASE_URL}?q={encoded}&f=0&c=0_0&s=seeders&o=desc"
+        print(f"  🔎 批量搜索 {len(keywords)} 个番号: {', '.join(keywords[:5])}{' ...' if len(keywords) > 5 else ''}")
+        return self._fetch_results(url)
+
+    def search_many(self, keywords: list[str], max_results: int = 10) -> dict[str, list[dict]]:
+        """
+        批量搜索多个番号：每个番号展开为多种写法后合并为 OR 查询，
+        按 URL 长度上限分批并行请求，再按标题把结果行分派回各番号。
+        某批结果满页 (可能被截断) 时对半拆分后重新查询，直到不满页或只剩一个番号。
+
+        Returns:
+            {关键字: 结果列表 (按做种数降序，最多 max_results 条)}；请求失败的番号结果为空列表
+        """
+        keywords = list(dict.fromkeys(keywords))
+        matched = {keyword: [] for keyword in keywords}
+        pending = self._pack_queries(keywords)
+        requests = 0
+
+        with ThreadPoolExecutor(max_workers=self.CATCH_UP_PAGES) as executor:
+            while pending:
+                page_results = list(executor.map(self._search_batch, pending))
+                requests += len(pending)
+                next_round = []
+                for batch, rows in zip(pending, page_results):
+                    if rows is None:
+                        continue
+                    if len(rows) >= self.PAGE_SIZE and len(batch) > 1:
+                        middle = len(batch) // 2
+                        next_round.extend([batch[:middle], batch[middle:]])
+                        continue
+                    for row in rows:
+                        for keyword in batch:
+                            if self.matches_keyword(keyword, row.get("title", "")):
+                                matched[keyword].append(row)
+                pending = next_round
+
+        found = sum(1 for rows in matched.values() if rows)
+        print(f"  📋 批量搜索: {len(keywords)} 个番号共 {requests} 次请求，{found} 个有结果")
+        return {keyword: rows[:max_results] for keyword, rows in matched.items()}
+
+    def search_best_magnets(self, keywords: list[str]) -> dict[str, str | None]:
+        """批量版 search_best_magnet：返回 {关键字: 最优磁力链接或 None}"""
+        return {keyword: self._pick_best(results, keyword) for keyword, results in self.search_many(keywords).items()}
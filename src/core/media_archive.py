@@ -0,0 +1,182 @@
+"""
+跨运行的媒体归档数据库
+
+以 (推文 ID, 媒体序号, 目的地) 为键记录已成功归档的媒体，
+由 XScraper、task_google_full 与各上传器共享：
+- XScraper 在下载前跳过所有媒体都已归档的推文，不再启动任何下载进程
+- 上传器跳过已归档文件，并在上传成功后登记
+- 全量 gallery-dl 任务导出为 gallery-dl 的 --download-archive，连续命中已归档条目即提前终止
+
+数据库为 SQLite (默认 state/media_archive.sqlite3)，与归档范围文件一起放入 Actions cache。
+媒体序号沿用 gallery-dl 的 {num} (从 1 开始)。
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+from core.scan_state import state_dir
+
+
+def parse_media_filename(path: str) -> tuple[str, int] | None:
+    """从 gallery-dl 默认文件名 {tweet_id}_{num}.{extension} 解析 (推文 ID, 媒体序号)"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    tweet_id, _, num = stem.partition("_")
+    if not tweet_id.isdigit() or not num.isdigit():
+        return None
+    return tweet_id, int(num)
+
+
+class MediaArchive:
+    """基于 SQLite 的媒体归档记录"""
+
+    FILE_NAME = "media_archive.sqlite3"
+    # 导出给 gallery-dl 时使用的归档键格式，需与 --download-archive 的 archive-format 一致
+    GALLERY_DL_ARCHIVE_FORMAT = "{tweet_id}_{num}"
+    # 单条 SQL 的 IN 参数上限 (兼容旧版 SQLite 的 999 变量限制)
+    QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(state_dir(), self.FILE_NAME)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # 多个进程可能同时写入：WAL + 忙等待超时
+        self.connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS media (
+                tweet_id TEXT NOT NULL,
+                media_index INTEGER NOT NULL,
+                destination TEXT NOT NULL,
+                archived_at TEXT NOT NULL,
+                PRIMARY KEY (tweet_id, media_index, destination)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS tweets (
+                tweet_id TEXT PRIMARY KEY,
+                media_count INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def record_media_count(self, tweet_id: str, media_count: int):
+        """登记推文的媒体总数，用于判断该推文是否已全部归档"""
+        if media_count <= 0:
+            return
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO tweets (tweet_id, media_count) VALUES (?, ?) "
+                "ON CONFLICT(tweet_id) DO UPDATE SET media_count = MAX(media_count, excluded.media_count)",
+                (tweet_id, media_count),
+            )
+
+    def add(self, tweet_id: str, media_index: int, destination: str):
+        """登记一条已归档媒体"""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO media (tweet_id, media_index, destination, archived_at) VALUES (?, ?, ?, ?)",
+                (tweet_id, media_index, destination, datetime.now(timezone.utc).isoformat()),
+            )
+
+    def add_file(self, path: str, destination: str) -> bool:
+        """按本地文件名登记；文件名无法解析出推文 ID 时返回 False"""
+        key = parse_media_filename(path)
+        if not key:
+            return False
+        self.add(key[0], key[1], destination)
+        return True
+
+    def contains(self, tweet_id: str, media_index: int, destination: str) -> bool:
+        row = self.connection.execute(
+            "SELECT 1 FROM media WHERE tweet_id = ? AND media_index = ? AND destination = ?",
+            (tweet_id, media_index, destination),
+        ).fetchone()
+        return row is not None
+
+    def contains_file(self, path: str, destination: str) -> bool:
+        """本地文件对应的媒体是否已归档到目的地"""
+        key = parse_media_filename(path)
+        return bool(key) and self.contains(key[0], key[1], destination)
+
+    def archived_tweet_ids(self, tweet_ids: list, destinations: list, media_counts: dict = None) -> set:
+        """
+        批量判断哪些推文的全部媒体已归档到所有目的地
+
+        Args:
+            tweet_ids: 待判断的推文 ID
+            destinations: 目的地列表，必须在每个目的地都已归档
+            media_counts: 发现阶段已知的媒体数量 {tweet_id: count}；未知时使用数据库登记值
+        """
+        if not tweet_ids or not destinations:
+            return set()
+        media_counts = media_counts or {}
+
+        known_counts = {}
+        archived_counts = {}
+        for start in range(0, len(tweet_ids), self.QUERY_CHUNK_SIZE):
+            chunk = list(tweet_ids[start:start + self.QUERY_CHUNK_SIZE])
+            placeholders = ",".join("?" * len(chunk))
+            known_counts.update(self.connection.execute(
+                f"SELECT tweet_id, media_count FROM tweets WHERE tweet_id IN ({placeholders})", chunk
+            ).fetchall())
+            for tweet_id, destination, count in self.connection.execute(
+                f"SELECT tweet_id, destination, COUNT(*) FROM media WHERE tweet_id IN ({placeholders}) "
+                f"GROUP BY tweet_id, destination", chunk
+            ):
+                archived_counts[(tweet_id, destination)] = count
+
+        archived = set()
+        for tweet_id in tweet_ids:
+            expected = media_counts.get(tweet_id) or known_counts.get(tweet_id)
+            if not expected:
+                continue
+            if all(archived_counts.get((tweet_id, d), 0) >= expected for d in destinations):
+                archived.add(tweet_id)
+        return archived
+
+    def merge(self, path: str) -> int:
+        """
+        合并另一份归档数据库 (并行任务各自的副本)，媒体记录取并集，推文媒体总数取较大值
+
+        Returns:
+            新增的媒体记录数
+        """
+        before = self.connection.total_changes
+        self.connection.execute("ATTACH DATABASE ? AS other", (path,))
+        try:
+            with self.connection:
+                self.connection.execute("INSERT OR IGNORE INTO media SELECT * FROM other.media")
+                media_changes = self.connection.total_changes - before
+                self.connection.execute(
+                    "INSERT INTO tweets (tweet_id, media_count) SELECT tweet_id, media_count FROM other.tweets WHERE true "
+                    "ON CONFLICT(tweet_id) DO UPDATE SET media_count = MAX(media_count, excluded.media_count)"
+                )
+        finally:
+            self.connection.execute("DETACH DATABASE other")
+        return media_changes
+
+    def export_gallery_dl_archive(self, destination: str, path: str) -> int:
+        """
+        将某目的地已归档的媒体导出为 gallery-dl 的 --download-archive 数据库
+        (配合 -o archive-prefix= -o archive-format={tweet_id}_{num} 使用)
+
+        Returns:
+            导出的条目数
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        rows = self.connection.execute(
+            "SELECT tweet_id, media_index FROM media WHERE destination = ?", (destination,)
+        ).fetchall()
+        target = sqlite3.connect(path)
+        try:
+            with target:
+                target.execute("CREATE TABLE archive (entry TEXT PRIMARY KEY) WITHOUT ROWID")
+                target.executemany(
+                    "INSERT OR IGNORE INTO archive (entry) VALUES (?)",
+                    ((self.GALLERY_DL_ARCHIVE_FORMAT.format(tweet_id=t, num=n),) for t, n in rows),
+                )
+        finally:
+            target.close()
+        return len(rows)
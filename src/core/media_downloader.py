@@ -0,0 +1,281 @@
+"""
+原生异步媒体下载器
+
+在发现阶段已经拿到媒体直链 (GraphQL / 免浏览器模式) 时，直接下载而不再调用 gallery-dl：
+- pbs.twimg.com 图片改写为 name=orig 原图，视频取码率最高的 mp4
+- 复用一个连接池化的 httpx.AsyncClient (安装 h2 时启用 HTTP/2)
+- 按固定块大小流式写入 .part 文件，完成后原子重命名，不在内存中缓存整个文件
+- 文件名沿用 gallery-dl 的 {tweet_id}_{num}.{extension}，并把 mtime 设为推文发布时间
+- 每个文件落盘后产出一条 MediaItem 清单记录 (单流下载时边写边计算 sha1)
+- 大文件 (如长视频) 拆成多个 HTTP Range 分段并行下载，已完成分段记录在 .part.json 旁路文件中，
+  重试或在同一下载目录再次运行时从已完成的分段继续
+  (GitHub Actions 不缓存下载目录，跨运行的续传只在本地或自托管环境生效)
+- 只对视频先发 HEAD 探测大小与 Range 支持，图片直接单流 GET，不增加请求数
+
+非 twimg 主机的 URL 原样请求，因此可以用本地 HTTP 服务替身做离线验证。
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import importlib.util
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+import httpx
+
+from core.download_pool import DownloadProgress, HostLimiter, default_concurrency
+from core.media_manifest import MediaItem
+
+
+def orig_quality_url(url: str) -> str:
+    """把 pbs.twimg.com 图片地址改写为原图 (name=orig)，其它地址原样返回"""
+    parsed = urlparse(url)
+    if parsed.hostname != "pbs.twimg.com":
+        return url
+    path, ext = os.path.splitext(parsed.path)
+    image_format = ext.lstrip(".") or parse_qs(parsed.query).get("format", ["jpg"])[0]
+    return f"https://pbs.twimg.com{path}?format={image_format}&name=orig"
+
+
+def media_extension(media: dict) -> str:
+    """推断媒体文件扩展名"""
+    parsed = urlparse(media["url"])
+    ext = os.path.splitext(parsed.path)[1].lstrip(".")
+    if ext:
+        return ext
+    if media.get("type") == "photo":
+        return parse_qs(parsed.query).get("format", ["jpg"])[0]
+    return "mp4"
+
+
+class MediaDownloader:
+    """基于 httpx 的流式媒体下载器"""
+
+    CHUNK_SIZE = 256 * 1024
+    REQUEST_TIMEOUT = 60
+    # 超过该大小且服务器支持 Range 时启用分段下载
+    SEGMENT_THRESHOLD = 32 * 1024 * 1024
+    SEGMENT_SIZE = 8 * 1024 * 1024
+    SEGMENT_CONCURRENCY = 4
+
+    def __init__(self, directory: str, label: str, per_host_limit: int = None,
+                 max_retries: int = 2, backoff_seconds: float = 2.0, client: httpx.AsyncClient = None,
+                 on_file=None):
+        """
+        Args:
+            directory: 下载目录
+            label: 日志标识 (通常是用户名)
+            per_host_limit: 同一主机的并发下载数，默认读取环境变量 X_DOWNLOAD_CONCURRENCY
+            max_retries: 单个文件的最大重试次数
+            backoff_seconds: 重试退避基数
+            client: 外部共享的 httpx.AsyncClient；不传时由下载器自行创建并在退出时关闭
+            on_file: 每个文件落盘后调用的协程函数 on_file(item: MediaItem)，用于下载清单与下载→上传流水线
+        """
+        self.directory = directory
+        self.label = label
+        self.per_host_limit = per_host_limit or default_concurrency()
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.progress = DownloadProgress(label)
+        self._host_limiter = HostLimiter(self.per_host_limit)
+        self._client = client
+        self._owns_client = client is None
+        self.on_file = on_file
+
+    async def __aenter__(self):
+        if self._owns_client:
+            self._client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                follow_redirects=True,
+                timeout=self.REQUEST_TIMEOUT,
+                limits=httpx.Limits(max_connections=self.per_host_limit * 4,
+                                    max_keepalive_connections=self.per_host_limit * 4),
+            )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._owns_client:
+            await self._client.aclose()
+            self._client = None
+
+    async def download_tweets(self, tweets: list) -> dict:
+        """
+        下载推文记录中的全部媒体
+
+        Returns:
+            {推文链接: 是否全部媒体下载成功}
+        """
+        async def download_tweet(tweet: dict) -> bool:
+            jobs = [
+                self.download_media(
+                    orig_quality_url(media["url"]) if media.get("type") == "photo" else media["url"],
+                    os.path.join(self.directory, f"{tweet['tweet_id']}_{num}.{media_extension(media)}"),
+                    tweet, media, num,
+                )
+                # 经筛选策略处理的媒体带有原始序号 num，保证文件名与归档键一致
+                for num, media in ((m.get("num", i), m) for i, m in enumerate(tweet.get("media") or [], 1))
+            ]
+            return all(await asyncio.gather(*jobs))
+
+        os.makedirs(self.directory, exist_ok=True)
+        results = await asyncio.gather(*(download_tweet(t) for t in tweets))
+        self.progress.report(final=True)
+
+        outcome = {f"https://x.com{t['href']}": ok for t, ok in zip(tweets, results)}
+        failed = [url for url, ok in outcome.items() if not ok]
+        if failed:
+            print(f"⚠️ [{self.label}] {len(failed)}/{len(tweets)} 条推文的媒体未能完整下载:")
+            for url in failed:
+                print(f"    ❌ {url}")
+        return outcome
+
+    async def download_media(self, url: str, path: str, tweet: dict, media: dict, num: int) -> bool:
+        """下载推文的第 num 个媒体文件，失败按指数退避重试；目标文件已存在时直接视为成功"""
+        if os.path.exists(path):
+            return True
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+            try:
+                async with self._host_limiter(url):
+                    size, sha1 = await self._stream_to_file(url, path, probe=media.get("type") != "photo")
+            except (httpx.HTTPError, OSError) as e:
+                print(f"  ⚠️ [{self.label}] 下载失败 ({attempt + 1}/{self.max_retries + 1}) {url}: {e}")
+                continue
+
+            self._apply_timestamp(path, tweet.get("datetime"))
+            self.progress.add_file(size)
+            if self.on_file:
+                await self.on_file(MediaItem.from_tweet(path, tweet, media, num, size, sha1))
+            return True
+        return False
+
+    async def _stream_to_file(self, url: str, path: str, probe: bool = True) -> tuple[int, str | None]:
+        """
+        按文件大小选择分段或单流下载，返回 (字节数, sha1)；分段下载乱序写入，不计算 sha1。
+        probe 为 False 时 (图片远小于分段阈值) 不发 HEAD，直接单流下载。
+        """
+        if not probe:
+            return await self._download_single(url, path)
+        head = await self._client.head(url)
+        total_size = int(head.headers.get("content-length") or 0)
+        if (head.is_success and total_size >= self.SEGMENT_THRESHOLD
+                and head.headers.get("accept-ranges", "").lower() == "bytes"):
+            return await self._download_segmented(url, path, total_size), None
+        return await self._download_single(url, path)
+
+    async def _download_single(self, url: str, path: str) -> tuple[int, str]:
+        """流式写入 .part 临时文件，完成后原子重命名为目标文件，返回 (字节数, sha1)"""
+        part_path = f"{path}.part"
+        size = 0
+        digest = hashlib.sha1()
+        try:
+            async with self._client.stream("GET", url) as response:
+                response.raise_for_status()
+                with open(part_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(self.CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            os.replace(part_path, path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        return size, digest.hexdigest()
+
+    async def _download_segmented(self, url: str, path: str, total_size: int) -> int:
+        """
+        按 SEGMENT_SIZE 拆分为 Range 分段并行写入预分配的 .part 文件。
+        每完成一个分段即更新 .part.json 旁路文件；失败时保留两者以便下次续传。
+        """
+        part_path = f"{path}.part"
+        sidecar_path = f"{path}.part.json"
+        segments = [
+            (index, start, min(start + self.SEGMENT_SIZE, total_size) - 1)
+            for index, start in enumerate(range(0, total_size, self.SEGMENT_SIZE))
+        ]
+
+        state = self._load_segment_state(sidecar_path, part_path, total_size)
+        done = set(state["done"])
+        if not os.path.exists(part_path):
+            with open(part_path, "wb") as f:
+                f.truncate(total_size)
+        if done:
+            print(f"  ⏯️ [{self.label}] 续传 {os.path.basename(path)}: 已完成 {len(done)}/{len(segments)} 段")
+
+        semaphore = asyncio.Semaphore(self.SEGMENT_CONCURRENCY)
+
+        async def fetch_segment(index: int, start: int, end: int):
+            async with semaphore:
+                expected = end - start + 1
+                received = 0
+                async with self._client.stream("GET", url, headers={"Range": f"bytes={start}-{end}"}) as response:
+                    if response.status_code != 206:
+                        raise httpx.HTTPStatusError(
+                            f"Range 请求未返回 206 (实际 {response.status_code})",
+                            request=response.request, response=response,
+                        )
+                    with open(part_path, "r+b") as f:
+                        f.seek(start)
+                        async for chunk in response.aiter_bytes(self.CHUNK_SIZE):
+                            f.write(chunk)
+                            received += len(chunk)
+                if received != expected:
+                    raise OSError(f"分段 {index} 长度不符: 期望 {expected}，实际 {received}")
+                done.add(index)
+                state["done"] = sorted(done)
+                self._save_segment_state(sidecar_path, state)
+
+        # 任一分段失败时取消其余分段并等待其退出，避免失败后仍在后台写入 .part
+        tasks = [asyncio.create_task(fetch_segment(*segment)) for segment in segments if segment[0] not in done]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        # .part 预分配为完整大小，需核对已完成分段是否覆盖整个文件
+        covered = sum(end - start + 1 for index, start, end in segments if index in done)
+        if covered != total_size:
+            raise OSError(f"分段未覆盖整个文件: 期望 {total_size}，已完成 {covered}")
+        os.replace(part_path, path)
+        os.remove(sidecar_path)
+        return total_size
+
+    def _load_segment_state(self, sidecar_path: str, part_path: str, total_size: int) -> dict:
+        """读取续传状态；文件大小或分段规格变化时作废旧进度"""
+        fresh = {"size": total_size, "segment_size": self.SEGMENT_SIZE, "done": []}
+        if not os.path.exists(sidecar_path) or not os.path.exists(part_path):
+            return fresh
+        try:
+            with open(sidecar_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return fresh
+        if state.get("size") != total_size or state.get("segment_size") != self.SEGMENT_SIZE:
+            os.remove(part_path)
+            return fresh
+        return state
+
+    @staticmethod
+    def _save_segment_state(sidecar_path: str, state: dict):
+        tmp_path = f"{sidecar_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, sidecar_path)
+
+    @staticmethod
+    def _apply_timestamp(path: str, posted_at: str):
+        """与 gallery-dl 一致：把文件 mtime 设为推文发布时间"""
+        if not posted_at:
+            return
+        try:
+            timestamp = datetime.fromisoformat(posted_at.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return
+        os.utime(path, (timestamp, timestamp))
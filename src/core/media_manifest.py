@@ -0,0 +1,116 @@
+"""
+下载清单
+
+下载阶段每落盘一个文件就产出一条 MediaItem，上传器与归档记录直接使用清单，而不再扫描下载目录：
+- 原生下载器由推文记录填充 (作者、发布时间、媒体类型)，单流下载时顺带计算 sha1
+- gallery-dl 以 --write-metadata 为每个文件写出 {文件名}.json，读取后即删除该旁路文件
+- 两者都拿不到时 (如 gallery-dl 元数据缺失) 退回从文件名 {tweet_id}_{num}.{extension} 解析
+"""
+
+import os
+import json
+from datetime import datetime, timezone
+from dataclasses import dataclass
+
+from core.media_archive import parse_media_filename
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".webm", ".m4v")
+
+
+@dataclass
+class MediaItem:
+    """一个已下载的媒体文件"""
+
+    path: str
+    tweet_id: str
+    num: int
+    author: str | None = None
+    # ISO 8601 发布时间 (UTC)
+    posted_at: str | None = None
+    # photo / video / animated_gif
+    media_type: str | None = None
+    size: int = 0
+    # 十六进制小写；下载时未计算则为 None
+    sha1: str | None = None
+    # 所属推文的媒体总数 (gallery-dl 元数据的 count，不受 --filter 影响)；未知时为 None
+    media_count: int | None = None
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def tweet_url(self) -> str | None:
+        """来源推文链接 (作者未知时为 None)"""
+        return f"https://x.com/{self.author}/status/{self.tweet_id}" if self.author else None
+
+    @classmethod
+    def from_tweet(cls, path: str, tweet: dict, media: dict, num: int, size: int, sha1: str = None) -> "MediaItem":
+        """由原生下载器的推文记录及其中一个媒体记录构造"""
+        return cls(
+            path=path,
+            tweet_id=tweet["tweet_id"],
+            num=num,
+            author=tweet.get("author"),
+            posted_at=tweet.get("datetime"),
+            media_type=media.get("type"),
+            size=size,
+            sha1=sha1,
+        )
+
+    @classmethod
+    def from_gallery_dl(cls, path: str, metadata: dict | None) -> "MediaItem | None":
+        """由 gallery-dl 元数据构造；元数据缺失时从文件名解析，仍无法识别时返回 None"""
+        metadata = metadata or {}
+        key = parse_media_filename(path)
+        tweet_id = str(metadata.get("tweet_id") or (key[0] if key else ""))
+        num = metadata.get("num") or (key[1] if key else None)
+        if not tweet_id or num is None:
+            return None
+        author = metadata.get("author") or {}
+        return cls(
+            path=path,
+            tweet_id=tweet_id,
+            num=int(num),
+            author=author.get("name") if isinstance(author, dict) else author or None,
+            posted_at=_gallery_dl_date(metadata.get("date")),
+            media_type=metadata.get("type") or _guess_media_type(path),
+            size=os.path.getsize(path),
+            media_count=int(metadata["count"]) if metadata.get("count") else None,
+        )
+
+
+def read_gallery_dl_metadata(path: str) -> dict | None:
+    """读取并删除 gallery-dl --write-metadata 写出的旁路文件 {path}.json"""
+    metadata_path = f"{path}.json"
+    if not os.path.exists(metadata_path):
+        return None
+    try:
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+    finally:
+        try:
+            os.remove(metadata_path)
+        except OSError:
+            pass
+
+
+def newest_first(items: list) -> list:
+    """按推文 ID (即发布顺序) 从新到旧排序，同一推文内按媒体序号"""
+    return sorted(items, key=lambda item: (-int(item.tweet_id), item.num))
+
+
+def _gallery_dl_date(value) -> str | None:
+    """gallery-dl 的 date 字段形如 "2024-01-02 03:04:05" (UTC)，转为 ISO 8601"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).isoformat()
+    except ValueError:
+        return str(value)
+
+
+def _guess_media_type(path: str) -> str:
+    return "video" if path.lower().endswith(VIDEO_EXTENSIONS) else "photo"
@@ -0,0 +1,73 @@
+"""
+下载→上传流水线
+
+XScraper 每下载完一个文件就把其清单记录 (MediaItem) 放入有界 asyncio.Queue，上传协程随即取出上传，
+确认成功后立即删除本地文件：
+- 上传与扫描、下载重叠进行，网络不再在下载期间空闲
+- 队列满时下载端等待，磁盘占用上限约为 "队列长度 + 正在下载的文件"
+- 上传失败的文件保留在本地，交由 mark_archived 阻止归档范围越过它
+"""
+
+import os
+import asyncio
+
+
+def default_queue_size() -> int:
+    """流水线队列长度 (环境变量 X_PIPELINE_QUEUE_SIZE，默认 8)"""
+    return int(os.getenv("X_PIPELINE_QUEUE_SIZE", "8"))
+
+
+class MediaPipeline:
+    """以有界队列连接 XScraper 下载与单个目的地上传"""
+
+    def __init__(self, scraper, upload, queue_size: int = None, delete_uploaded: bool = True):
+        """
+        Args:
+            scraper: XScraper 实例
+            upload: 上传单个文件的协程函数 upload(item: MediaItem) -> bool
+            queue_size: 队列长度，默认读取环境变量 X_PIPELINE_QUEUE_SIZE
+            delete_uploaded: 上传确认后是否删除本地文件
+        """
+        self.scraper = scraper
+        self.upload = upload
+        self.queue_size = queue_size or default_queue_size()
+        self.delete_uploaded = delete_uploaded
+        self.uploaded = []
+        self.failed = []
+
+    async def run(self) -> tuple[list, list]:
+        """
+        执行扫描、下载与上传
+
+        Returns:
+            (上传成功的 MediaItem, 上传失败的 MediaItem)
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        consumer = asyncio.create_task(self._consume(queue))
+        try:
+            await self.scraper.fetch_media_files(on_file=queue.put)
+        finally:
+            await queue.put(None)
+            await consumer
+        return self.uploaded, self.failed
+
+    async def _consume(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            try:
+                ok = await self.upload(item)
+            except Exception as e:
+                print(f"  ❌ {item.filename} 上传异常: {e}")
+                ok = False
+
+            if not ok:
+                self.failed.append(item)
+                continue
+            self.uploaded.append(item)
+            if self.delete_uploaded:
+                try:
+                    os.remove(item.path)
+                except OSError:
+                    pass
@@ -0,0 +1,156 @@
+"""
+下载前的媒体筛选策略
+
+在发现阶段得到的推文元数据上筛选要下载的媒体，不需要的文件根本不会发起下载：
+- 媒体类型 (photo / video / animated_gif)
+- 视频时长上限；视频码率上限 (选择不超过上限的最高码率版本，全部超过时选最低码率)
+- 图片最小分辨率
+- 跳过转推、跳过引用推文
+
+策略配置在 config/media_policy.json (可用环境变量 X_MEDIA_POLICY 指定其它路径)：
+    {
+      "default": {"max_video_duration_s": 600},
+      "users": {"someone": {"media_types": ["photo"], "skip_retweets": true}}
+    }
+users 中的配置按键覆盖 default，用户名不区分大小写；未配置的项不做限制。
+
+GraphQL / 免浏览器模式的推文带有逐个媒体的尺寸、时长与码率，可逐个筛选；
+DOM 模式的推文只有 has_photo / has_video 标记，按推文整体筛选，其余条件以 gallery-dl --filter 表达式交给 gallery-dl。
+避免下载的字节数只能对视频按 码率 × 时长 估算，图片没有大小信息，只计数。
+"""
+
+import os
+import json
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'media_policy.json')
+
+MEDIA_TYPES = ("photo", "video", "animated_gif")
+
+
+def load_media_policy(username: str, path: str = None) -> "MediaPolicy":
+    """读取指定用户的筛选策略；配置文件不存在时返回不做任何限制的策略"""
+    path = path or os.getenv("X_MEDIA_POLICY") or CONFIG_PATH
+    if not os.path.exists(path):
+        return MediaPolicy()
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    options = dict(config.get("default") or {})
+    users = {name.lower(): value for name, value in (config.get("users") or {}).items()}
+    options.update(users.get(username.lower()) or {})
+    return MediaPolicy(**options)
+
+
+class MediaPolicy:
+    """单个用户的媒体筛选策略及其统计"""
+
+    def __init__(self, media_types: list = None, max_video_duration_s: float = None, max_video_bitrate: int = None,
+                 min_image_width: int = 0, min_image_height: int = 0,
+                 skip_retweets: bool = False, skip_quotes: bool = False):
+        """
+        Args:
+            media_types: 允许下载的媒体类型，默认全部
+            max_video_duration_s: 视频 (含 GIF) 时长上限，单位秒
+            max_video_bitrate: 视频码率上限，单位 bps
+            min_image_width: 图片最小宽度
+            min_image_height: 图片最小高度
+            skip_retweets: 跳过转推
+            skip_quotes: 跳过引用推文
+        """
+        unknown = set(media_types or ()) - set(MEDIA_TYPES)
+        if unknown:
+            raise ValueError(f"未知的媒体类型: {', '.join(sorted(unknown))} (可选: {', '.join(MEDIA_TYPES)})")
+        self.media_types = tuple(media_types) if media_types else MEDIA_TYPES
+        self.max_video_duration_s = max_video_duration_s
+        self.max_video_bitrate = max_video_bitrate
+        self.min_image_width = min_image_width
+        self.min_image_height = min_image_height
+        self.skip_retweets = skip_retweets
+        self.skip_quotes = skip_quotes
+        self.stats = {"tweets_skipped": 0, "media_skipped": 0, "videos_downgraded": 0, "bytes_avoided": 0}
+
+    @property
+    def active(self) -> bool:
+        """是否配置了任何限制"""
+        return (self.media_types != MEDIA_TYPES or bool(self.max_video_duration_s) or bool(self.max_video_bitrate)
+                or bool(self.min_image_width) or bool(self.min_image_height)
+                or self.skip_retweets or self.skip_quotes)
+
+    def select(self, tweet: dict, is_retweet: bool) -> dict | None:
+        """
+        按策略筛选一条推文的媒体，返回筛选后的推文记录 (副本)；整条推文都不需要下载时返回 None。
+        保留下来的媒体记录 num 字段为原始序号，保证文件名与归档键不因筛选而错位。
+        """
+        if (self.skip_retweets and is_retweet) or (self.skip_quotes and tweet.get("is_quote")):
+            return self._skip_tweet(tweet)
+
+        if not tweet.get("media"):
+            # DOM 记录：只能按推文整体判断媒体类型，逐个文件的条件交给 gallery-dl 过滤
+            wanted_photo = tweet["has_photo"] and "photo" in self.media_types
+            wanted_video = tweet["has_video"] and bool({"video", "animated_gif"} & set(self.media_types))
+            return tweet if wanted_photo or wanted_video else self._skip_tweet(tweet)
+
+        media = []
+        for num, item in enumerate(tweet["media"], 1):
+            item = dict(item, num=item.get("num", num))
+            if self._accept(item):
+                media.append(item)
+            else:
+                self.stats["media_skipped"] += 1
+                self.stats["bytes_avoided"] += self._estimated_size(item)
+        if not media:
+            self.stats["tweets_skipped"] += 1
+            return None
+        return dict(tweet, media=media,
+                    has_photo=any(m["type"] == "photo" for m in media),
+                    has_video=any(m["type"] != "photo" for m in media))
+
+    def _skip_tweet(self, tweet: dict) -> None:
+        self.stats["tweets_skipped"] += 1
+        for item in tweet.get("media") or []:
+            self.stats["media_skipped"] += 1
+            self.stats["bytes_avoided"] += self._estimated_size(item)
+        return None
+
+    def _accept(self, item: dict) -> bool:
+        """判断单个媒体是否下载；视频超过码率上限时原地改为选用较低码率的版本"""
+        if item["type"] not in self.media_types:
+            return False
+        if item["type"] == "photo":
+            return item.get("width", 0) >= self.min_image_width and item.get("height", 0) >= self.min_image_height
+        if self.max_video_duration_s and item.get("duration_ms", 0) > self.max_video_duration_s * 1000:
+            return False
+        if self.max_video_bitrate and item.get("bitrate", 0) > self.max_video_bitrate and item.get("variants"):
+            under_cap = [v for v in item["variants"] if v.get("bitrate", 0) <= self.max_video_bitrate]
+            chosen = max(under_cap, key=lambda v: v.get("bitrate", 0)) if under_cap \
+                else min(item["variants"], key=lambda v: v.get("bitrate", 0))
+            if chosen["url"] != item["url"]:
+                self.stats["videos_downgraded"] += 1
+                self.stats["bytes_avoided"] += self._estimated_size(item) - self._estimated_size(dict(item, **chosen))
+                item.update(url=chosen["url"], bitrate=chosen.get("bitrate", 0))
+        return True
+
+    @staticmethod
+    def _estimated_size(item: dict) -> int:
+        """按 码率 × 时长 估算视频大小；图片或缺少信息时为 0"""
+        return int(item.get("bitrate", 0) * item.get("duration_ms", 0) / 8000)
+
+    def gallery_dl_filter(self) -> str | None:
+        """
+        逐个文件条件的 gallery-dl --filter 表达式 (媒体类型、图片分辨率)，无限制时返回 None。
+        时长与码率在 gallery-dl 元数据中不一定存在，不放入表达式。
+        """
+        conditions = []
+        if self.media_types != MEDIA_TYPES:
+            conditions.append(f"type in {self.media_types!r}")
+        if self.min_image_width or self.min_image_height:
+            conditions.append(f"(type != 'photo' or (width >= {self.min_image_width} "
+                              f"and height >= {self.min_image_height}))")
+        return " and ".join(conditions) or None
+
+    def report(self, label: str):
+        """打印筛选统计 (没有跳过任何内容时不输出)"""
+        if not (self.stats["media_skipped"] or self.stats["tweets_skipped"] or self.stats["videos_downgraded"]):
+            return
+        print(f"  🎚️ [{label}] 媒体筛选: 跳过 {self.stats['tweets_skipped']} 条推文 / {self.stats['media_skipped']} 个媒体，"
+              f"降低码率 {self.stats['videos_downgraded']} 个视频，估计少下载 "
+              f"{self.stats['bytes_avoided'] / 1024 / 1024:.1f} MB")
@@ -0,0 +1,93 @@
+"""
+浏览器资源拦截
+
+X 扫描只需要时间线 DOM 与 GraphQL JSON，夸克网盘自动化只需要页面脚本与接口请求，
+图片、视频、字体以及统计/广告脚本都可以在浏览器上下文层面直接中止：
+- PROFILES 以命名配置描述要拦截的资源类型与 URL 片段 ("x-scan" / "quark-ui")
+- 同一个 ResourceBlocker 可挂到多个上下文，统计合并：被拦截的请求数 (按资源类型)、
+  放行的请求数与其实际传输字节数；被拦截的请求根本没有发出，因此只能统计次数而无法得知字节数
+- 启用路由拦截后 Playwright 会关闭该上下文的 HTTP 缓存，以省下的媒体流量换取
+- 环境变量 X_BLOCK_RESOURCES=0 可整体关闭拦截，便于排查页面显示异常
+"""
+
+import os
+
+PROFILES = {
+    # X 时间线扫描：媒体地址从 DOM 属性或 GraphQL 响应中读取，无需真正加载
+    "x-scan": {
+        "resource_types": ("image", "media", "font"),
+        "url_patterns": (
+            "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+            "ads-api.x.com", "ads-twitter.com", "analytics.twitter.com",
+            "/i/jot", "/1.1/jot/", "/client_event",
+        ),
+    },
+    # 夸克网盘页面：上传与离线下载只依赖按钮和接口，预览图、图标字体和埋点均可省去
+    "quark-ui": {
+        "resource_types": ("image", "media", "font"),
+        "url_patterns": (
+            "mmstat.com", "arms-retcode", "/alilog/", "hm.baidu.com", "cnzz.com",
+            "google-analytics.com", "googletagmanager.com",
+        ),
+    },
+}
+
+
+def blocking_enabled() -> bool:
+    """是否启用资源拦截 (环境变量 X_BLOCK_RESOURCES，默认 1)"""
+    return os.getenv("X_BLOCK_RESOURCES", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+class ResourceBlocker:
+    """按命名配置中止不需要的请求，并统计拦截/放行情况"""
+
+    def __init__(self, profile: str):
+        """
+        Args:
+            profile: PROFILES 中的配置名
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"未知的资源拦截配置: {profile} (可选: {', '.join(PROFILES)})")
+        config = PROFILES[profile]
+        self.profile = profile
+        self.resource_types = frozenset(config["resource_types"])
+        self.url_patterns = tuple(config["url_patterns"])
+        self.enabled = blocking_enabled()
+        self.stats = {"blocked": 0, "blocked_types": {}, "allowed": 0, "allowed_bytes": 0}
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        """按资源类型或 URL 片段判断是否拦截"""
+        return resource_type in self.resource_types or any(p in url for p in self.url_patterns)
+
+    async def attach(self, context):
+        """为浏览器上下文注册拦截路由与流量统计"""
+        if not self.enabled:
+            return
+        await context.route("**/*", self._handle_route)
+        context.on("requestfinished", self._on_request_finished)
+
+    async def _handle_route(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.stats["blocked"] += 1
+            blocked_types = self.stats["blocked_types"]
+            blocked_types[request.resource_type] = blocked_types.get(request.resource_type, 0) + 1
+            await route.abort("blockedbyclient")
+            return
+        self.stats["allowed"] += 1
+        await route.continue_()
+
+    async def _on_request_finished(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        self.stats["allowed_bytes"] += sizes.get("responseHeadersSize", 0) + sizes.get("responseBodySize", 0)
+
+    def report(self):
+        """打印拦截统计 (没有任何请求时不输出)"""
+        if not self.enabled or not (self.stats["blocked"] or self.stats["allowed"]):
+            return
+        types = ", ".join(f"{name} {count}" for name, count in sorted(self.stats["blocked_types"].items()))
+        print(f"  🛡️ 资源拦截 [{self.profile}]: 拦截 {self.stats['blocked']} 个请求 ({types or '无'}) | "
+              f"放行 {self.stats['allowed']} 个请求，共 {self.stats['allowed_bytes'] / 1024 / 1024:.1f} MB")
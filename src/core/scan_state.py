@@ -0,0 +1,211 @@
+"""
+跨运行的扫描状态持久化
+
+HighWaterStore 按 "用户 × 目的地" 记录已连续归档的时间范围：
+[since, scanned_at) 内的本人媒体推文均已归档，tweet_id / datetime 为范围内最新的一条。
+下一次扫描的时间下限落在该范围内时，滚动到 tweet_id 即可停止；
+下限更早 (如日常 "3天" 之后再跑 "1年") 时只跳过范围内的推文，范围以外照常扫描。
+ScanCheckpointStore 保存长时间扫描的断点 (已采集的推文、到达的最早时间、分页游标)，
+任务超时或 Cookie 异常中断后，重新运行可以从断点继续。
+
+状态文件是一个小 JSON (默认 state/high_water.json，可用 X_STATE_DIR 修改)，
+便于放入 GitHub Actions cache。多个进程并发写入时通过文件锁串行化。
+"""
+
+import os
+import json
+import fcntl
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+
+def state_dir() -> str:
+    """状态文件所在目录"""
+    return os.getenv("X_STATE_DIR", "state")
+
+
+@contextmanager
+def locked_json(path: str):
+    """
+    在独占文件锁内读取 JSON 文件，退出时原子写回 (先写临时文件再 os.replace)
+
+    用法:
+        with locked_json(path) as data:
+            data["key"] = value
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            data = {}
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+
+            yield data
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class HighWaterStore:
+    """按用户与目的地记录已连续归档的时间范围"""
+
+    FILE_NAME = "high_water.json"
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(state_dir(), self.FILE_NAME)
+
+    def get(self, username: str, destination: str) -> dict | None:
+        """
+        读取归档范围，形如 {"tweet_id", "datetime", "since", "scanned_at"} (时间均为 ISO 8601)；
+        没有记录时返回 None。旧格式只有 tweet_id / datetime，视为只覆盖该推文本身。
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        mark = data.get(username.lower(), {}).get(destination)
+        if mark:
+            mark.setdefault("since", mark.get("datetime"))
+            mark.setdefault("scanned_at", mark.get("datetime"))
+        return mark
+
+    def cover(self, username: str, destination: str, tweet_id: str, posted_at: str, since: str, scanned_at: str) -> bool:
+        """
+        写入新的归档范围 (调用方已与旧范围合并)
+
+        Returns:
+            记录是否有变化
+        """
+        mark = {"tweet_id": str(tweet_id), "datetime": posted_at, "since": since, "scanned_at": scanned_at}
+        with locked_json(self.path) as data:
+            user_marks = data.setdefault(username.lower(), {})
+            if user_marks.get(destination) == mark:
+                return False
+            user_marks[destination] = mark
+            return True
+
+    def merge(self, other_path: str) -> int:
+        """
+        合并另一份状态文件 (并行任务各自的副本)，同一 "用户 × 目的地" 保留 scanned_at 较新的范围，
+        相同时保留下界较早的一个
+
+        Returns:
+            被更新的记录数
+        """
+        if not os.path.exists(other_path):
+            return 0
+        with open(other_path, "r", encoding="utf-8") as f:
+            other = json.load(f)
+
+        def rank(mark: dict) -> tuple:
+            top = mark.get("scanned_at") or mark.get("datetime")
+            since = mark.get("since") or mark.get("datetime")
+            return datetime.fromisoformat(top), -datetime.fromisoformat(since).timestamp()
+
+        changed = 0
+        with locked_json(self.path) as data:
+            for username, marks in other.items():
+                user_marks = data.setdefault(username, {})
+                for destination, mark in marks.items():
+                    current = user_marks.get(destination)
+                    if current is None or rank(mark) > rank(current):
+                        user_marks[destination] = mark
+                        changed += 1
+        return changed
+
+
+class ScanCheckpointStore:
+    """长时间扫描的断点，每个用户一个 JSON 文件 (默认 state/checkpoints/<用户名>.json)"""
+
+    DIR_NAME = "checkpoints"
+    # 超过该时长的断点视为过期，重新完整扫描
+    MAX_AGE = timedelta(days=7)
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.path.join(state_dir(), self.DIR_NAME)
+
+    def _path(self, username: str) -> str:
+        return os.path.join(self.directory, f"{username.lower()}.json")
+
+    def load(self, username: str, time_range: str) -> dict | None:
+        """
+        读取断点，形如 {"tweets": {tweet_id: 记录}, "oldest": ISO 时间, "cursor": 游标, "started_at": ISO 时间}；
+        不存在、时间范围不一致或已过期时返回 None
+        """
+        path = self._path(username)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("time_range") != time_range:
+            return None
+        updated_at = datetime.fromisoformat(data.get("updated_at", "1970-01-01T00:00:00+00:00"))
+        if datetime.now(timezone.utc) - updated_at > self.MAX_AGE:
+            return None
+        return data
+
+    def save(self, username: str, time_range: str, tweets: dict, oldest: str = None, cursor: str = None,
+             started_at: str = None):
+        """覆盖写入断点；started_at 为最初开始扫描的时间，续扫后推进归档范围时作为范围上界"""
+        with locked_json(self._path(username)) as data:
+            data.clear()
+            data.update({
+                "time_range": time_range,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "started_at": started_at,
+                "oldest": oldest,
+                "cursor": cursor,
+                "tweets": tweets,
+            })
+
+    def clear(self, username: str):
+        """扫描完整结束后删除断点"""
+        path = self._path(username)
+        for p in (path, f"{path}.lock"):
+            if os.path.exists(p):
+                os.remove(p)
+
+    def merge(self, sources: list) -> int:
+        """
+        合并并行任务各自的断点目录 (均从本目录的同一份状态出发)：
+        本目录已有、但某个副本中不存在的断点视为已扫描完成被删除；
+        其余断点取 updated_at 最新的一份
+
+        Returns:
+            合并后的断点数
+        """
+        names = {name for name in os.listdir(self.directory) if name.endswith(".json")} \
+            if os.path.isdir(self.directory) else set()
+        copies = {}
+        for source in sources:
+            if not os.path.isdir(source):
+                continue
+            found = {name for name in os.listdir(source) if name.endswith(".json")}
+            for name in names - found:
+                copies[name] = None
+            for name in found:
+                if name in copies and copies[name] is None:
+                    continue
+                with open(os.path.join(source, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                current = copies.get(name)
+                if current is None or data.get("updated_at", "") > current.get("updated_at", ""):
+                    copies[name] = data
+
+        for name, data in copies.items():
+            username = name[:-len(".json")]
+            if data is None:
+                self.clear(username)
+                continue
+            with locked_json(self._path(username)) as target:
+                target.clear()
+                target.update(data)
+        return len([n for n in os.listdir(self.directory) if n.endswith(".json")]) \
+            if os.path.isdir(self.directory) else 0
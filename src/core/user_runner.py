@@ -0,0 +1,47 @@
+"""
+多用户并发执行
+
+各任务脚本把 "扫描 → 下载 → 上传 → 清理" 写成单用户协程，交给 run_users 按 --parallel-users 并发执行：
+- 每个用户的扫描从共享 BrowserPool 借用独立的浏览器上下文
+- 下载阶段 (流水线中即边下边传的整个阶段) 再经过全局的 transfer_slots 信号量，
+  避免 N 个用户同时占满带宽与磁盘；同一上传器的上传由任务内的锁串行化
+- 单个用户失败不影响其它用户，全部结束后再抛出第一个异常，保持任务的失败退出码
+"""
+
+import os
+import asyncio
+import argparse
+
+
+def default_transfer_slots() -> int:
+    """同时处于下载/上传阶段的用户数上限 (环境变量 X_TRANSFER_CONCURRENCY，默认 2)"""
+    return int(os.getenv("X_TRANSFER_CONCURRENCY", "2"))
+
+
+def add_parallel_arguments(parser: argparse.ArgumentParser):
+    """为任务脚本添加 --parallel-users 参数"""
+    parser.add_argument('--parallel-users', type=int, default=1,
+                        help="同时扫描的用户数，每个用户使用共享浏览器中的独立上下文 (默认 1，即逐个处理)")
+
+
+async def run_users(users: list, worker, parallel_users: int = 1):
+    """
+    以最多 parallel_users 的并发度对每个用户执行 worker(user)
+
+    Args:
+        users: 用户名列表
+        worker: 处理单个用户的协程函数
+        parallel_users: 并发用户数
+    """
+    semaphore = asyncio.Semaphore(max(1, parallel_users))
+
+    async def run(user: str):
+        async with semaphore:
+            await worker(user)
+
+    results = await asyncio.gather(*(run(user) for user in users), return_exceptions=True)
+    errors = [(user, result) for user, result in zip(users, results) if isinstance(result, BaseException)]
+    for user, error in errors:
+        print(f"❌ 用户 {user} 处理失败: {error!r}")
+    if errors:
+        raise errors[0][1]
@@ -0,0 +1,316 @@
+"""
+X 平台时间线 GraphQL 响应解析与免浏览器客户端
+
+把 UserTweets / UserMedia 等时间线接口返回的 JSON 解析为推文记录，
+记录结构与 DOM 模式一致 ({tweet_id, datetime, has_photo, has_video, href})，
+并额外携带完整的媒体信息 (原图地址、视频全部 mp4 码率版本、时长、分辨率)。
+XTimelineClient 则直接携带 Cookie 会话调用同一组接口，无需启动浏览器。
+"""
+
+import os
+import json
+from datetime import datetime
+
+import httpx
+
+# 时间线类 GraphQL 操作名 (搜索结果与时间线使用相同的 instructions 结构)
+TIMELINE_OPERATIONS = ("UserTweets", "UserMedia", "SearchTimeline")
+
+
+def is_timeline_response(url: str) -> bool:
+    """判断响应 URL 是否为时间线 GraphQL 接口"""
+    if "/graphql/" not in url:
+        return False
+    path = url.split("?", 1)[0]
+    return path.rsplit("/", 1)[-1] in TIMELINE_OPERATIONS
+
+
+def parse_created_at(created_at: str) -> str | None:
+    """将 'Wed Oct 10 20:19:24 +0000 2018' 转为 ISO 8601 字符串"""
+    if not created_at:
+        return None
+    try:
+        return datetime.strptime(created_at, "%a %b %d %H:%M:%S %z %Y").isoformat()
+    except ValueError:
+        return None
+
+
+def _unwrap_tweet(result: dict) -> dict:
+    """受限可见推文会被包一层 TweetWithVisibilityResults"""
+    if result.get("__typename") == "TweetWithVisibilityResults":
+        return result.get("tweet") or {}
+    return result
+
+
+def _screen_name(tweet: dict) -> str:
+    user = ((tweet.get("core") or {}).get("user_results") or {}).get("result") or {}
+    return (user.get("core") or {}).get("screen_name") or (user.get("legacy") or {}).get("screen_name") or ""
+
+
+def parse_media(legacy: dict) -> list[dict]:
+    """解析推文的 extended_entities.media 为媒体列表"""
+    media_list = []
+    for media in (legacy.get("extended_entities") or {}).get("media") or []:
+        original = media.get("original_info") or {}
+        item = {
+            "type": media.get("type", "photo"),
+            "url": media.get("media_url_https", ""),
+            "width": original.get("width", 0),
+            "height": original.get("height", 0),
+        }
+        video_info = media.get("video_info")
+        if video_info:
+            variants = sorted(
+                (v for v in video_info.get("variants") or [] if v.get("content_type") == "video/mp4"),
+                key=lambda v: v.get("bitrate", 0),
+                reverse=True,
+            )
+            item["variants"] = [{"url": v["url"], "bitrate": v.get("bitrate", 0)} for v in variants]
+            item["duration_ms"] = video_info.get("duration_millis", 0)
+            if variants:
+                item["url"] = variants[0]["url"]
+                item["bitrate"] = variants[0].get("bitrate", 0)
+        media_list.append(item)
+    return media_list
+
+
+def parse_tweet_result(result: dict, pinned: bool = False) -> dict | None:
+    """将 tweet_results.result 解析为推文记录，无法识别时返回 None"""
+    tweet = _unwrap_tweet(result or {})
+    legacy = tweet.get("legacy") or {}
+    tweet_id = legacy.get("id_str") or tweet.get("rest_id")
+    if not tweet_id:
+        return None
+
+    # 转推的媒体与发布时间属于原推文，与 DOM 模式中 <time> 链接指向原推文保持一致
+    retweeted = _unwrap_tweet((legacy.get("retweeted_status_result") or {}).get("result") or {})
+    source = retweeted if retweeted.get("legacy") else tweet
+    source_legacy = source.get("legacy") or {}
+    source_id = source_legacy.get("id_str") or source.get("rest_id") or tweet_id
+    author = _screen_name(source)
+    media = parse_media(source_legacy)
+
+    return {
+        "tweet_id": source_id,
+        "datetime": parse_created_at(source_legacy.get("created_at")),
+        "has_photo": any(m["type"] == "photo" for m in media),
+        "has_video": any(m["type"] in ("video", "animated_gif") for m in media),
+        "href": f"/{author or 'i'}/status/{source_id}",
+        "author": author,
+        "media": media,
+        "pinned": pinned,
+        "is_retweet": source is retweeted,
+        "is_quote": bool(legacy.get("is_quote_status")),
+    }
+
+
+def _find_instructions(node) -> list:
+    """在任意嵌套的响应中查找时间线 instructions 列表"""
+    if isinstance(node, dict):
+        instructions = node.get("instructions")
+        if isinstance(instructions, list):
+            return instructions
+        for value in node.values():
+            found = _find_instructions(value)
+            if found:
+                return found
+    elif isinstance(node, list):
+        for value in node:
+            found = _find_instructions(value)
+            if found:
+                return found
+    return []
+
+
+def _walk_entries(node, pinned: bool, records: list, cursors: dict):
+    """遍历时间线条目，收集推文结果与分页游标 (不深入推文内部，避免把引用推文当作独立条目)"""
+    if isinstance(node, list):
+        for value in node:
+            _walk_entries(value, pinned, records, cursors)
+        return
+    if not isinstance(node, dict):
+        return
+
+    if "tweet_results" in node:
+        record = parse_tweet_result((node.get("tweet_results") or {}).get("result"), pinned=pinned)
+        if record:
+            records.append(record)
+        return
+
+    cursor_type = node.get("cursorType")
+    if cursor_type and node.get("value"):
+        cursors[cursor_type] = node["value"]
+        return
+
+    for value in node.values():
+        _walk_entries(value, pinned, records, cursors)
+
+
+def parse_timeline_payload(payload: dict) -> tuple[list[dict], str | None]:
+    """
+    解析一页时间线响应
+
+    Returns:
+        (推文记录列表, 向下翻页的 Bottom 游标；没有时为 None)
+    """
+    records = []
+    cursors = {}
+    for instruction in _find_instructions(payload):
+        pinned = instruction.get("type") == "TimelinePinEntry"
+        _walk_entries(instruction, pinned, records, cursors)
+    return records, cursors.get("Bottom")
+
+
+class XTimelineClient:
+    """
+    免浏览器的时间线客户端：直接携带 Cookie 会话调用 GraphQL 接口并沿游标翻页。
+
+    用法:
+        async with XTimelineClient(cookies_raw) as client:
+            user_id = await client.fetch_user_id("someone")
+            async for records, cursor in client.iter_timeline(user_id):
+                ...
+
+    api_base 可指向本地伪服务器 (返回录制好的 JSON 分页) 以便离线验证。
+    """
+
+    API_BASE = "https://x.com/i/api/graphql"
+    # Web 客户端公开内置的 Bearer Token
+    BEARER_TOKEN = (
+        "AAAAAAAAAAAAAAAAAAAAANRILgAAAAAAnNwIzUejRCOuH5E6I8xnZz4puTs"
+        "%3D1Zv7ttfk8LF81IUq16cHjhLTvJu4FA33AGWWjCpTnA"
+    )
+    # GraphQL 查询 ID 会随 X 前端发版轮换，可通过环境变量 X_GRAPHQL_QUERY_IDS (JSON) 覆盖
+    QUERY_IDS = {
+        "UserByScreenName": "32pL5BWe9WKeSK1MoPvFQQ",
+        "UserTweets": "E3opETHurmVJflFsUBVuUQ",
+        "UserMedia": "MOLbHrtk8Ovu7DUNOLcXiA",
+    }
+    FEATURES = {
+        "rweb_tipjar_consumption_enabled": True,
+        "responsive_web_graphql_exclude_directive_enabled": True,
+        "verified_phone_label_enabled": False,
+        "creator_subscriptions_tweet_preview_api_enabled": True,
+        "responsive_web_graphql_timeline_navigation_enabled": True,
+        "responsive_web_graphql_skip_user_profile_image_extensions_enabled": False,
+        "communities_web_enable_tweet_community_results_fetch": True,
+        "c9s_tweet_anatomy_moderator_badge_enabled": True,
+        "articles_preview_enabled": True,
+        "tweetypie_unmention_optimization_enabled": True,
+        "responsive_web_edit_tweet_api_enabled": True,
+        "graphql_is_translatable_rweb_tweet_is_translatable_enabled": True,
+        "view_counts_everywhere_api_enabled": True,
+        "longform_notetweets_consumption_enabled": True,
+        "responsive_web_twitter_article_tweet_consumption_enabled": True,
+        "tweet_awards_web_tipping_enabled": False,
+        "creator_subscriptions_quote_tweet_preview_enabled": False,
+        "freedom_of_speech_not_reach_fetch_enabled": True,
+        "standardized_nudges_misinfo": True,
+        "tweet_with_visibility_results_prefer_gql_limited_actions_policy_enabled": True,
+        "rweb_video_timestamps_enabled": True,
+        "longform_notetweets_rich_text_read_enabled": True,
+        "longform_notetweets_inline_media_enabled": True,
+        "responsive_web_enhance_cards_enabled": False,
+        "hidden_profile_subscriptions_enabled": True,
+        "subscriptions_verification_info_is_identity_verified_enabled": True,
+        "subscriptions_verification_info_verified_since_enabled": True,
+        "highlights_tweets_tab_ui_enabled": True,
+        "responsive_web_twitter_article_notes_tab_enabled": True,
+        "subscriptions_feature_can_gift_premium": True,
+    }
+    REQUEST_TIMEOUT = 30
+    PAGE_SIZE = 100
+
+    def __init__(self, cookies_raw: str, api_base: str = None):
+        """
+        Args:
+            cookies_raw: X 平台的原始 Cookie 字符串 (JSON 格式，需包含 ct0 与 auth_token)
+            api_base: GraphQL 接口根地址，默认读取环境变量 X_API_BASE
+        """
+        self.api_base = (api_base or os.getenv("X_API_BASE") or self.API_BASE).rstrip("/")
+        self.query_ids = {**self.QUERY_IDS, **json.loads(os.getenv("X_GRAPHQL_QUERY_IDS") or "{}")}
+        self.cookies = self._parse_cookies(cookies_raw)
+        self.client = None
+
+    @staticmethod
+    def _parse_cookies(cookies_raw: str) -> dict:
+        if not cookies_raw:
+            return {}
+        try:
+            data = json.loads(cookies_raw)
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(data, list):
+            return {}
+        return {c["name"]: c.get("value", "") for c in data if c.get("name")}
+
+    async def __aenter__(self):
+        csrf_token = self.cookies.get("ct0")
+        if not csrf_token:
+            raise ValueError("Cookie 中缺少 ct0，无法构造 x-csrf-token")
+
+        self.client = httpx.AsyncClient(
+            headers={
+                "authorization": f"Bearer {self.BEARER_TOKEN}",
+                "x-csrf-token": csrf_token,
+                "x-twitter-auth-type": "OAuth2Session",
+                "x-twitter-active-user": "yes",
+                "content-type": "application/json",
+                "user-agent": (
+                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                    "(KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36"
+                ),
+            },
+            cookies=self.cookies,
+            timeout=self.REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+        self.client = None
+
+    async def _query(self, operation: str, variables: dict) -> dict:
+        params = {
+            "variables": json.dumps(variables, separators=(",", ":")),
+            "features": json.dumps(self.FEATURES, separators=(",", ":")),
+        }
+        url = f"{self.api_base}/{self.query_ids[operation]}/{operation}"
+        response = await self.client.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def fetch_user_id(self, screen_name: str) -> str:
+        """用户名 -> 数字用户 ID (rest_id)"""
+        payload = await self._query("UserByScreenName", {"screen_name": screen_name})
+        user = ((payload.get("data") or {}).get("user") or {}).get("result") or {}
+        user_id = user.get("rest_id")
+        if not user_id:
+            raise LookupError(f"无法解析用户 {screen_name} 的 ID (可能已封禁或不存在): {user.get('__typename')}")
+        return user_id
+
+    async def iter_timeline(self, user_id: str, operation: str = "UserMedia", cursor: str = None):
+        """
+        沿 Bottom 游标逐页拉取时间线，每页产出 (推文记录列表, 下一页游标)。
+        推文为空或游标不再变化时结束。
+        """
+        while True:
+            variables = {
+                "userId": user_id,
+                "count": self.PAGE_SIZE,
+                "includePromotedContent": False,
+                "withClientEventToken": False,
+                "withBirdwatchNotes": False,
+                "withVoice": True,
+                "withV2Timeline": True,
+            }
+            if cursor:
+                variables["cursor"] = cursor
+
+            records, next_cursor = parse_timeline_payload(await self._query(operation, variables))
+            yield records, next_cursor
+
+            if not records or not next_cursor or next_cursor == cursor:
+                return
+            cursor = next_cursor
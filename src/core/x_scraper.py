@@ -1,23 +1,191 @@
 import os
 import shutil
+import time
 import asyncio
-from datetime import datetime
+import itertools
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import quote
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
-import subprocess
-import glob
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from core.x_graphql import XTimelineClient, is_timeline_response, parse_timeline_payload
+from core.scan_state import HighWaterStore, ScanCheckpointStore
+from core.media_manifest import MediaItem, newest_first
+from core.media_policy import MediaPolicy, load_media_policy
+from core.download_pool import GalleryDlPool
+from core.media_downloader import MediaDownloader
+from core.browser_pool import BrowserPool, default_page_heap_limit_mb, read_page_metrics
 
 # 加载环境变量
 load_dotenv()
 
+
+class CollectedTweets(dict):
+    """
+    扫描中采集到的推文 (tweet_id -> 推文记录)。
+    通过 add() 登记新推文时增量维护本人推文 (不含置顶与转推) 的最早发布时间与最小推文 ID，
+    停止条件、断点与换页只读取这两个值，不必在每次滚动后重新解析全部推文的时间。
+    """
+
+    def __init__(self, marks_position, tweets: dict = None):
+        """
+        Args:
+            marks_position: 判断推文是否代表时间线位置的函数 (XScraper._marks_timeline_position)
+            tweets: 预先已采集的推文 (如断点中的推文)
+        """
+        super().__init__()
+        self._marks_position = marks_position
+        self.oldest_at = None
+        self.min_position_id = None
+        self.media_count = 0
+        for record in (tweets or {}).values():
+            self.add(record)
+
+    def add(self, record: dict) -> bool:
+        """登记一条推文；已存在时保留先到的记录并返回 False"""
+        tweet_id = record["tweet_id"]
+        if tweet_id in self:
+            return False
+        self[tweet_id] = record
+        if record["has_photo"] or record["has_video"]:
+            self.media_count += 1
+        if self._marks_position(record):
+            posted_at = XScraper._parse_tweet_datetime(record.get("datetime"))
+            if posted_at and (self.oldest_at is None or posted_at < self.oldest_at):
+                self.oldest_at = posted_at
+            if self.min_position_id is None or int(tweet_id) < self.min_position_id:
+                self.min_position_id = int(tweet_id)
+        return True
+
+
 class XScraper:
-    def __init__(self, username: str, time_range: str = "1个月", download_root: str = "downloads", cookies_raw: str = None):
+    # 推文发现模式: dom = 逐个 article 轮询; observer = 页面内 MutationObserver 推送;
+    # graphql = 拦截时间线 GraphQL 响应 (含完整媒体信息); http = 免浏览器直接调用 GraphQL 接口;
+    # search = 按月切分 from:user since/until 搜索窗口并行扫描 (适合 1年/全部 等长时间范围)
+    DISCOVERY_MODES = ("dom", "observer", "graphql", "http", "search")
+    # http 模式失败时回退使用的浏览器发现模式
+    BROWSER_FALLBACK_MODE = "graphql"
+    # search 模式：窗口内的采集方式、同时扫描的窗口数、单窗口滚动上限，以及最早的搜索日期 (X 上线日)
+    SEARCH_COLLECT_MODE = "graphql"
+    SEARCH_PARALLEL_WINDOWS = 3
+    SEARCH_WINDOW_MAX_SCROLLS = 300
+    SEARCH_EARLIEST_DATE = date(2006, 3, 21)
+    # 这些时间范围的扫描每滚动/翻页 CHECKPOINT_INTERVAL 次写一次断点，中断后重新运行从断点继续
+    CHECKPOINT_TIME_RANGES = ("1年", "全部")
+    CHECKPOINT_INTERVAL = 20
+    # 这些结束原因表示扫描未完整结束 (页面异常 / 未能加载出推文)，需要保留断点
+    INCOMPLETE_STOP_REASONS = ("error", "no_tweets")
+    # 这些结束原因表示扫描确实到达了时间范围下限 (或已归档范围)，只有这时才推进归档范围；
+    # error / stalled / max_scrolls 等提前结束的扫描不推进，下限以上未扫到的推文下次仍会被扫描
+    REACHED_FLOOR_STOP_REASONS = ("time_limit", "high_water", "exhausted")
+    # 分段下载的 .part / .part.json 续传数据超过该时长未更新即丢弃
+    PARTIAL_MAX_AGE = timedelta(days=7)
+    # 每滚动 PAGE_METRICS_INTERVAL 次采样页面指标；JS 堆超过 X_PAGE_HEAP_LIMIT_MB 或 DOM 节点超过该值时换新页面
+    PAGE_METRICS_INTERVAL = 25
+    PAGE_NODE_LIMIT = 150000
+    OBSERVER_BINDING = "__xScraperEmit"
+    OBSERVER_SCRIPT = """
+(() => {
+  if (window.__xScraperObserver) return;
+  window.__xScraperObserver = true;
+  const seen = new Set();
+
+  const processArticle = (article) => {
+    const time = article.querySelector('time');
+    const link = time && time.closest('a[href*="/status/"]');
+    if (!link) return;
+    const href = link.getAttribute('href').split('?')[0];
+    const match = href.match(/\\/status\\/(\\d+)/);
+    if (!match || seen.has(match[1])) return;
+
+    // 敏感内容遮罩：先揭开，稍后重新处理该推文；多次点击仍未揭开时照常上报，避免无限重试
+    const reveal = Array.from(article.querySelectorAll('[role="button"] span'))
+      .find((span) => span.textContent.trim() === 'View');
+    const attempts = Number(article.dataset.xScraperReveal || 0);
+    if (reveal && attempts < 3) {
+      article.dataset.xScraperReveal = String(attempts + 1);
+      reveal.click();
+      setTimeout(() => processArticle(article), 500);
+      return;
+    }
+
+    seen.add(match[1]);
+    const social = article.querySelector('[data-testid="socialContext"]');
+    window.__xScraperEmit({
+      tweet_id: match[1],
+      datetime: time.getAttribute('datetime'),
+      has_photo: !!article.querySelector('div[data-testid="tweetPhoto"]'),
+      has_video: !!article.querySelector('div[data-testid="videoPlayer"]'),
+      href: href,
+      pinned: !!social && /Pinned|置顶|固定/.test(social.textContent),
+    });
+  };
+
+  const scan = (root) => {
+    if (root.matches && root.matches('article[data-testid="tweet"]')) processArticle(root);
+    else if (root.querySelectorAll) root.querySelectorAll('article[data-testid="tweet"]').forEach(processArticle);
+  };
+
+  const start = () => {
+    new MutationObserver((mutations) => {
+      for (const mutation of mutations) {
+        for (const node of mutation.addedNodes) {
+          if (node.nodeType === Node.ELEMENT_NODE) scan(node);
+        }
+      }
+    }).observe(document.body, { childList: true, subtree: true });
+    scan(document);
+  };
+
+  if (document.body) start();
+  else document.addEventListener('DOMContentLoaded', start);
+})();
+"""
+
+    # 滚动节奏：滚动后等待新推文出现，最多等待 SCROLL_IDLE_TIMEOUT 秒；出现后再留一点渲染余量
+    SCROLL_DISTANCE = 2500
+    SCROLL_IDLE_TIMEOUT = 6.0
+    SCROLL_SETTLE_SECONDS = 0.3
+    # 连续多少次滚动没有新推文即判定到达时间线末尾
+    STALL_SCROLL_LIMIT = 5
+    # 滚动并返回滚动前最后一条推文的链接，作为 DOM 模式判断新内容的标记
+    SCROLL_SCRIPT = """
+(distance) => {
+  const articles = document.querySelectorAll('article[data-testid="tweet"]');
+  const last = articles[articles.length - 1];
+  const time = last && last.querySelector('time');
+  const link = time && time.closest('a[href*="/status/"]');
+  window.scrollBy(0, distance);
+  return link ? link.getAttribute('href') : null;
+}
+"""
+    DOM_GROWTH_SCRIPT = """
+(marker) => {
+  const articles = document.querySelectorAll('article[data-testid="tweet"]');
+  const last = articles[articles.length - 1];
+  const time = last && last.querySelector('time');
+  const link = time && time.closest('a[href*="/status/"]');
+  return !!link && link.getAttribute('href') !== marker;
+}
+"""
+
+    def __init__(self, username: str, time_range: str = "1个月", download_root: str = "downloads", cookies_raw: str = None,
+                 discovery_mode: str = None, destination: str = None, archive=None, browser_pool: BrowserPool = None,
+                 transfer_slots: asyncio.Semaphore = None, destinations: list = None, media_policy: MediaPolicy = None):
         """
         初始化 X 平台爬虫。
         :param username: 需要抓取的 X 用户名
-        :param time_range: 抓取的时间范围 (当天/3天/1周/1个月/1年/全部)
+        :param time_range: 抓取的时间范围 (当天/3天/1周/1个月/3个月/半年/1年/全部)
         :param download_root: 下载文件的临时根目录
         :param cookies_raw: X 平台的原始 Cookie 字符串 (JSON 格式)
+        :param discovery_mode: 推文发现模式 (dom/observer/graphql/http/search)，默认读取环境变量 X_DISCOVERY_MODE
+        :param destination: 归档目的地标识 (如 115/quark/google)，指定后跳过该目的地已连续归档的时间范围
+        :param archive: 共享的 MediaArchive，配合 destination 在下载前跳过已全部归档的推文
+        :param browser_pool: 任务级共享的 BrowserPool；不传时每次浏览器扫描单独启动并关闭一个浏览器
+        :param transfer_slots: 多用户并发时共享的下载/上传信号量，下载阶段需先取得一个名额
+        :param destinations: 同时归档到多个目的地时使用 (与 destination 二选一)；
+                             只跳过所有目的地都已归档的时间范围与推文
+        :param media_policy: 下载前的媒体筛选策略，默认读取 config/media_policy.json 中该用户的配置
         """
         self.username = username
         self.time_range = time_range
@@ -25,6 +193,35 @@ class XScraper:
         self.cookies_raw = cookies_raw
         self.user_download_dir = os.path.join(self.download_root, self.username)
         self.today_str = datetime.now().strftime("%Y-%m-%d")
+        self.discovery_mode = discovery_mode or os.getenv("X_DISCOVERY_MODE", "dom")
+        self.scan_stats = {}
+        self.destinations = [destination] if destination else list(destinations or [])
+        self.destination = self.destinations[0] if len(self.destinations) == 1 else None
+        self.high_water_store = HighWaterStore()
+        self.high_water = self._combined_high_water()
+        self.checkpoint_store = ScanCheckpointStore()
+        # 本次发现阶段载入的断点 (没有时为 None)
+        self.checkpoint = None
+        # 本次扫描的时间下限、开始时间 (从断点继续时为最初开始的时间)，
+        # 以及扫描实际连续覆盖到的最早时间；用于推进归档范围
+        self.scan_floor = None
+        self.scan_started_at = None
+        self.scanned_since = None
+        self.archive = archive
+        self.browser_pool = browser_pool
+        self.transfer_slots = transfer_slots
+        self.page_heap_limit_mb = default_page_heap_limit_mb()
+        self.media_policy = media_policy or load_media_policy(username)
+        # 最近一次发现阶段得到的推文记录 (tweet_id -> record)，以及因已归档而跳过下载的推文
+        self.tweets = {}
+        self.skipped_tweet_ids = set()
+        # 按筛选策略整条不下载的推文，推进归档范围时与已归档推文同样视为完成
+        self.policy_skipped_ids = set()
+        # 最近一次下载的逐推文结果 (tweet_id -> 是否全部媒体下载成功)，以及下载清单
+        self.download_results = {}
+        self.manifest = []
+        if self.discovery_mode not in self.DISCOVERY_MODES:
+            raise ValueError(f"未知的推文发现模式: {self.discovery_mode} (可选: {', '.join(self.DISCOVERY_MODES)})")
 
     async def _load_cookies(self, context):
         import json
@@ -62,14 +259,19 @@ class XScraper:
             print(f"⚠️ X 平台：解析 Cookies 失败: {e}")
 
     def _prepare_cookies_file(self) -> str:
-        """为 yt-dlp 准备 Netscape 格式的 Cookie 文件"""
+        """
+        为 gallery-dl 准备 Netscape 格式的 Cookie 文件。
+        每个用户单独写一份到 download_root 下，并行处理多个用户时不会在其他用户的 gallery-dl 读取途中被改写；
+        用完后由 _remove_cookies_file 删除。
+        """
         if not self.cookies_raw:
             return None
-        cookie_file = "twitter_cookies.txt"
+        cookie_file = os.path.join(self.download_root, f".{self.username}_cookies.txt")
         import json
         try:
             data = json.loads(self.cookies_raw)
             if isinstance(data, list):
+                os.makedirs(self.download_root, exist_ok=True)
                 with open(cookie_file, 'w') as f:
                     f.write("# Netscape HTTP Cookie File\n")
                     for c in data:
@@ -82,179 +284,816 @@ class XScraper:
                         value = c.get('value', '')
                         f.write(f"{domain}\t{flag}\t{path}\t{secure}\t{expiration}\t{name}\t{value}\n")
                 return cookie_file
-        except:
+        except Exception:
             pass
         return None
 
-    async def scrape_tweet_urls(self, context) -> list:
-        """利用 Playwright 页面滚动抓取带有媒体的推文链接，动态基于时间范围"""
-        from datetime import datetime, timedelta, timezone
+    @staticmethod
+    def _remove_cookies_file(cookie_file: str | None):
+        if cookie_file and os.path.exists(cookie_file):
+            os.remove(cookie_file)
+
+    def _resolve_time_window(self):
+        """将 time_range 选项解析为 (时间下限, 最大滚动次数)"""
         now_utc = datetime.now(timezone.utc)
-        
-        # 确定时间限制与最大滚动次数
+
         if self.time_range == "当天":
-            time_limit = now_utc - timedelta(days=1)
-            max_scrolls = 25
+            return now_utc - timedelta(days=1), 25
         elif self.time_range == "3天":
-            time_limit = now_utc - timedelta(days=3)
-            max_scrolls = 40
+            return now_utc - timedelta(days=3), 40
         elif self.time_range == "1周":
-            time_limit = now_utc - timedelta(days=7)
-            max_scrolls = 60
+            return now_utc - timedelta(days=7), 60
         elif self.time_range == "1个月":
-            time_limit = now_utc - timedelta(days=30)
-            max_scrolls = 150
+            return now_utc - timedelta(days=30), 150
+        elif self.time_range == "3个月":
+            return now_utc - timedelta(days=90), 400
+        elif self.time_range == "半年":
+            return now_utc - timedelta(days=182), 600
         elif self.time_range == "1年":
-            time_limit = now_utc - timedelta(days=365)
-            max_scrolls = 1000
+            return now_utc - timedelta(days=365), 1000
         elif self.time_range == "全部":
-            time_limit = datetime.min.replace(tzinfo=timezone.utc)
-            max_scrolls = 3000
+            return datetime.min.replace(tzinfo=timezone.utc), 3000
         else: # default 1 个月
-            time_limit = now_utc - timedelta(days=30)
-            max_scrolls = 150
             self.time_range = "1个月"
+            return now_utc - timedelta(days=30), 150
 
-        page = await context.new_page()
-        tweet_urls = set()
-        print(f"🔎 正在扫描主页 (目标范围: {self.time_range}): https://x.com/{self.username}")
+    @staticmethod
+    def _parse_tweet_datetime(date_str: str):
+        """解析推文 <time datetime> 属性，格式如 '2025-02-15T12:00:00.000Z'"""
+        if not date_str:
+            return None
         try:
-            await page.goto(f"https://x.com/{self.username}", timeout=60000)
-            
-            # 应对 "Yes, view profile" 整个账号级别的敏感弹窗警告
-            try:
-                view_profile_btn = page.get_by_text("Yes, view profile", exact=True).first
-                if await view_profile_btn.count() > 0:
-                    print("  ⚠️ 检测到账号级敏感警告弹窗，自动确认中...")
-                    await view_profile_btn.click()
-                    await asyncio.sleep(2)
-            except Exception:
-                pass
-                
-            try:
-                 await page.wait_for_selector('article[data-testid="tweet"]', timeout=30000)
-            except Exception as e:
-                 current_url = page.url
-                 title = await page.title()
-                 print(f"⚠️ XScraper 等待推文超时 (可能是登录失败或该账号无新内容)")
-                 print(f"🔍 调试信息: 当前 URL 为 {current_url} | 页面标题: {title}")
-                 if "login" in current_url or "account/access" in current_url:
-                     print("🚨 致命错误: 您的 X 平台访问被重定向到了登录页或锁定页，这代表所使用的 TWITTER_COOKIES 必然已失效，请重新提取并配置 Cookie。")
-                 elif "suspended" in current_url:
-                     print("🚨 致命错误: 该推特账号已被封禁 (Suspended)。")
-                 return []
-
-            reached_time_limit = False
+            return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+
+    async def scrape_tweets(self, context) -> list:
+        """
+        滚动用户主页并采集推文记录，动态基于时间范围。
+        每条记录形如 {tweet_id, datetime, has_photo, has_video, href}，按推文 ID 去重。
+        """
+        time_limit, max_scrolls = self._resolve_time_window()
+        mode = self.discovery_mode if self.discovery_mode in ("dom", "observer", "graphql") else self.BROWSER_FALLBACK_MODE
+        resume_until = self._checkpoint_resume_date()
+        if resume_until:
+            # 从断点继续：主页时间线无法定位到旧位置，改用 until: 搜索从最早已采集的日期往前滚动
+            mode = self.SEARCH_COLLECT_MODE
+            url = self._search_url(None, resume_until)
+            print(f"🔎 从断点继续扫描 (目标范围: {self.time_range} | 模式: {mode}): {resume_until} 之前")
+        else:
+            # GraphQL 模式走媒体页：UserMedia 只包含带媒体的推文，且无需渲染网格
+            url = f"https://x.com/{self.username}"
+            if mode == "graphql":
+                url += "/media"
+            print(f"🔎 正在扫描主页 (目标范围: {self.time_range} | 模式: {mode}): {url}")
+        tweets, stats = await self._scroll_timeline(context, url, mode, time_limit, max_scrolls,
+                                                    tweets=self._checkpoint_tweets(), checkpoint=True)
+        self._record_scan_stats(stats, tweets)
+        return list(tweets.values())
+
+    async def scrape_tweets_search(self, pool: BrowserPool) -> list:
+        """
+        按自然月把时间范围切分为 from:user since:X until:Y 搜索窗口，
+        每批 SEARCH_PARALLEL_WINDOWS 个窗口各借一个浏览器上下文并行滚动，结果按推文 ID 合并去重。
+        不受主页时间线的条数上限限制；"全部" 时一整批窗口都没有推文即视为到达账号起点。
+        """
+        time_limit, _ = self._resolve_time_window()
+        unbounded = self.time_range == "全部"
+        upper = self._checkpoint_resume_date() or (datetime.now(timezone.utc) + timedelta(days=1)).date()
+        # 整个窗口都落在已归档范围内时无需扫描
+        windows = (
+            window for window in self._month_windows(None if unbounded else time_limit.date(), upper)
+            if not self._window_covered(*window)
+        )
+
+        tweets = self._checkpoint_tweets()
+        stats = {"scrolls": 0, "wait_seconds": 0.0, "stop_reason": "windows_done", "windows": 0, "page_recycles": 0,
+                 "incomplete_windows": 0}
+        print(f"🔎 正在按月搜索 {self.username} 的媒体推文 (目标范围: {self.time_range} | "
+              f"并行窗口: {self.SEARCH_PARALLEL_WINDOWS})")
+
+        async def scan(since: date, until: date):
+            async with pool.context() as context:
+                await self._load_cookies(context)
+                return await self._scroll_timeline(context, self._search_url(since, until), self.SEARCH_COLLECT_MODE,
+                                                   time_limit, self.SEARCH_WINDOW_MAX_SCROLLS, since=since)
+
+        while True:
+            batch = list(itertools.islice(windows, self.SEARCH_PARALLEL_WINDOWS))
+            if not batch:
+                break
+
+            results = await asyncio.gather(*(scan(*window) for window in batch))
+            for (since, until), (window_tweets, window_stats) in zip(batch, results):
+                print(f"  🗓️ {since} ~ {until}: {len(window_tweets)} 条推文 ({window_stats['stop_reason']})")
+                for record in window_tweets.values():
+                    tweets.add(record)
+                stats["scrolls"] += window_stats["scrolls"]
+                stats["wait_seconds"] += window_stats["wait_seconds"]
+                stats["page_recycles"] += window_stats["page_recycles"]
+                if window_stats["stop_reason"] not in self.REACHED_FLOOR_STOP_REASONS:
+                    stats["incomplete_windows"] += 1
+            stats["windows"] += len(batch)
+
+            # 有窗口异常中断时不推进断点，重新运行会重扫这一批
+            if any(window_stats["stop_reason"] in self.INCOMPLETE_STOP_REASONS for _, window_stats in results):
+                stats["stop_reason"] = "error"
+                break
+            oldest_since = min(since for since, _ in batch)
+            self._save_checkpoint(tweets, oldest=datetime.combine(oldest_since, datetime.min.time(), timezone.utc).isoformat())
+
+            if unbounded and not any(window_tweets for window_tweets, _ in results):
+                stats["stop_reason"] = "empty_windows"
+                break
+
+        # 每个窗口都扫到了自己的下界，整个时间范围才算完整覆盖
+        stats["reached_floor"] = stats["stop_reason"] != "error" and not stats["incomplete_windows"]
+        self._record_scan_stats(stats, tweets)
+        return list(tweets.values())
+
+    @classmethod
+    def _month_windows(cls, lower: date | None, upper: date):
+        """从 upper 向前按自然月生成 [since, until) 日期窗口，直到 lower (None 时为 X 上线日)"""
+        floor = lower or cls.SEARCH_EARLIEST_DATE
+        end = upper
+        while end > floor:
+            start = max((end - timedelta(days=1)).replace(day=1), floor)
+            yield start, end
+            end = start
+
+    def _search_url(self, since: date | None, until: date) -> str:
+        """最新排序的搜索页；filter:media 只返回带媒体的推文，since 为 None 时不设下界"""
+        lower = f"since:{since:%Y-%m-%d} " if since else ""
+        query = f"from:{self.username} {lower}until:{until:%Y-%m-%d} filter:media"
+        return f"https://x.com/search?q={quote(query)}&src=typed_query&f=live"
+
+    async def _scroll_timeline(self, context, url: str, mode: str, time_limit, max_scrolls: int,
+                               tweets: CollectedTweets = None, checkpoint: bool = False, since: date = None) -> tuple[dict, dict]:
+        """
+        在新页面中打开时间线 (主页或搜索结果) 并滚动采集，直到触发停止条件。
+        每滚动 PAGE_METRICS_INTERVAL 次采样一次页面指标，JS 堆或 DOM 节点数超过阈值时关闭当前页面，
+        换一个新页面以 until: 搜索从已采集的最早推文处继续，避免上千次滚动后渲染进程变慢或崩溃。
+
+        :param tweets: 预先已采集的推文 (从断点继续时传入的 CollectedTweets)
+        :param checkpoint: 是否定期写入断点
+        :param since: 搜索窗口的下界，换新页面继续时沿用
+        Returns:
+            ({tweet_id: 推文记录}, 扫描统计)
+        """
+        tweets = tweets if tweets is not None else self._collected_tweets()
+        stats = {"scrolls": 0, "wait_seconds": 0.0, "stop_reason": "max_scrolls", "page_recycles": 0}
+        # 这条时间线需要扫到的下限：搜索窗口取窗口下界，否则为时间范围下限
+        floor = max(time_limit, self._day_start(since)) if since else time_limit
+        page = None
+        try:
+            page = await context.new_page()
+            timeline = await self._open_timeline(page, url, mode, tweets)
+            if not await self._wait_timeline_ready(page, timeline, mode):
+                stats["stop_reason"] = "no_tweets"
+                return tweets, stats
 
+            idle_scrolls = 0
+            seen_count = 0
             for i in range(max_scrolls):
-                if reached_time_limit:
+                if mode == "dom":
+                    await self._collect_visible_articles(page, tweets)
+
+                idle_scrolls = 0 if len(tweets) > seen_count else idle_scrolls + 1
+                seen_count = len(tweets)
+
+                if self._reached_time_limit(tweets, time_limit):
                     print(f"  ⏳ 已抓取到 {self.time_range} 前的数据，停止向下滚动。")
+                    stats["stop_reason"] = "time_limit"
+                    break
+                if self._reached_high_water(tweets, floor):
+                    print(f"  ⏳ 已到达上次归档位置 ({self.high_water['tweet_id']})，停止向下滚动。")
+                    stats["stop_reason"] = "high_water"
+                    break
+                if timeline["exhausted"]:
+                    print("  🏁 时间线已无更多分页，停止向下滚动。")
+                    stats["stop_reason"] = "exhausted"
+                    break
+                if idle_scrolls >= self.STALL_SCROLL_LIMIT:
+                    print(f"  🏁 连续 {idle_scrolls} 次滚动没有新推文，判定已到达时间线末尾。")
+                    stats["stop_reason"] = "stalled"
                     break
 
-                articles = await page.locator('article[data-testid="tweet"]').all()
-                for article in articles:
-                    try:
-                        # 检查并点击可能遮挡推文媒体的 "View" (敏感内容遮罩)
-                        view_btn = article.get_by_text("View", exact=True).first
-                        if await view_btn.count() > 0:
-                            await view_btn.click()
-                            await asyncio.sleep(0.5)
-
-                        # 检查推文时间
-                        time_loc = article.locator('time').first
-                        if await time_loc.count() > 0:
-                            date_str = await time_loc.get_attribute('datetime')
-                            if date_str:
-                                # date_str 格式如 '2025-02-15T12:00:00.000Z'
-                                tweet_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                                if tweet_date < time_limit:
-                                    reached_time_limit = True
-
-                        has_media = False
-                        if await article.locator('div[data-testid="tweetPhoto"]').count() > 0:
-                            has_media = True
-                        elif await article.locator('div[data-testid="videoPlayer"]').count() > 0:
-                            has_media = True
-                            
-                        if has_media:
-                            link_loc = article.locator('a[href*="/status/"]').first
-                            if await link_loc.count() > 0:
-                                href = await link_loc.get_attribute("href")
-                                full_url = f"https://x.com{href}".split("?")[0]
-                                tweet_urls.add(full_url)
-                    except:
-                        continue
-                
-                # 向下滚动 2500 像素，等待新内容加载
-                await page.evaluate("window.scrollBy(0, 2500)")
-                # 给网页一点时间渲染后面的推文
-                await asyncio.sleep(2.5)
+                timeline["grown"].clear()
+                marker = await page.evaluate(self.SCROLL_SCRIPT, self.SCROLL_DISTANCE)
+                stats["scrolls"] += 1
+                stats["wait_seconds"] += await self._wait_for_timeline_growth(page, timeline, marker, mode)
                 
                 if i > 0 and i % 10 == 0:
-                    print(f"  ... 已滚动 {i} 次，目前采集到 {len(tweet_urls)} 个媒体推文。")
+                    print(f"  ... 已滚动 {i} 次，目前采集到 {tweets.media_count} 个媒体推文。")
+                if checkpoint and stats["scrolls"] % self.CHECKPOINT_INTERVAL == 0:
+                    # 搜索页的游标与 UserMedia 不通用，只保存主页时间线的游标
+                    self._save_checkpoint(tweets, cursor=None if "/search?" in url else timeline["cursor"])
+
+                if stats["scrolls"] % self.PAGE_METRICS_INTERVAL == 0 and await self._page_over_budget(page):
+                    resume_url = self._recycle_url(tweets, since)
+                    if not resume_url:
+                        continue
+                    await page.close()
+                    page = None
+                    stats["page_recycles"] += 1
+                    url = resume_url
+                    page = await context.new_page()
+                    timeline = await self._open_timeline(page, url, mode, tweets)
+                    if not await self._wait_timeline_ready(page, timeline, mode):
+                        stats["stop_reason"] = "no_tweets"
+                        break
+                    idle_scrolls = 0
+                    seen_count = len(tweets)
 
         except Exception as e:
             print(f"⚠️ 抓取 {self.username} 页面异常: {e}")
+            stats["stop_reason"] = "error"
         finally:
-            await page.close()
-            
-        return list(tweet_urls)
+            if page is not None:
+                await page.close()
+
+        return tweets, stats
+
+    async def _open_timeline(self, page, url: str, mode: str, tweets: CollectedTweets) -> dict:
+        """在页面上安装采集回调并打开时间线，返回该页面的时间线状态"""
+        timeline = {"ready": asyncio.Event(), "grown": asyncio.Event(), "exhausted": False, "cursor": None}
+        if mode == "observer":
+            await self._install_timeline_observer(page, tweets, timeline)
+        elif mode == "graphql":
+            self._install_graphql_listener(page, tweets, timeline)
+
+        await page.goto(url, timeout=60000)
+        
+        # 应对 "Yes, view profile" 整个账号级别的敏感弹窗警告
+        try:
+            view_profile_btn = page.get_by_text("Yes, view profile", exact=True).first
+            if await view_profile_btn.count() > 0:
+                print("  ⚠️ 检测到账号级敏感警告弹窗，自动确认中...")
+                await view_profile_btn.click()
+                await asyncio.sleep(2)
+        except Exception:
+            pass
+        return timeline
+
+    async def _wait_timeline_ready(self, page, timeline: dict, mode: str) -> bool:
+        """等待第一批推文出现；超时时打印诊断信息并返回 False"""
+        try:
+             if mode == "graphql":
+                 await asyncio.wait_for(timeline["ready"].wait(), timeout=30)
+             else:
+                 await page.wait_for_selector('article[data-testid="tweet"]', timeout=30000)
+             return True
+        except Exception as e:
+             current_url = page.url
+             title = await page.title()
+             print(f"⚠️ XScraper 等待推文超时 (可能是登录失败或该账号无新内容)")
+             print(f"🔍 调试信息: 当前 URL 为 {current_url} | 页面标题: {title}")
+             if "login" in current_url or "account/access" in current_url:
+                 print("🚨 致命错误: 您的 X 平台访问被重定向到了登录页或锁定页，这代表所使用的 TWITTER_COOKIES 必然已失效，请重新提取并配置 Cookie。")
+             elif "suspended" in current_url:
+                 print("🚨 致命错误: 该推特账号已被封禁 (Suspended)。")
+             return False
 
-    async def fetch_media_files(self) -> list:
+    async def _page_over_budget(self, page) -> bool:
+        """采样页面指标，判断 JS 堆或 DOM 节点数是否超过阈值"""
+        metrics = await read_page_metrics(page)
+        if not metrics:
+            return False
+        if metrics["heap_mb"] <= self.page_heap_limit_mb and metrics["nodes"] <= self.PAGE_NODE_LIMIT:
+            return False
+        print(f"  ♻️ 页面 JS 堆 {metrics['heap_mb']:.0f} MB / DOM 节点 {metrics['nodes']} 超过阈值 "
+              f"({self.page_heap_limit_mb} MB / {self.PAGE_NODE_LIMIT})，换新页面继续")
+        return True
+
+    def _recycle_url(self, tweets: CollectedTweets, since: date = None) -> str | None:
+        """
+        换新页面后继续扫描的搜索地址: until 取已采集的最早推文日期的后一天 (与断点续扫一致)。
+        浏览器页面无法直接带游标打开时间线，因此统一改用 until: 搜索定位。
+        """
+        oldest = tweets.oldest_at
+        if not oldest:
+            return None
+        until = oldest.date() + timedelta(days=1)
+        if since and until <= since:
+            return None
+        return self._search_url(since, until)
+
+    async def _wait_for_timeline_growth(self, page, timeline: dict, marker: str, mode: str) -> float:
+        """
+        滚动后等待新推文出现 (observer/graphql 由回调事件通知，DOM 模式在页面内轮询末尾推文)，
+        超过空闲期限则放弃等待。返回实际等待秒数。
+        """
+        started = time.monotonic()
+        try:
+            if mode == "dom":
+                await page.wait_for_function(
+                    self.DOM_GROWTH_SCRIPT, arg=marker, timeout=self.SCROLL_IDLE_TIMEOUT * 1000
+                )
+            else:
+                await asyncio.wait_for(timeline["grown"].wait(), timeout=self.SCROLL_IDLE_TIMEOUT)
+            await asyncio.sleep(self.SCROLL_SETTLE_SECONDS)
+        except (asyncio.TimeoutError, PlaywrightTimeoutError):
+            pass
+        return time.monotonic() - started
+
+    def _load_checkpoint(self) -> dict | None:
+        if self.time_range not in self.CHECKPOINT_TIME_RANGES:
+            return None
+        checkpoint = self.checkpoint_store.load(self.username, self.time_range)
+        if checkpoint:
+            print(f"⏯️ [{self.username}] 发现扫描断点: 已采集 {len(checkpoint['tweets'])} 条推文，"
+                  f"最早到达 {checkpoint.get('oldest')}")
+        return checkpoint
+
+    def _collected_tweets(self, tweets: dict = None) -> CollectedTweets:
+        return CollectedTweets(self._marks_timeline_position, tweets)
+
+    def _checkpoint_tweets(self) -> CollectedTweets:
+        """断点中已采集的推文 (副本)"""
+        return self._collected_tweets((self.checkpoint or {}).get("tweets"))
+
+    def _checkpoint_resume_date(self) -> date | None:
+        """从断点继续时的搜索上界 (until 不含当天，因此取最早日期的后一天)"""
+        oldest = self._parse_tweet_datetime((self.checkpoint or {}).get("oldest"))
+        return oldest.date() + timedelta(days=1) if oldest else None
+
+    def _save_checkpoint(self, tweets: CollectedTweets, cursor: str = None, oldest: str = None):
+        """写入断点；oldest 缺省时取已采集本人推文中最早的发布时间"""
+        if self.time_range not in self.CHECKPOINT_TIME_RANGES:
+            return
+        if oldest is None:
+            oldest = tweets.oldest_at.isoformat() if tweets.oldest_at else None
+        self.checkpoint_store.save(self.username, self.time_range, tweets, oldest, cursor,
+                                   self.scan_started_at.isoformat() if self.scan_started_at else None)
+
+    def _record_scan_stats(self, stats: dict, tweets: dict):
+        """汇总并打印本次扫描统计"""
+        scrolls = stats["scrolls"]
+        stats["tweets"] = len(tweets)
+        stats["tweets_per_scroll"] = round(len(tweets) / scrolls, 2) if scrolls else float(len(tweets))
+        stats["wait_seconds"] = round(stats["wait_seconds"], 1)
+        stats.setdefault("reached_floor", stats["stop_reason"] in self.REACHED_FLOOR_STOP_REASONS)
+        stats["oldest_at"] = tweets.oldest_at
+        self.scan_stats = stats
+        print(f"  📈 扫描统计: 滚动 {scrolls} 次 | 推文 {stats['tweets']} 条 | "
+              f"{stats['tweets_per_scroll']} 条/次 | 等待 {stats['wait_seconds']}s | 结束原因: {stats['stop_reason']}"
+              + (f" | 换新页面 {stats['page_recycles']} 次" if stats.get("page_recycles") else ""))
+
+    async def scrape_tweet_urls(self, context) -> list:
+        """利用 Playwright 页面滚动抓取带有媒体的推文链接，动态基于时间范围"""
+        return self._media_tweet_urls(await self.scrape_tweets(context))
+
+    @staticmethod
+    def _media_tweet_urls(tweets: list) -> list:
+        """推文记录 -> 带媒体推文的完整链接"""
+        return [
+            f"https://x.com{t['href']}"
+            for t in tweets
+            if t["has_photo"] or t["has_video"]
+        ]
+
+    def _is_retweet(self, tweet: dict) -> bool:
+        """DOM 记录没有 is_retweet 字段时，以链接中的作者是否为本用户判断"""
+        if "is_retweet" in tweet:
+            return tweet["is_retweet"]
+        return tweet["href"].split("/")[1].lower() != self.username.lower()
+
+    def _marks_timeline_position(self, tweet: dict) -> bool:
+        """置顶与转推的 ID/时间不代表时间线位置，不参与停止判断"""
+        return not tweet.get("pinned") and not self._is_retweet(tweet)
+
+    @staticmethod
+    def _day_start(day: date) -> datetime:
+        return datetime.combine(day, datetime.min.time(), timezone.utc)
+
+    def _combined_high_water(self) -> dict | None:
+        """
+        各目的地归档范围的交集: 最新推文取最旧的一个，since 取最晚、scanned_at 取最早；
+        任一目的地没有记录或交集为空时返回 None (需要完整扫描)
+        """
+        marks = [self.high_water_store.get(self.username, d) for d in self.destinations]
+        if not marks or not all(marks):
+            return None
+        sinces = [self._parse_tweet_datetime(mark.get("since")) for mark in marks]
+        tops = [self._parse_tweet_datetime(mark.get("scanned_at")) for mark in marks]
+        newest = min(marks, key=lambda mark: int(mark["tweet_id"]))
+        newest_at = self._parse_tweet_datetime(newest.get("datetime"))
+        if not all(sinces) or not all(tops) or not newest_at or max(sinces) > newest_at:
+            return None
+        return dict(newest, since=max(sinces).isoformat(), scanned_at=min(tops).isoformat())
+
+    def _high_water_covers(self, floor: datetime) -> bool:
+        """已归档范围是否向下覆盖到 floor (到达最新已归档推文后即可停止)"""
+        since = self._parse_tweet_datetime((self.high_water or {}).get("since"))
+        return since is not None and since <= floor
+
+    def _window_covered(self, since: date, until: date) -> bool:
+        """搜索窗口 [since, until) 是否整个落在已归档范围内"""
+        covered_since = self._parse_tweet_datetime((self.high_water or {}).get("since"))
+        covered_until = self._parse_tweet_datetime((self.high_water or {}).get("scanned_at"))
+        if not covered_since or not covered_until:
+            return False
+        return covered_since <= self._day_start(since) and self._day_start(until) <= covered_until
+
+    def _reached_high_water(self, tweets: CollectedTweets, floor: datetime) -> bool:
+        """
+        是否已滚动到上次归档的最新推文，且已归档范围向下覆盖到本次需要扫到的下限 floor；
+        范围只覆盖到 floor 以上时继续扫描，范围内的推文由 _drop_archived 剔除
+        """
+        if not self.high_water or tweets.min_position_id is None or not self._high_water_covers(floor):
+            return False
+        return tweets.min_position_id <= int(self.high_water["tweet_id"])
+
+    def _drop_archived(self, tweets: list) -> list:
+        """剔除落在已归档范围内 (since 之后且不晚于最新已归档推文) 的本人推文"""
+        since = self._parse_tweet_datetime((self.high_water or {}).get("since"))
+        if since is None:
+            return tweets
+        mark = int(self.high_water["tweet_id"])
+
+        def archived(tweet: dict) -> bool:
+            posted_at = self._parse_tweet_datetime(tweet.get("datetime"))
+            return int(tweet["tweet_id"]) <= mark and posted_at is not None and posted_at >= since
+
+        return [t for t in tweets if self._is_retweet(t) or not archived(t)]
+
+    def mark_archived(self, archived_files: list, failed_files: list = (), destination: str = None):
+        """
+        上传确认后推进该目的地的归档范围。
+        - 扫描没有到达时间范围下限 (异常、停滞、滚动次数用尽) 时不推进，下限以上未扫到的推文下次仍会被扫描
+        - 本次扫描覆盖的 [scanned_since, 开始时间) 与旧范围相接时合并，保留此前回填得到的下界
+        - 范围上界停在最早一条未完成推文之前，保证下载或上传失败的推文下次仍会被扫描到
+          (下载失败以 self.download_results 为准，部分文件已上传的推文同样算未完成)
+
+        :param archived_files: 已成功上传的文件 (MediaItem)
+        :param failed_files: 上传失败的文件 (MediaItem)
+        :param destination: 多目的地时指定要推进的目的地，默认为唯一的 destination
+        """
+        destination = destination or self.destination
+        if not destination:
+            return
+        if not self.scan_stats.get("reached_floor") or not self.scan_started_at:
+            print(f"⏸️ [{self.username}] 本次扫描未完整到达时间范围下限 ({self.scan_stats.get('stop_reason')})，"
+                  f"不推进 {destination} 的归档范围")
+            return
+        archived_ids = {item.tweet_id for item in archived_files}
+        archived_ids |= self.skipped_tweet_ids | self.policy_skipped_ids
+        failed_ids = {item.tweet_id for item in failed_files}
+        # 有媒体下载失败的推文即使部分文件已上传也视为未完成 (转推不代表时间线位置，下次总会重新扫描)
+        failed_ids |= {
+            tweet_id for tweet_id, ok in self.download_results.items()
+            if not ok and tweet_id in self.tweets and self._marks_timeline_position(self.tweets[tweet_id])
+        }
+        # 发现阶段带媒体但没有任何成功文件的本人推文同样视为未完成
+        pending_ids = failed_ids | {
+            tweet_id for tweet_id, tweet in self.tweets.items()
+            if (tweet["has_photo"] or tweet["has_video"])
+            and self._marks_timeline_position(tweet)
+            and tweet_id not in archived_ids
+        }
+        archived_ids -= pending_ids
+
+        # 只有本人推文代表时间线位置，可作为范围内的最新推文
+        candidates = {
+            int(t): self.tweets[t].get("datetime") for t in archived_ids
+            if t in self.tweets and self._marks_timeline_position(self.tweets[t])
+        }
+        since = self.scanned_since
+        upper = self.scan_started_at
+        old = self.high_water_store.get(self.username, destination)
+        old_since = self._parse_tweet_datetime((old or {}).get("since"))
+        old_top = self._parse_tweet_datetime((old or {}).get("scanned_at"))
+        if old_since and old_top and old_top >= since:
+            since = min(since, old_since)
+            candidates.setdefault(int(old["tweet_id"]), old.get("datetime"))
+
+        if pending_ids:
+            oldest_pending = min(pending_ids, key=int)
+            candidates = {t: at for t, at in candidates.items() if t < int(oldest_pending)}
+            pending_at = self._parse_tweet_datetime(self.tweets.get(oldest_pending, {}).get("datetime"))
+            newest_at = self._parse_tweet_datetime(candidates[max(candidates)]) if candidates else None
+            upper = pending_at or newest_at
+        if not candidates or not upper or upper <= since:
+            return
+
+        newest = max(candidates)
+        if self.high_water_store.cover(self.username, destination, str(newest), candidates[newest],
+                                       since.isoformat(), upper.isoformat()):
+            self.high_water = self._combined_high_water()
+            print(f"🔖 [{self.username}] {destination} 归档范围更新为 {since.date()} ~ {upper:%Y-%m-%d %H:%M} "
+                  f"(最新 {newest})")
+
+    @staticmethod
+    def _reached_time_limit(tweets: CollectedTweets, time_limit) -> bool:
+        """已采集的本人推文中是否出现了早于时间下限的推文"""
+        return tweets.oldest_at is not None and tweets.oldest_at < time_limit
+
+    async def scrape_tweets_http(self) -> list:
+        """免浏览器模式：沿 UserMedia 游标翻页采集推文记录，结构与 scrape_tweets 一致"""
+        time_limit, max_pages = self._resolve_time_window()
+        tweets = self._checkpoint_tweets()
+        cursor = (self.checkpoint or {}).get("cursor")
+        # 翻页即相当于一次滚动，沿用同一套统计口径
+        stats = {"scrolls": 0, "wait_seconds": 0.0, "stop_reason": "exhausted"}
+        print(f"🔎 正在通过 GraphQL 接口扫描 (目标范围: {self.time_range}): {self.username}"
+              + (" (从断点游标继续)" if cursor else ""))
+
+        async with XTimelineClient(self.cookies_raw) as client:
+            user_id = await client.fetch_user_id(self.username)
+            started = time.monotonic()
+            async for records, next_cursor in client.iter_timeline(user_id, cursor=cursor):
+                stats["wait_seconds"] += time.monotonic() - started
+                for record in records:
+                    tweets.add(record)
+                stats["scrolls"] += 1
+                if stats["scrolls"] % self.CHECKPOINT_INTERVAL == 0:
+                    self._save_checkpoint(tweets, cursor=next_cursor)
+                if self._reached_time_limit(tweets, time_limit):
+                    print(f"  ⏳ 已抓取到 {self.time_range} 前的数据，停止翻页。")
+                    stats["stop_reason"] = "time_limit"
+                    break
+                if self._reached_high_water(tweets, time_limit):
+                    print(f"  ⏳ 已到达上次归档位置 ({self.high_water['tweet_id']})，停止翻页。")
+                    stats["stop_reason"] = "high_water"
+                    break
+                if stats["scrolls"] >= max_pages:
+                    stats["stop_reason"] = "max_scrolls"
+                    break
+                started = time.monotonic()
+
+        self._record_scan_stats(stats, tweets)
+        return list(tweets.values())
+
+    async def _install_timeline_observer(self, page, tweets: CollectedTweets, timeline: dict):
+        """
+        注入 MutationObserver：由页面内脚本监听时间线 DOM，
+        每条新推文仅通过 expose_binding 回传一次紧凑记录，避免逐个 article 的 IPC 往返。
+        """
+        def on_tweet(source, record):
+            if record.get("tweet_id") and tweets.add(record):
+                timeline["grown"].set()
+
+        await page.expose_binding(self.OBSERVER_BINDING, on_tweet)
+        await page.add_init_script(self.OBSERVER_SCRIPT)
+
+    def _install_graphql_listener(self, page, tweets: CollectedTweets, timeline: dict):
+        """
+        监听时间线 GraphQL 响应，直接从 JSON 解析推文与媒体，
+        无需点击敏感内容遮罩或等待媒体渲染。
+        """
+        async def on_response(response):
+            if not is_timeline_response(response.url):
+                return
+            try:
+                payload = await response.json()
+            except Exception as e:
+                print(f"  ⚠️ 解析时间线响应失败: {e}")
+                return
+
+            records, cursor = parse_timeline_payload(payload)
+            for record in records:
+                if tweets.add(record):
+                    timeline["grown"].set()
+            # 没有推文或没有下一页游标的分页即为时间线末尾
+            if not records or not cursor:
+                timeline["exhausted"] = True
+            timeline["cursor"] = cursor
+            timeline["ready"].set()
+
+        page.on("response", on_response)
+
+    async def _collect_visible_articles(self, page, tweets: CollectedTweets):
+        """逐个 article 读取推文信息（DOM 轮询模式）"""
+        articles = await page.locator('article[data-testid="tweet"]').all()
+        for article in articles:
+            try:
+                link_loc = article.locator('a[href*="/status/"]').first
+                if await link_loc.count() == 0:
+                    continue
+                href = (await link_loc.get_attribute("href")).split("?")[0]
+                tweet_id = href.rsplit("/status/", 1)[-1].split("/")[0]
+                if tweet_id in tweets:
+                    continue
+
+                # 检查并点击可能遮挡推文媒体的 "View" (敏感内容遮罩)
+                view_btn = article.get_by_text("View", exact=True).first
+                if await view_btn.count() > 0:
+                    await view_btn.click()
+                    await asyncio.sleep(0.5)
+
+                date_str = None
+                time_loc = article.locator('time').first
+                if await time_loc.count() > 0:
+                    date_str = await time_loc.get_attribute('datetime')
+
+                social_loc = article.locator('[data-testid="socialContext"]').first
+                social_text = await social_loc.text_content() if await social_loc.count() > 0 else ""
+
+                tweets.add({
+                    "tweet_id": tweet_id,
+                    "datetime": date_str,
+                    "has_photo": await article.locator('div[data-testid="tweetPhoto"]').count() > 0,
+                    "has_video": await article.locator('div[data-testid="videoPlayer"]').count() > 0,
+                    "href": href,
+                    "pinned": any(k in (social_text or "") for k in ("Pinned", "置顶", "固定")),
+                })
+            except:
+                continue
+
+    async def discover_tweets(self) -> list:
+        """发现阶段：按 discovery_mode 采集推文记录，http 模式失败时回退到 Playwright"""
+        tweets = None
+        self.checkpoint = self._load_checkpoint()
+        self.scan_floor, _ = self._resolve_time_window()
+        # 从断点继续时范围上界取最初开始扫描的时间 (旧断点没有记录时为 None，本次不推进归档范围)
+        self.scan_started_at = (
+            self._parse_tweet_datetime(self.checkpoint.get("started_at")) if self.checkpoint
+            else datetime.now(timezone.utc)
+        )
+        if self.discovery_mode == "http":
+            try:
+                tweets = await self.scrape_tweets_http()
+            except Exception as e:
+                print(f"⚠️ 免浏览器模式扫描失败，回退到 Playwright ({self.BROWSER_FALLBACK_MODE}): {e}")
+                self.discovery_mode = self.BROWSER_FALLBACK_MODE
+
+        if tweets is None:
+            if self.browser_pool:
+                tweets = await self._scrape_with_pool(self.browser_pool)
+            else:
+                async with BrowserPool() as pool:
+                    tweets = await self._scrape_with_pool(pool)
+
+        # 完整结束的扫描不再需要断点；中断时保留，供下次继续
+        if self.scan_stats.get("stop_reason") not in self.INCOMPLETE_STOP_REASONS:
+            self.checkpoint_store.clear(self.username)
+        # 时间线从上往下连续扫描，实际覆盖到时间下限与所见最早本人推文中较早的一个
+        oldest_at = self.scan_stats.get("oldest_at")
+        self.scanned_since = min(self.scan_floor, oldest_at) if oldest_at else self.scan_floor
+        tweets = self._drop_archived(tweets)
+        self.tweets = {t["tweet_id"]: t for t in tweets}
+        return tweets
+
+    async def _scrape_with_pool(self, pool: BrowserPool) -> list:
+        """从浏览器池借出一个上下文，载入 X Cookie 后扫描时间线 (search 模式按窗口各借一个上下文)"""
+        if self.discovery_mode == "search":
+            return await self.scrape_tweets_search(pool)
+        async with pool.context() as context:
+            await self._load_cookies(context)
+            return await self.scrape_tweets(context)
+
+    async def fetch_media_files(self, on_file=None) -> list[MediaItem]:
         """
         完整工作流：下载该用户的所有媒体到本地
-        返回本地下载好的文件绝对路径列表。
+        返回下载清单 (MediaItem 列表，从新到旧)，由下载器逐个上报，不再扫描下载目录。
+
+        :param on_file: 可选的协程函数 on_file(item)，每个文件落盘后立即调用 (下载→上传流水线)
         """
-        # 1. 准备本地目录
-        if os.path.exists(self.user_download_dir):
-            shutil.rmtree(self.user_download_dir)
-        os.makedirs(self.user_download_dir, exist_ok=True)
-        
-        cookie_file = self._prepare_cookies_file()
+        # 1. 准备本地目录 (保留上次中断的分段下载，以便续传)
+        self._reset_download_dir()
 
         # 2. 抓取 URLs
-        async with async_playwright() as p:
-            launch_args = ['--disable-blink-features=AutomationControlled', '--no-sandbox']
-            browser = await p.chromium.launch(headless=True, args=launch_args)
-            context = await browser.new_context(viewport={'width': 1920, 'height': 1080})
-            await self._load_cookies(context)
-            
-            tweet_urls = await self.scrape_tweet_urls(context)
-            await browser.close()
+        tweets = self._skip_archived_tweets(self._apply_media_policy(await self.discover_tweets()))
+        media_tweets = [t for t in tweets if t["has_photo"] or t["has_video"]]
 
-        if not tweet_urls:
-            print(f"📭 用户 {self.username} 最近没有带媒体的推文。")
+        if not media_tweets:
+            print(f"📭 用户 {self.username} 最近没有需要下载的媒体推文。")
             return []
 
-        print(f"📥 发现 {len(tweet_urls)} 条带有媒体的推文，开始下载...")
-
-        # 3. 使用 gallery-dl 替代 yt-dlp 执行下载
-        for url in tweet_urls:
-            cmd = [
-                "gallery-dl",
-                url,
-                "--directory", self.user_download_dir,
-            ]
-            if cookie_file:
-                 cmd.extend(["--cookies", cookie_file])
-            
-            subprocess.run(cmd, check=False)
-
-        # 4. 收集下载的文件 (由于 gallery-dl 可能会生成多级子文件夹，例如 twitter/用户名/图片.jpg)
-        all_files = glob.glob(f"{self.user_download_dir}/**/*", recursive=True)
-        files = [f for f in all_files if os.path.isfile(f)]
-        
-        # 按照新到旧进行排序 (优先依赖文件的 mtime 属性，因为 gallery-dl 默认会将文件的修改时间设为推文发布时间)
-        files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-        
-        if not files:
+        print(f"📥 发现 {len(media_tweets)} 条带有媒体的推文，开始下载...")
+
+        # 3. 下载 (多用户并发时先取得全局传输名额)，每个落盘文件记入清单
+        self.manifest = []
+
+        async def handle_file(item: MediaItem):
+            self.manifest.append(item)
+            if on_file:
+                await on_file(item)
+
+        cookie_file = self._prepare_cookies_file()
+        try:
+            async with self.transfer_slots or nullcontext():
+                await self._download_media_tweets(media_tweets, cookie_file, handle_file)
+        finally:
+            self._remove_cookies_file(cookie_file)
+
+        if not self.manifest:
             print(f"⚠️ [{self.username}] 下载管线结束，但没有抓到文件。")
             return []
 
-        return files
+        self._record_media_counts(self.manifest)
+        return newest_first(self.manifest)
+
+    async def _download_media_tweets(self, media_tweets: list, cookie_file: str, on_file=None):
+        """下载媒体推文，逐推文结果写入 self.download_results"""
+        # 下载器按推文链接返回结果，换算为推文 ID
+        tweet_ids = {f"https://x.com{t['href']}": t["tweet_id"] for t in media_tweets}
+        self.download_results = {}
+        # 已拿到媒体直链的推文 (GraphQL/免浏览器模式) 由原生下载器直接流式下载
+        native_tweets = [t for t in media_tweets if t.get("media")]
+        if native_tweets:
+            async with MediaDownloader(self.user_download_dir, self.username, on_file=on_file) as downloader:
+                results = await downloader.download_tweets(native_tweets)
+            self.download_results.update((tweet_ids[url], ok) for url, ok in results.items())
+
+        # 其余推文使用 gallery-dl 替代 yt-dlp 执行下载 (分批交给有界并发的 gallery-dl 进程池)
+        gallery_dl_tweets = [t for t in media_tweets if not t.get("media")]
+        if gallery_dl_tweets:
+            filter_expression = self.media_policy.gallery_dl_filter()
+            produced_ids = set()
+
+            async def handle_file(item: MediaItem):
+                produced_ids.add(item.tweet_id)
+                if on_file:
+                    await on_file(item)
+
+            pool = GalleryDlPool(
+                directory=self.user_download_dir,
+                work_dir=self.download_root,
+                label=self.username,
+                cookie_file=cookie_file,
+                on_file=handle_file,
+                filter_expression=filter_expression,
+            )
+            results = await pool.run(self._media_tweet_urls(gallery_dl_tweets))
+            self.download_results.update((tweet_ids[url], ok) for url, ok in results.items())
+            if filter_expression:
+                # 下载成功却没有任何文件的推文，其媒体全部被 --filter 排除，按筛选策略整条跳过处理
+                rejected = {
+                    t["tweet_id"] for t in gallery_dl_tweets
+                    if self.download_results.get(t["tweet_id"]) and t["tweet_id"] not in produced_ids
+                }
+                if rejected:
+                    print(f"  🎚️ [{self.username}] {len(rejected)} 条推文的媒体全部被筛选条件排除")
+                    self.policy_skipped_ids |= rejected
+
+    def _apply_media_policy(self, tweets: list) -> list:
+        """
+        按媒体筛选策略剔除或裁剪推文的媒体。
+        self.tweets 保留发现阶段的完整记录，登记媒体总数时不受筛选影响 (放宽策略后仍会补齐)
+        """
+        if not self.media_policy.active:
+            return tweets
+        selected = []
+        for tweet in tweets:
+            if not (tweet["has_photo"] or tweet["has_video"]):
+                selected.append(tweet)
+                continue
+            kept = self.media_policy.select(tweet, self._is_retweet(tweet))
+            if kept is None:
+                self.policy_skipped_ids.add(tweet["tweet_id"])
+                continue
+            selected.append(kept)
+        self.media_policy.report(self.username)
+        return selected
+
+    def _skip_archived_tweets(self, tweets: list) -> list:
+        """剔除所有媒体都已归档到目的地的推文，使其不进入任何下载进程"""
+        if not self.archive or not self.destinations:
+            return tweets
+        media_counts = {t["tweet_id"]: len(t["media"]) for t in tweets if t.get("media")}
+        self.skipped_tweet_ids = self.archive.archived_tweet_ids(
+            [t["tweet_id"] for t in tweets], self.destinations, media_counts
+        )
+        if self.skipped_tweet_ids:
+            print(f"⏩ [{self.username}] {len(self.skipped_tweet_ids)} 条推文的媒体已归档到 {'/'.join(self.destinations)}，跳过下载。")
+        return [t for t in tweets if t["tweet_id"] not in self.skipped_tweet_ids]
+
+    def _record_media_counts(self, items: list):
+        """
+        登记每条推文的媒体总数: 发现阶段解析到媒体列表时取其长度，
+        DOM 推文取 gallery-dl 元数据中的 count，下次扫描到同一推文时即可在下载前跳过。
+        实际下载到的文件数会因部分失败或筛选策略而偏少，不作为总数登记；下载失败的推文也不登记。
+        """
+        if not self.archive:
+            return
+        reported = {}
+        for item in items:
+            if item.media_count:
+                reported[item.tweet_id] = max(reported.get(item.tweet_id, 0), item.media_count)
+        for tweet_id in {item.tweet_id for item in items}:
+            if self.download_results.get(tweet_id) is False:
+                continue
+            known = len(self.tweets.get(tweet_id, {}).get("media") or []) or reported.get(tweet_id)
+            if known:
+                self.archive.record_media_count(tweet_id, known)
+
+    def _reset_download_dir(self):
+        """清空下载目录中的已完成文件，保留未过期的 .part / .part.json 分段续传数据"""
+        os.makedirs(self.user_download_dir, exist_ok=True)
+        expire_before = time.time() - self.PARTIAL_MAX_AGE.total_seconds()
+        for entry in os.scandir(self.user_download_dir):
+            if entry.name.endswith((".part", ".part.json")) and entry.stat().st_mtime >= expire_before:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
 
     def cleanup(self):
-        """清理临时生成的下载目录"""
+        """清理临时生成的下载文件；分段续传数据保留到下次在同一目录运行时继续"""
         if os.path.exists(self.user_download_dir):
-            shutil.rmtree(self.user_download_dir, ignore_errors=True)
+            self._reset_download_dir()
+            if not os.listdir(self.user_download_dir):
+                os.rmdir(self.user_download_dir)
         print(f"🗑️ 已清理 {self.username} 的临时文件。")
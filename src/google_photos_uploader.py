@@ -9,13 +9,18 @@ from googleapiclient.errors import HttpError
 import requests
 
 class GooglePhotosUploader:
-    def __init__(self, token_base64: str):
+    # MediaArchive 中的目的地标识
+    DESTINATION = "google"
+
+    def __init__(self, token_base64: str, archive=None):
         """
         初始化 Google Photos 客户端。
         :param token_base64: 存放在环境变量中经过 Base64 编码的 token.json 内容。
+        :param archive: 共享的 MediaArchive，跳过已归档文件并登记新上传的文件。
         """
         self.creds = None
         self.service = None
+        self.archive = archive
         self._album_cache = {}
         self._authenticate(token_base64)
 
@@ -107,13 +112,18 @@ class GooglePhotosUploader:
             print(f"❌ (Google Photos) 上传字节流异常: {e}")
             return None
 
-    def upload_file(self, local_file: str, album_name: str = "Twitter_Archive") -> bool:
+    def upload_file(self, local_file: str, album_name: str = "Twitter_Archive", description: str = None) -> bool:
         """
         上传文件到相册。
         :param local_file: 待上传文件本地路径
         :param album_name: 所属相册标题 (API将查找或创建这个相册)
+        :param description: 媒体描述 (如来源推文链接)，默认为相册来源说明
         """
         filename = os.path.basename(local_file)
+
+        if self.archive and self.archive.contains_file(local_file, self.DESTINATION):
+            print(f"  ⏩ {filename} 已归档到 Google Photos，跳过")
+            return True
         
         # 1. 获取或创建相册 ID
         album_id = self._get_or_create_album(album_name)
@@ -133,7 +143,7 @@ class GooglePhotosUploader:
                     "albumId": album_id,
                     "newMediaItems": [
                         {
-                            "description": f"Archived from {album_name} automatically.",
+                            "description": description or f"Archived from {album_name} automatically.",
                             "simpleMediaItem": {
                                 "fileName": filename,
                                 "uploadToken": upload_token
@@ -149,6 +159,8 @@ class GooglePhotosUploader:
                     status = new_media_item_results[0].get('status', {})
                     if status.get('message') == 'Success':
                         print(f"  ✅ {filename} 成功加入 Google Photos ({album_name})")
+                        if self.archive:
+                            self.archive.add_file(local_file, self.DESTINATION)
                         return True
                     else:
                         print(f"  ❌ 加入 Google Photos 失败: {status}")
@@ -0,0 +1,55 @@
+"""
+合并 GitHub Actions 矩阵中各任务的状态目录
+
+矩阵任务各自从同一份 Actions cache 恢复状态、运行后以 artifact 形式上传，
+由汇总任务合并回目的地的缓存，避免按矩阵分组各存一份 (分组随 users.txt 变化时状态丢失)。
+
+用法:
+    python src/tasks/merge_state.py state partial-state/*
+"""
+
+import os
+import sys
+import argparse
+
+# 将 src 目录添加到 sys.path，确保可以导入 core
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.scan_state import HighWaterStore, ScanCheckpointStore
+from core.media_archive import MediaArchive
+
+
+def merge_state(target: str, sources: list):
+    """将 sources 下的状态目录合并进 target (不存在时创建)"""
+    os.makedirs(target, exist_ok=True)
+    sources = [s for s in sources if os.path.isdir(s) and os.path.abspath(s) != os.path.abspath(target)]
+
+    high_water = HighWaterStore(os.path.join(target, HighWaterStore.FILE_NAME))
+    archive = MediaArchive(os.path.join(target, MediaArchive.FILE_NAME))
+    marks = media = 0
+    try:
+        for source in sources:
+            marks += high_water.merge(os.path.join(source, HighWaterStore.FILE_NAME))
+            db_path = os.path.join(source, MediaArchive.FILE_NAME)
+            if os.path.exists(db_path):
+                media += archive.merge(db_path)
+    finally:
+        archive.close()
+
+    checkpoints = ScanCheckpointStore(os.path.join(target, ScanCheckpointStore.DIR_NAME)).merge(
+        [os.path.join(source, ScanCheckpointStore.DIR_NAME) for source in sources]
+    )
+    print(f"🗂️ 合并 {len(sources)} 份状态 -> {target}: 归档范围更新 {marks} 条 | "
+          f"新增媒体记录 {media} 条 | 断点 {checkpoints} 个")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并并行任务的扫描状态与归档数据库")
+    parser.add_argument('target', help="合并到的状态目录 (通常为从缓存恢复的 state)")
+    parser.add_argument('sources', nargs='*', help="各任务上传的状态目录")
+    args = parser.parse_args()
+    merge_state(args.target, args.sources)
+
+
+if __name__ == "__main__":
+    main()
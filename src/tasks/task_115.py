@@ -8,6 +8,10 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from dotenv import load_dotenv
 from core.x_scraper import XScraper
+from core.media_archive import MediaArchive
+from core.browser_pool import BrowserPool
+from core.user_runner import add_parallel_arguments, default_transfer_slots, run_users
+from core.media_pipeline import MediaPipeline
 from uploaders.uploader_115 import Uploader115
 
 load_dotenv()
@@ -16,6 +20,7 @@ async def main():
     parser = argparse.ArgumentParser(description="X 平台抓取并上传至 115网盘 工作流")
     parser.add_argument('--users', type=str, required=True, help="逗号分隔的 X 用户名列表")
     parser.add_argument('--time_range', type=str, default="3天", help="要抓取的时间范围选项")
+    add_parallel_arguments(parser)
     args = parser.parse_args()
     
     users = [u.strip() for u in args.users.split(',') if u.strip()]
@@ -26,21 +31,31 @@ async def main():
         print("⚠️ 未配置 115 网盘 COOKIES，无法上传！")
         return
 
-    uploader = Uploader115(cookies_raw=cookies_115)
-    
+    archive = MediaArchive()
+    uploader = Uploader115(cookies_raw=cookies_115, archive=archive)
+
+    transfer_slots = asyncio.Semaphore(default_transfer_slots())
+    # p115client 为同步客户端：上传放到线程中执行，同一时刻只允许一个用户上传
+    upload_lock = asyncio.Lock()
+
+    # 所有用户共享一个按需启动的浏览器
+    async with BrowserPool() as browser_pool:
+        async def process_user(user: str):
+            print(f"\n🚀 开始处理 [115网盘] 备份任务: {user} | 范围: {args.time_range}")
+            scraper = XScraper(username=user, time_range=args.time_range, cookies_raw=cookies_x,
+                               destination=Uploader115.DESTINATION, archive=archive,
+                               browser_pool=browser_pool, transfer_slots=transfer_slots)
+
+            # 每个文件下载完成即上传，确认后删除本地文件
+            async def upload(item) -> bool:
+                async with upload_lock:
+                    return await asyncio.to_thread(uploader.upload_file, item.path, "Twitter_Archive", user, item.sha1)
+
+            uploaded, failed = await MediaPipeline(scraper, upload).run()
+            scraper.mark_archived(uploaded, failed)
+            scraper.cleanup()
 
-    for user in users:
-        print(f"\n🚀 开始处理 [115网盘] 备份任务: {user} | 范围: {args.time_range}")
-        scraper = XScraper(username=user, time_range=args.time_range, cookies_raw=cookies_x)
-        files = await scraper.fetch_media_files()
-        
-        if files:
-            uploader.upload_files(
-                files=files,
-                remote_root="Twitter_Archive",
-                user_name=user
-            )
-        scraper.cleanup()
+        await run_users(users, process_user, args.parallel_users)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,157 @@
+"""
+X 平台抓取并同时上传至多个目的地 工作流
+
+每个用户只扫描、下载一次，每个文件落盘后并发交给 --targets 指定的全部上传器 (115 / quark / google)：
+- 各目的地分别记录成功与失败，独立推进各自的归档范围
+- 文件在所有目的地都确认后才删除；某个目的地失败不影响其它目的地的归档记录，
+  下次运行时已成功的目的地会按归档库直接跳过
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+
+# 将 src 目录添加到 sys.path，解决直接运行时的 ModuleNotFoundError
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+from core.x_scraper import XScraper
+from core.media_archive import MediaArchive
+from core.browser_pool import BrowserPool
+from core.media_pipeline import MediaPipeline
+from core.user_runner import add_parallel_arguments, default_transfer_slots, run_users
+
+load_dotenv()
+
+TARGETS = ("115", "quark", "google")
+
+
+async def setup_115(archive, browser_pool):
+    cookies_115 = os.getenv("COOKIES_115")
+    if not cookies_115:
+        print("⚠️ 未配置 115 网盘 COOKIES，跳过 115")
+        return None, None
+    from uploaders.uploader_115 import Uploader115
+    uploader = Uploader115(cookies_raw=cookies_115, archive=archive)
+    # p115client 为同步客户端：上传放到线程中执行并串行化
+    lock = asyncio.Lock()
+
+    async def upload(item, user: str) -> bool:
+        async with lock:
+            return await asyncio.to_thread(uploader.upload_file, item.path, "Twitter_Archive", user, item.sha1)
+
+    return upload, None
+
+
+async def setup_quark(archive, browser_pool):
+    cookies_quark = os.getenv("COOKIES_QUARK")
+    if not cookies_quark:
+        print("⚠️ 未配置 夸克网盘 COOKIES，跳过夸克")
+        return None, None
+    from uploaders.uploader_quark import UploaderQuark
+    try:
+        uploader = await UploaderQuark.open(await browser_pool.get_browser(), cookies_quark, archive=archive)
+    except Exception as e:
+        print(f"⚠️ 解析夸克 Cookies 失败，跳过夸克: {e}")
+        return None, None
+    # 夸克上传器按用户文件夹各保持一个页面，但页面操作共用同一状态，上传需串行化
+    lock = asyncio.Lock()
+
+    async def upload(item, user: str) -> bool:
+        async with lock:
+            return await uploader.upload_file(item.path, remote_root=f"Twitter_Archive/{user}")
+
+    return upload, uploader.shutdown
+
+
+async def setup_google(archive, browser_pool):
+    token_gp = os.getenv("GOOGLE_PHOTOS_TOKEN")
+    if not token_gp:
+        print("⚠️ 未配置 Google Photos Token，跳过 Google Photos")
+        return None, None
+    try:
+        from google_photos_uploader import GooglePhotosUploader
+        uploader = GooglePhotosUploader(token_base64=token_gp, archive=archive)
+    except Exception as e:
+        print(f"❌ 初始化 Google Photos 客户端失败，跳过 Google Photos: {e}")
+        return None, None
+    # Google API 客户端不是线程安全的：上传放到线程中执行并串行化
+    lock = asyncio.Lock()
+
+    async def upload(item, user: str) -> bool:
+        async with lock:
+            return await asyncio.to_thread(uploader.upload_file, item.path, album_name=f"X_Archive_{user}",
+                                           description=item.tweet_url)
+
+    return upload, None
+
+
+SETUP = {"115": setup_115, "quark": setup_quark, "google": setup_google}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="X 平台抓取并同时上传至多个目的地 工作流")
+    parser.add_argument('--users', type=str, required=True, help="逗号分隔的 X 用户名列表")
+    parser.add_argument('--time_range', type=str, default="3天", help="要抓取的时间范围选项")
+    parser.add_argument('--targets', type=str, default=",".join(TARGETS),
+                        help=f"逗号分隔的上传目的地 (可选: {', '.join(TARGETS)})")
+    add_parallel_arguments(parser)
+    args = parser.parse_args()
+
+    users = [u.strip() for u in args.users.split(',') if u.strip()]
+    targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        print(f"❌ 未知的上传目的地: {', '.join(unknown)} (可选: {', '.join(TARGETS)})")
+        return
+    cookies_x = os.getenv("TWITTER_COOKIES")
+
+    archive = MediaArchive()
+    transfer_slots = asyncio.Semaphore(default_transfer_slots())
+
+    async with BrowserPool() as browser_pool:
+        uploads = {}
+        closers = []
+        for target in dict.fromkeys(targets):
+            upload, close = await SETUP[target](archive, browser_pool)
+            if upload:
+                uploads[target] = upload
+            if close:
+                closers.append(close)
+        if not uploads:
+            print("⚠️ 没有可用的上传目的地，无法上传！")
+            return
+
+        async def process_user(user: str):
+            print(f"\n🚀 开始处理 [{' / '.join(uploads)}] 备份任务: {user} | 范围: {args.time_range}")
+            scraper = XScraper(username=user, time_range=args.time_range, cookies_raw=cookies_x,
+                               destinations=list(uploads), archive=archive,
+                               browser_pool=browser_pool, transfer_slots=transfer_slots)
+            results = {destination: {"uploaded": [], "failed": []} for destination in uploads}
+
+            # 每个文件并发上传到所有目的地，全部确认后才删除本地文件
+            async def upload(item) -> bool:
+                outcomes = await asyncio.gather(*(fn(item, user) for fn in uploads.values()), return_exceptions=True)
+                for destination, ok in zip(uploads, outcomes):
+                    if isinstance(ok, BaseException):
+                        print(f"  ❌ [{destination}] {item.filename} 上传异常: {ok}")
+                        ok = False
+                    results[destination]["uploaded" if ok else "failed"].append(item)
+                return all(ok is True for ok in outcomes)
+
+            await MediaPipeline(scraper, upload).run()
+            for destination, result in results.items():
+                if result["uploaded"] or result["failed"]:
+                    print(f"☁️ [{user}] {destination}: ✅ {len(result['uploaded'])} 成功, ❌ {len(result['failed'])} 失败")
+                scraper.mark_archived(result["uploaded"], result["failed"], destination=destination)
+            scraper.cleanup()
+
+        try:
+            await run_users(users, process_user, args.parallel_users)
+        finally:
+            for close in closers:
+                await close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
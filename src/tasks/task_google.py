@@ -8,6 +8,10 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.x_scraper import XScraper
+from core.media_archive import MediaArchive
+from core.browser_pool import BrowserPool
+from core.user_runner import add_parallel_arguments, default_transfer_slots, run_users
+from core.media_pipeline import MediaPipeline
 
 load_dotenv()
 
@@ -15,6 +19,7 @@ async def main():
     parser = argparse.ArgumentParser(description="X 平台抓取并上传至 Google Photos 工作流")
     parser.add_argument('--users', type=str, required=True, help="逗号分隔的 X 用户名列表")
     parser.add_argument('--time_range', type=str, default="3天", help="要抓取的时间范围选项")
+    add_parallel_arguments(parser)
     args = parser.parse_args()
     
     users = [u.strip() for u in args.users.split(',') if u.strip()]
@@ -28,7 +33,8 @@ async def main():
 
     try:
          from google_photos_uploader import GooglePhotosUploader
-         uploader = GooglePhotosUploader(token_base64=token_gp)
+         archive = MediaArchive()
+         uploader = GooglePhotosUploader(token_base64=token_gp, archive=archive)
     except ImportError as e:
          print(f"❌ 缺少依赖模块: {e}")
          return
@@ -36,18 +42,33 @@ async def main():
          print(f"❌ 初始化 Google Photos 客户端失败: {e}")
          return
          
-    for user in users:
-        print(f"\n🚀 开始处理 [Google Photos] 备份任务: {user}")
-        scraper = XScraper(username=user, time_range=time_range, cookies_raw=cookies_x)
-        files = await scraper.fetch_media_files()
-        
-        if files:
+    transfer_slots = asyncio.Semaphore(default_transfer_slots())
+    # Google API 客户端不是线程安全的：上传放到线程中执行，同一时刻只允许一个用户上传
+    upload_lock = asyncio.Lock()
+
+    # 所有用户共享一个按需启动的浏览器
+    async with BrowserPool() as browser_pool:
+        async def process_user(user: str):
+            print(f"\n🚀 开始处理 [Google Photos] 备份任务: {user}")
+            scraper = XScraper(username=user, time_range=time_range, cookies_raw=cookies_x,
+                               destination=GooglePhotosUploader.DESTINATION, archive=archive,
+                               browser_pool=browser_pool, transfer_slots=transfer_slots)
             album_name = f"X_Archive_{user}"
-            print(f"☁️ 准备上传 {len(files)} 个文件到相册 '{album_name}'...")
-            for local_file in files:
-                uploader.upload_file(local_file, album_name=album_name)
 
-        scraper.cleanup()
+            # 每个文件下载完成即上传到相册，确认后删除本地文件
+            async def upload(item) -> bool:
+                async with upload_lock:
+                    return await asyncio.to_thread(uploader.upload_file, item.path, album_name=album_name,
+                                                   description=item.tweet_url)
+
+            uploaded, failed = await MediaPipeline(scraper, upload).run()
+            if uploaded or failed:
+                print(f"☁️ [{user}] 相册 '{album_name}': ✅ {len(uploaded)} 成功, ❌ {len(failed)} 失败")
+            scraper.mark_archived(uploaded, failed)
+
+            scraper.cleanup()
+
+        await run_users(users, process_user, args.parallel_users)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -10,9 +10,13 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.x_scraper import XScraper
+from core.media_archive import MediaArchive
 
 load_dotenv()
 
+# gallery-dl 连续跳过这么多个已归档文件后即终止，视为已追上上次的进度
+ARCHIVED_STREAK_ABORT = 20
+
 async def main():
     parser = argparse.ArgumentParser(description="X 平台全量历史媒体抓取并上传至 Google Photos")
     parser.add_argument('--users', type=str, required=True, help="逗号分隔的 X 用户名列表")
@@ -28,7 +32,8 @@ async def main():
 
     try:
          from google_photos_uploader import GooglePhotosUploader
-         uploader = GooglePhotosUploader(token_base64=token_gp)
+         archive = MediaArchive()
+         uploader = GooglePhotosUploader(token_base64=token_gp, archive=archive)
     except ImportError as e:
          print(f"❌ 缺少依赖模块: {e}")
          return
@@ -49,12 +54,21 @@ async def main():
         print(f"📥 正在执行 gallery-dl 全量深度抓取 {user}，此过程可能会持续很久...")
         # 目标提取该用户发送的所有带媒体的内容
         target_url = f"https://x.com/{user}/media"
+
+        # 把已归档到 Google Photos 的媒体导出为 gallery-dl 下载档案，已归档条目不再下载
+        archive_file = os.path.join(scraper.download_root, f".{user}_gallery_dl_archive.sqlite3")
+        exported = archive.export_gallery_dl_archive(GooglePhotosUploader.DESTINATION, archive_file)
+        print(f"🗃️ 已导出 {exported} 条归档记录，连续命中 {ARCHIVED_STREAK_ABORT} 条已归档媒体即停止")
         
         cmd = [
             "gallery-dl",
             target_url,
             "--directory", user_download_dir,
-            "--cookies", cookie_file if cookie_file else ""
+            "--cookies", cookie_file if cookie_file else "",
+            "--download-archive", archive_file,
+            "-o", "archive-prefix=",
+            "-o", f"archive-format={MediaArchive.GALLERY_DL_ARCHIVE_FORMAT}",
+            "--abort", str(ARCHIVED_STREAK_ABORT),
         ]
         
         # 移除非法空参数
@@ -64,6 +78,10 @@ async def main():
             subprocess.run(cmd, check=False)
         except Exception as e:
             print(f"❌ gallery-dl 运行出错（请检查是否已安装 pip install gallery-dl）: {e}")
+        finally:
+            scraper._remove_cookies_file(cookie_file)
+            if os.path.exists(archive_file):
+                os.remove(archive_file)
         
         # gallery-dl 通常会创建很多子文件夹，我们用 glob 递归提取所有文件
         all_files = glob.glob(f"{user_download_dir}/**/*", recursive=True)
@@ -9,8 +9,12 @@
 5. 提交磁力链接至夸克网盘离线下载
 6. 更新 magnet_series.json 中的 last_number
 
+默认先把所有系列待探测的番号合并为少数几条 nyaa OR 查询批量搜索 (MagnetScraper.search_many)，
+各系列再按顺序查表；--no_batch 时改为逐个番号搜索，各系列在全局并发上限 (--concurrency)
+与 nyaa 令牌桶限速 (--rate) 下并发进行。找到的磁力按到达顺序排队提交。
+
 用法:
-    python src/tasks/task_magnet_sync.py [--dry_run] [--series "zPP系列"] [--target quark|115]
+    python src/tasks/task_magnet_sync.py [--dry_run] [--series "zPP系列"] [--target quark|115] [--concurrency 4] [--rate 1] [--no_batch] [--backend rss|html]
 """
 
 import os
@@ -64,49 +68,92 @@ def generate_next_keyword(prefix: str, last_number: int) -> str:
     return f"{prefix}{next_num}"
 
 
+def default_concurrency() -> int:
+    """同时进行搜索的系列数上限 (环境变量 MAGNET_CONCURRENCY，默认 4)"""
+    return int(os.getenv("MAGNET_CONCURRENCY", "4"))
+
+
 async def process_single_series(
     series_name: str,
     series_config: dict,
     scraper,
-    uploader,
-    dry_run: bool = True,
+    search_slots: asyncio.Semaphore,
+    submissions: asyncio.Queue = None,
     check_count: int = 3,
+    catch_up: bool = False,
+    prefetched: dict = None,
 ) -> int:
-    """处理单个番号系列：检查多个连续编号"""
+    """
+    处理单个番号系列：按顺序检查多个连续编号，遇到未发布的编号即停止；
+    追赶模式下改为一次前缀搜索找出所有比 last_number 新的编号。
+    找到的磁力放入 submissions 队列交给离线下载提交协程，不等待提交完成；
+    submissions 为 None 时为演习模式，只搜索并推进 last_number。
+    prefetched 为批量搜索得到的 {关键字: 磁力或 None}，给出时直接查表而不再逐个搜索。
+    返回找到的磁力数量。
+    """
     prefix = series_config["prefix"]
     last_number = series_config.get("last_number", 0)
-    success_total = 0
+    found = 0
 
-    print(f"\n{'='*50}")
     print(f"📁 系列: {series_name} | 前缀: {prefix} | 当前最新: {last_number}")
-    print(f"{'='*50}")
+
+    async def accept(keyword: str, target_number: int, magnet: str):
+        nonlocal found
+        found += 1
+        if submissions is None:
+            print(f"  🧪 [DRY RUN] {keyword} 将会提交磁力: {magnet[:60]}...")
+            series_config["last_number"] = target_number
+        else:
+            await submissions.put((series_name, series_config, keyword, target_number, magnet))
+
+    if catch_up:
+        async with search_slots:
+            releases = await asyncio.to_thread(scraper.find_new_releases, prefix, last_number)
+        # 从小到大提交，last_number 最终推进到最新的编号
+        for number in sorted(releases):
+            magnet = releases[number].get("magnet")
+            if magnet:
+                await accept(generate_next_keyword(prefix, number - 1), number, magnet)
+        return found
 
     for offset in range(1, check_count + 1):
         target_number = last_number + offset
         keyword = generate_next_keyword(prefix, last_number + offset - 1)
-        print(f"\n🎯 [{offset}/{check_count}] 搜索目标: {keyword}")
+        print(f"\n🎯 [{series_name} {offset}/{check_count}] 搜索目标: {keyword}")
 
-        # MagnetScraper 是纯 HTTP 同步调用
-        magnet = scraper.search_best_magnet(keyword)
+        # MagnetScraper 是纯 HTTP 同步调用，放到线程中执行；全局并发由 search_slots 限制，
+        # 对 nyaa 的请求速率由共享 HttpSession 的令牌桶限制
+        if prefetched is not None:
+            magnet = prefetched.get(keyword)
+        else:
+            async with search_slots:
+                magnet = await asyncio.to_thread(scraper.search_best_magnet, keyword)
 
         if not magnet:
             print(f"  📭 {keyword} 暂无资源，可能尚未发布")
             break
+        await accept(keyword, target_number, magnet)
 
-        if dry_run:
-            print(f"  🧪 [DRY RUN] 将会提交磁力: {magnet[:60]}...")
-            series_config["last_number"] = target_number
+    return found
+
+
+async def submit_offline_downloads(submissions: asyncio.Queue, uploader) -> int:
+    """
+    按到达顺序逐个提交离线下载 (上传器只操作一个页面，提交需串行)，
+    成功后推进对应系列的 last_number。收到 None 时结束，返回成功提交数。
+    """
+    success_total = 0
+    while True:
+        job = await submissions.get()
+        if job is None:
+            return success_total
+        series_name, series_config, keyword, target_number, magnet = job
+        if await uploader.add_offline_download(magnet):
+            series_config["last_number"] = max(series_config.get("last_number", 0), target_number)
             success_total += 1
+            print(f"  ✅ [{series_name}] {keyword} 已成功提交离线下载！")
         else:
-            submitted = await uploader.add_offline_download(magnet)
-            if submitted:
-                series_config["last_number"] = target_number
-                success_total += 1
-                print(f"  ✅ {keyword} 已成功提交离线下载！")
-            else:
-                print(f"  ❌ {keyword} 提交离线下载失败")
-
-    return success_total
+            print(f"  ❌ [{series_name}] {keyword} 提交离线下载失败")
 
 
 async def main():
@@ -119,6 +166,16 @@ async def main():
                         help="目标云盘（quark 或 115，默认 quark）")
     parser.add_argument('--check_count', type=int, default=3,
                         help="每个系列向前探测的编号数量（默认3）")
+    parser.add_argument('--catch_up', action='store_true', default=False,
+                        help="追赶模式：按前缀搜索最新发布，一次找出并提交所有比 last_number 新的编号")
+    parser.add_argument('--concurrency', type=int, default=default_concurrency(),
+                        help="同时搜索的系列数（默认读取 MAGNET_CONCURRENCY，即 4）")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="对 nyaa 的每秒请求数上限（默认读取 X_HTTP_HOST_RATE，即 1）")
+    parser.add_argument('--no_batch', action='store_true', default=False,
+                        help="关闭批量搜索，逐个番号单独请求 nyaa")
+    parser.add_argument('--backend', type=str, default=None, choices=['rss', 'html'],
+                        help="nyaa 结果后端（默认读取 MAGNET_BACKEND，即 rss；追赶搜索翻页固定使用 html）")
     args = parser.parse_args()
 
     print("🚀 磁力链接自动追踪工作流启动\n")
@@ -146,7 +203,8 @@ async def main():
 
     # 初始化磁力搜索引擎（纯 HTTP，无需 Playwright）
     from core.magnet_scraper import MagnetScraper
-    scraper = MagnetScraper()
+    from core.http_session import HttpSession
+    scraper = MagnetScraper(HttpSession(host_rate=args.rate) if args.rate else None, backend=args.backend)
 
     # 初始化上传器
     uploader = None
@@ -155,7 +213,13 @@ async def main():
 
     if not args.dry_run:
         if args.target == 'quark':
+            cookies_quark = os.getenv("COOKIES_QUARK")
+            if not cookies_quark:
+                print("❌ 非演习模式下目标为 quark 时必须配置 COOKIES_QUARK 环境变量")
+                return
+
             from playwright.async_api import async_playwright
+            from uploaders.uploader_quark import UploaderQuark
             pw = await async_playwright().start()
             browser = await pw.chromium.launch(
                 headless=True,
@@ -165,45 +229,14 @@ async def main():
                     '--disable-dev-shm-usage',
                 ]
             )
-            context = await browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                           'AppleWebKit/537.36 (KHTML, like Gecko) '
-                           'Chrome/120.0.0.0 Safari/537.36',
-                viewport={'width': 1920, 'height': 1080},
-            )
-
-            cookies_quark = os.getenv("COOKIES_QUARK")
-            if not cookies_quark:
-                print("❌ 非演习模式下目标为 quark 时必须配置 COOKIES_QUARK 环境变量")
-                await browser.close()
-                await pw.stop()
-                return
-
             try:
-                cookies = json.loads(cookies_quark)
-                clean_list = []
-                for c in cookies:
-                    domain = c.get('domain', '')
-                    if domain.endswith('quark.cn'):
-                        domain = '.quark.cn'
-                    clean = {
-                        'name': c.get('name', ''),
-                        'value': c.get('value', ''),
-                        'domain': domain,
-                        'path': c.get('path', '/'),
-                    }
-                    clean_list.append(clean)
-                await context.add_cookies(clean_list)
-                print(f"✅ 已加载 {len(clean_list)} 条夸克 Cookie")
+                uploader = await UploaderQuark.open(browser, cookies_quark)
             except Exception as e:
                 print(f"❌ 解析夸克 Cookies 失败: {e}")
                 await browser.close()
                 await pw.stop()
                 return
 
-            from uploaders.uploader_quark import UploaderQuark
-            uploader = UploaderQuark(cookies_raw=cookies_quark, browser_context=context)
-
         elif args.target == '115':
             cookies_115 = os.getenv("COOKIES_115")
             if not cookies_115:
@@ -212,21 +245,49 @@ async def main():
             from uploaders.uploader_115 import Uploader115
             uploader = Uploader115(cookies_raw=cookies_115)
 
-    # 逐个系列处理
-    total_success = 0
-    for name, config in series_to_process.items():
-        count = await process_single_series(
-            series_name=name,
-            series_config=config,
-            scraper=scraper,
-            uploader=uploader,
-            dry_run=args.dry_run,
-            check_count=args.check_count,
-        )
-        total_success += count
+    # 各系列并发搜索，找到的磁力随即进入提交队列
+    search_slots = asyncio.Semaphore(max(1, args.concurrency))
+    submissions = None if args.dry_run else asyncio.Queue()
+    submitter = asyncio.create_task(submit_offline_downloads(submissions, uploader)) if submissions else None
+    try:
+        prefetched = None
+        if not args.catch_up and not args.no_batch:
+            # 所有系列接下来 check_count 个编号一次性批量搜索
+            keywords = [
+                generate_next_keyword(config["prefix"], config.get("last_number", 0) + offset - 1)
+                for config in series_to_process.values()
+                for offset in range(1, args.check_count + 1)
+            ]
+            print(f"🔎 批量搜索 {len(keywords)} 个候选番号...\n")
+            prefetched = await asyncio.to_thread(scraper.search_best_magnets, keywords)
+
+        names = list(series_to_process)
+        results = await asyncio.gather(*(
+            process_single_series(
+                series_name=name,
+                series_config=series_to_process[name],
+                scraper=scraper,
+                search_slots=search_slots,
+                submissions=submissions,
+                check_count=args.check_count,
+                catch_up=args.catch_up,
+                prefetched=prefetched,
+            )
+            for name in names
+        ), return_exceptions=True)
+    finally:
+        if submitter:
+            await submissions.put(None)
+            submitted = await submitter
+
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            print(f"❌ 系列 {name} 处理失败: {result!r}")
+    total_success = submitted if submitter else sum(r for r in results if not isinstance(r, BaseException))
 
     # 关闭资源
     if browser:
+        await uploader.shutdown()
         await browser.close()
     if pw:
         await pw.stop()
@@ -239,6 +300,7 @@ async def main():
     print(f"📊 工作流结算报告")
     print(f"  ▶ 处理系列数: {len(series_to_process)}")
     print(f"  ▶ 成功提交磁力: {total_success}")
+    print(f"  ▶ 搜索请求: {scraper.session.stats['requests']} 次 (重试 {scraper.session.stats['retries']} 次)")
     print(f"{'='*50}")
 
 
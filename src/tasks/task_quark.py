@@ -8,13 +8,16 @@ import os
 import sys
 import asyncio
 import argparse
-import json
 
 # 将 src 目录添加到 sys.path，解决直接运行时的 ModuleNotFoundError
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from dotenv import load_dotenv
 from core.x_scraper import XScraper
+from core.media_archive import MediaArchive
+from core.browser_pool import BrowserPool
+from core.user_runner import add_parallel_arguments, default_transfer_slots, run_users
+from core.media_pipeline import MediaPipeline
 from uploaders.uploader_quark import UploaderQuark
 
 load_dotenv()
@@ -22,7 +25,8 @@ load_dotenv()
 async def main():
     parser = argparse.ArgumentParser(description="X 平台抓取并上传至 夸克网盘 工作流")
     parser.add_argument('--users', type=str, required=True, help="逗号分隔的 X 用户名列表")
-    parser.add_argument('--time_range', type=str, default="1个月", help="抓取时间范围 (当天/3天/1周/1个月/1年/全部)")
+    parser.add_argument('--time_range', type=str, default="1个月", help="抓取时间范围 (当天/3天/1周/1个月/3个月/半年/1年/全部)")
+    add_parallel_arguments(parser)
     args = parser.parse_args()
     
     users = [u.strip() for u in args.users.split(',') if u.strip()]
@@ -43,47 +47,45 @@ async def main():
                 '--disable-dev-shm-usage',
             ]
         )
-        context = await browser.new_context(
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            viewport={'width': 1920, 'height': 1080},
-        )
-        
-        # 加载夸克 Cookie
+        # 创建上传器（Playwright 浏览器模拟方式，独立上下文）并加载夸克 Cookie
+        archive = MediaArchive()
         try:
-            cookies = json.loads(cookies_quark)
-            clean_list = []
-            for c in cookies:
-                domain = c.get('domain', '')
-                if domain.endswith('quark.cn'):
-                    domain = '.quark.cn'
-                clean = {
-                    'name': c.get('name', ''),
-                    'value': c.get('value', ''),
-                    'domain': domain,
-                    'path': c.get('path', '/'),
-                }
-                clean_list.append(clean)
-            await context.add_cookies(clean_list)
-            print(f"✅ 已加载 {len(clean_list)} 条夸克 Cookie")
+            uploader = await UploaderQuark.open(browser, cookies_quark, archive=archive)
         except Exception as e:
             print(f"⚠️ 解析夸克 Cookies 失败: {e}")
             await browser.close()
             return
+        # X 扫描复用同一个浏览器，各用户从池中借用独立上下文
+        browser_pool = BrowserPool(browser)
+        transfer_slots = asyncio.Semaphore(default_transfer_slots())
+        # 夸克上传器按用户文件夹各保持一个页面，但页面操作共用同一状态，同一时刻只允许一个用户上传
+        upload_lock = asyncio.Lock()
 
-        # 创建上传器（Playwright 浏览器模拟方式）
-        uploader = UploaderQuark(cookies_raw=cookies_quark, browser_context=context)
-        
-        for user in users:
+        async def process_user(user: str):
             print(f"\n🚀 开始处理 [夸克网盘] 备份任务: {user} | 范围: {args.time_range}")
-            scraper = XScraper(username=user, time_range=args.time_range, cookies_raw=cookies_x)
-            files = await scraper.fetch_media_files()
-            
-            if files:
-                await uploader.upload_files(files=files, remote_root=f"Twitter_Archive/{user}")
+            scraper = XScraper(username=user, time_range=args.time_range, cookies_raw=cookies_x,
+                               destination=UploaderQuark.DESTINATION, archive=archive,
+                               browser_pool=browser_pool, transfer_slots=transfer_slots)
+
+            # 每个文件下载完成即上传，确认后删除本地文件
+            async def upload(item) -> bool:
+                async with upload_lock:
+                    return await uploader.upload_file(item.path, remote_root=f"Twitter_Archive/{user}")
+
+            uploaded, failed = await MediaPipeline(scraper, upload).run()
+            if uploaded or failed:
+                print(f"☁️ [{user}] 夸克上传完成: ✅ {len(uploaded)} 成功, ❌ {len(failed)} 失败")
             else:
                 print(f"  ℹ️ {user}: 没有发现新的媒体文件")
+            # 没有新文件 (推文都已归档或被筛除) 时同样推进归档范围，避免下次重扫同一时间窗口
+            scraper.mark_archived(uploaded, failed)
             scraper.cleanup()
-        
+
+        try:
+            await run_users(users, process_user, args.parallel_users)
+        finally:
+            await uploader.shutdown()
+            await browser_pool.close()
         await browser.close()
 
 if __name__ == "__main__":
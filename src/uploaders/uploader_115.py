@@ -3,9 +3,15 @@ import glob
 from p115client import P115Client
 
 class Uploader115:
-    def __init__(self, cookies_raw: str):
+    # MediaArchive 中的目的地标识
+    DESTINATION = "115"
+
+    def __init__(self, cookies_raw: str, archive=None):
         self.cookies_raw = cookies_raw
+        self.archive = archive
         self.client = self._login()
+        # (远程根目录, 用户名) -> 用户目录 cid
+        self._user_cids = {}
 
     def _parse_cookies_to_string(self, raw: str) -> str:
         if not raw:
@@ -59,7 +65,7 @@ class Uploader115:
         except Exception as e:
             raise e
 
-    def _upload_file(self, local_file, pid):
+    def _upload_file(self, local_file, pid, sha1: str = None):
         import hashlib
         # 1: tool module
         try:
@@ -85,11 +91,15 @@ class Uploader115:
             filename = os.path.basename(local_file)
             filesize = os.path.getsize(local_file)
             
-            sha1 = hashlib.sha1()
-            with open(local_file, 'rb') as f:
-                while chunk := f.read(8192):
-                    sha1.update(chunk)
-            file_sha1 = sha1.hexdigest().upper()
+            # 下载清单中已有 sha1 时无需再读一遍文件
+            if sha1:
+                file_sha1 = sha1.upper()
+            else:
+                digest = hashlib.sha1()
+                with open(local_file, 'rb') as f:
+                    while chunk := f.read(8192):
+                        digest.update(chunk)
+                file_sha1 = digest.hexdigest().upper()
             
             cookie_str = self._parse_cookies_to_string(self.cookies_raw)
             headers = {'Cookie': cookie_str, 'User-Agent': 'Mozilla/5.0'}
@@ -116,30 +126,63 @@ class Uploader115:
         except ImportError:
             raise Exception("需要安装 requests 库")
 
-    def upload_files(self, files: list, remote_root: str, user_name: str):
-        if not self.client: return
-        if not files: return
+    def _user_cid(self, remote_root: str, user_name: str):
+        key = (remote_root, user_name)
+        if key not in self._user_cids:
+            archive_cid = self.get_or_create_cid(0, remote_root)
+            self._user_cids[key] = self.get_or_create_cid(archive_cid, user_name)
+        return self._user_cids[key]
+
+    def _upload_to_cid(self, local_file: str, user_cid, sha1: str = None) -> bool:
+        filename = os.path.basename(local_file)
+        if self.archive and self.archive.contains_file(local_file, self.DESTINATION):
+            print(f"  ⏩ {filename} 已归档，跳过")
+            return True
+        try:
+            self._upload_file(local_file, user_cid, sha1)
+            if self.archive:
+                self.archive.add_file(local_file, self.DESTINATION)
+            print(f"  ✅ {filename} 上传成功")
+            import time
+            time.sleep(1)
+            return True
+        except Exception as ue:
+            print(f"  ❌ {filename} 上传失败: {ue}")
+            return False
+
+    @staticmethod
+    def _report_error(e: Exception):
+        err_str = str(e)
+        if "errno': 99" in err_str or "请重新登录" in err_str:
+            print(f"❌ 115 上传失败: Cookie 已过期！({e})")
+        else:
+            print(f"❌ 115 上传出错: {e}")
+
+    def upload_files(self, files: list, remote_root: str, user_name: str) -> list:
+        """上传文件到 115，返回成功上传的本地文件列表"""
+        uploaded = []
+        if not self.client: return uploaded
+        if not files: return uploaded
         
         print(f"☁️ 准备上传 {len(files)} 个文件到 115...")
         try:
-            archive_cid = self.get_or_create_cid(0, remote_root)
-            user_cid = self.get_or_create_cid(archive_cid, user_name)
-            
-            for local_file in files:
-                filename = os.path.basename(local_file)
-                try:
-                    self._upload_file(local_file, user_cid)
-                    print(f"  ✅ {filename} 上传成功")
-                    import time
-                    time.sleep(1)
-                except Exception as ue:
-                    print(f"  ❌ {filename} 上传失败: {ue}")
+            user_cid = self._user_cid(remote_root, user_name)
+            uploaded = [f for f in files if self._upload_to_cid(f, user_cid)]
         except Exception as e:
-            err_str = str(e)
-            if "errno': 99" in err_str or "请重新登录" in err_str:
-                print(f"❌ 115 上传失败: Cookie 已过期！({e})")
-            else:
-                print(f"❌ 115 上传出错: {e}")
+            self._report_error(e)
+        return uploaded
+
+    def upload_file(self, local_file: str, remote_root: str, user_name: str, sha1: str = None) -> bool:
+        """
+        上传单个文件 (供下载→上传流水线逐个调用)，目标目录 cid 在多次调用间缓存
+        :param sha1: 下载清单中已知的文件 sha1，Web 接口秒传校验时直接使用
+        """
+        if not self.client: return False
+        try:
+            return self._upload_to_cid(local_file, self._user_cid(remote_root, user_name), sha1)
+        except Exception as e:
+            self._report_error(e)
+            return False
 
     # =========================================================
     # 离线下载（磁力工作流专用，异步包装）
@@ -11,6 +11,9 @@ import os
 import json
 import asyncio
 from datetime import datetime
+from playwright.async_api import Error as PlaywrightError
+
+from core.resource_blocker import ResourceBlocker
 
 
 class UploaderQuark:
@@ -36,17 +39,80 @@ class UploaderQuark:
     TIMEOUT_UPLOAD_SINGLE = 120_000  # 单文件上传超时 2 分钟
     TIMEOUT_FOLDER_ACTION = 10_000
 
-    def __init__(self, cookies_raw: str, browser_context):
+    # 上传页面使用的桌面浏览器 UA 与视口
+    USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    VIEWPORT = {'width': 1920, 'height': 1080}
+
+    # MediaArchive 中的目的地标识
+    DESTINATION = "quark"
+    # 逐个上传时每个目标文件夹保持一个页面，多用户交替上传时不必反复导航；超过该数量关闭最久未用的页面
+    MAX_FOLDER_PAGES = 4
+
+    def __init__(self, cookies_raw: str, browser_context, archive=None):
         """
         初始化上传器
 
         Args:
             cookies_raw: 夸克网盘 Cookie JSON 字符串
             browser_context: Playwright 浏览器上下文
+            archive: 共享的 MediaArchive，跳过已归档文件并登记新上传的文件
         """
         self.cookies_raw = cookies_raw
         self.context = browser_context
+        self.archive = archive
         self.page = None
+        # 由 open() 创建时持有的资源拦截器，shutdown() 时关闭上下文
+        self.blocker = None
+        self._owns_context = False
+        # 逐个上传 (upload_file) 时按目标文件夹保持的页面及其已有文件 {remote_root: (page, 文件名列表)}，按最近使用排序
+        self._folder_pages = {}
+
+    @classmethod
+    async def open(cls, browser, cookies_raw: str, archive=None) -> "UploaderQuark":
+        """
+        在 browser 上新建夸克专用的上下文 (桌面 UA 与视口、quark-ui 资源拦截) 并载入 Cookie。
+        Cookie 无法解析时关闭该上下文并抛出异常；用完后调用 shutdown()。
+        """
+        context = await browser.new_context(user_agent=cls.USER_AGENT, viewport=cls.VIEWPORT)
+        # 上传页面不加载预览图、字体与埋点脚本
+        blocker = ResourceBlocker("quark-ui")
+        await blocker.attach(context)
+        uploader = cls(cookies_raw=cookies_raw, browser_context=context, archive=archive)
+        uploader.blocker = blocker
+        uploader._owns_context = True
+        try:
+            print(f"✅ 已加载 {await uploader.apply_cookies()} 条夸克 Cookie")
+        except Exception:
+            await context.close()
+            raise
+        return uploader
+
+    async def shutdown(self):
+        """关闭页面，打印资源拦截统计，并关闭 open() 创建的上下文"""
+        await self.close()
+        if self.blocker:
+            self.blocker.report()
+        if self._owns_context:
+            await self.context.close()
+
+    async def apply_cookies(self) -> int:
+        """把夸克 Cookie 写入浏览器上下文，返回写入条数；Cookie 无法解析时抛出异常"""
+        cookies = json.loads(self.cookies_raw)
+        clean_list = []
+        for c in cookies:
+            domain = c.get('domain', '')
+            if domain.endswith('quark.cn'):
+                domain = '.quark.cn'
+            clean = {
+                'name': c.get('name', ''),
+                'value': c.get('value', ''),
+                'domain': domain,
+                'path': c.get('path', '/'),
+            }
+            clean_list.append(clean)
+        await self.context.add_cookies(clean_list)
+        return len(clean_list)
 
     async def _ensure_page(self):
         """确保页面已就绪并已登录"""
@@ -284,42 +350,45 @@ class UploaderQuark:
             print(f"  ⚠️ {filename}: 等待上传状态异常 - {e}")
             return True  # 乐观处理
 
-    async def upload_files(self, files: list, remote_root: str = "Twitter_Archive"):
+    async def upload_files(self, files: list, remote_root: str = "Twitter_Archive") -> list:
         """
         通过浏览器模拟上传文件到夸克网盘
 
         Args:
             files: 本地文件路径列表
             remote_root: 远程目标文件夹名
+
+        Returns:
+            上传成功 (含网盘中已存在而跳过) 的本地文件列表
         """
+        uploaded = []
         if not self.cookies_raw:
             print("⚠️ 未配置夸克 Cookie，无法上传")
-            return
+            return uploaded
+        if self.archive:
+            archived = [f for f in files if self.archive.contains_file(f, self.DESTINATION)]
+            if archived:
+                print(f"⏩ {len(archived)} 个文件已归档到夸克网盘，跳过")
+                uploaded.extend(archived)
+                files = [f for f in files if f not in archived]
         if not files:
             print("⚠️ 没有文件需要上传")
-            return
+            return uploaded
 
         print(f"☁️ 正在通过浏览器模拟上传 {len(files)} 个文件到夸克网盘...")
 
         try:
             # 确保页面就绪
             if not await self._ensure_page():
-                return
+                return uploaded
 
             # 创建/进入目标文件夹
             if not await self._navigate_to_folder(remote_root):
                 print(f"  ❌ 无法导航到目标文件夹 [{remote_root}]。为防止根目录污染，已放弃本次上传。")
-                return
+                return uploaded
 
             # 获取当前页面的文件列表（用于上传前跳过已存在的文件）
-            print("  📊 正在获取已存在文件列表以加速归档...")
-            existing_files = []
-            try:
-                # 夸克文件列表文本通常包含在 table cell 里
-                cell_nodes = await self.page.locator('.ant-table-cell').all_text_contents()
-                existing_files = [n.strip() for n in cell_nodes if n.strip()]
-            except:
-                pass
+            existing_files = await self._list_existing_files()
 
             # 逐个上传文件
             success_count = 0
@@ -337,12 +406,16 @@ class UploaderQuark:
                 if filename in existing_files:
                     print(f"  ⏩ [{i}/{len(files)}] 跳过 (已存在): {filename}")
                     success_count += 1
+                    uploaded.append(local_file)
                     continue
 
                 print(f"\n  [{i}/{len(files)}] 上传: {filename}")
 
                 if await self._upload_single_file(local_file):
                     success_count += 1
+                    uploaded.append(local_file)
+                    if self.archive:
+                        self.archive.add_file(local_file, self.DESTINATION)
                 else:
                     fail_count += 1
 
@@ -355,9 +428,96 @@ class UploaderQuark:
         except Exception as e:
             print(f"❌ 夸克浏览器模拟上传故障: {e}")
         finally:
-            if self.page and not self.page.is_closed():
+            await self.close()
+
+        return uploaded
+
+    async def _list_existing_files(self) -> list:
+        """读取当前文件夹页面中已存在的文件名"""
+        print("  📊 正在获取已存在文件列表以加速归档...")
+        try:
+            # 夸克文件列表文本通常包含在 table cell 里
+            cell_nodes = await self.page.locator('.ant-table-cell').all_text_contents()
+            return [n.strip() for n in cell_nodes if n.strip()]
+        except (OSError, PlaywrightError):
+            # 不吞掉 KeyboardInterrupt / CancelledError，取消上传时应立即结束
+            return []
+
+    async def upload_file(self, local_file: str, remote_root: str = "Twitter_Archive") -> bool:
+        """
+        上传单个文件 (供下载→上传流水线逐个调用)。
+        每个目标文件夹保持一个页面，多用户交替上传时不再来回导航；各调用共用 self.page，需由调用方串行化。
+        全部上传结束后需调用 close()。
+
+        Returns:
+            是否上传成功 (含已归档或网盘中已存在而跳过)
+        """
+        filename = os.path.basename(local_file)
+        if self.archive and self.archive.contains_file(local_file, self.DESTINATION):
+            print(f"  ⏩ {filename} 已归档到夸克网盘，跳过")
+            return True
+        if not self.cookies_raw:
+            print("⚠️ 未配置夸克 Cookie，无法上传")
+            return False
+
+        try:
+            existing_files = await self._open_folder_page(remote_root)
+            if existing_files is None:
+                print(f"  ❌ 无法导航到目标文件夹 [{remote_root}]。为防止根目录污染，已放弃上传 {filename}。")
+                return False
+
+            if filename in existing_files:
+                print(f"  ⏩ 跳过 (已存在): {filename}")
+                return True
+
+            print(f"\n  上传: {filename}")
+            if not await self._upload_single_file(local_file):
+                return False
+            if self.archive:
+                self.archive.add_file(local_file, self.DESTINATION)
+            # 上传间隔，避免触发限制
+            await asyncio.sleep(2)
+            return True
+        except Exception as e:
+            print(f"❌ 夸克浏览器模拟上传故障 ({filename}): {e}")
+            return False
+
+    async def _open_folder_page(self, remote_root: str) -> list | None:
+        """
+        切换到目标文件夹的页面 (没有时新开页面并导航)，返回该文件夹中已有的文件名；
+        页面加载或导航失败时返回 None
+        """
+        entry = self._folder_pages.pop(remote_root, None)
+        if entry and not entry[0].is_closed():
+            self._folder_pages[remote_root] = entry
+            self.page = entry[0]
+            return entry[1]
+
+        self.page = None
+        if not await self._ensure_page() or not await self._navigate_to_folder(remote_root):
+            if self.page:
                 await self.page.close()
-                self.page = None
+            self.page = None
+            return None
+        existing_files = await self._list_existing_files()
+        self._folder_pages[remote_root] = (self.page, existing_files)
+        while len(self._folder_pages) > self.MAX_FOLDER_PAGES:
+            oldest = next(iter(self._folder_pages))
+            page, _ = self._folder_pages.pop(oldest)
+            if not page.is_closed():
+                await page.close()
+        return existing_files
+
+    async def close(self):
+        """关闭上传页面 (含逐个上传时各文件夹的页面)"""
+        pages = [page for page, _ in self._folder_pages.values()]
+        if self.page:
+            pages.append(self.page)
+        for page in dict.fromkeys(pages):
+            if not page.is_closed():
+                await page.close()
+        self.page = None
+        self._folder_pages = {}
 
     # =========================================================
     # 离线下载 & 文件移动（磁力工作流专用）
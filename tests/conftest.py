@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import stat
+import textwrap
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 与 src/tasks 下的脚本一致，把 src 加入 sys.path 以便按 core.xxx 导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+
+@pytest.fixture
+def local_server():
+    """
+    启动后台线程中的本地 HTTP 服务器: local_server(handle) 返回其根地址 (不含末尾 /)，
+    每个 GET/HEAD 请求交给 handle(request) 处理 (request 为 BaseHTTPRequestHandler)；测试结束时关闭全部服务器
+    """
+    servers = []
+
+    def start(handle, protocol_version: str = "HTTP/1.0") -> str:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                handle(self)
+
+            do_HEAD = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        Handler.protocol_version = protocol_version
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+FAKE_GALLERY_DL = """
+import os
+import sys
+import json
+import argparse
+
+parser = argparse.ArgumentParser()
+for option in ("--input-file", "--error-file", "--directory", "--cookies", "--filter"):
+    parser.add_argument(option)
+parser.add_argument("--write-metadata", action="store_true")
+args, _ = parser.parse_known_args()
+
+with open(os.environ["FAKE_GALLERY_DL_LOG"], "a", encoding="utf-8") as f:
+    f.write(json.dumps(sys.argv[1:]) + "\\n")
+with open(os.environ["FAKE_GALLERY_DL_TWEETS"], encoding="utf-8") as f:
+    tweets = json.load(f)
+with open(args.input_file, encoding="utf-8") as f:
+    urls = f.read().split()
+
+os.makedirs(args.directory, exist_ok=True)
+failed = []
+for url in urls:
+    tweet_id = url.rsplit("/", 1)[-1]
+    if tweet_id not in tweets:
+        failed.append(url)
+        continue
+    media = tweets[tweet_id]
+    for num, item in enumerate(media, 1):
+        metadata = dict(item, tweet_id=int(tweet_id), num=num, count=len(media),
+                        author={"name": url.split("/")[3]}, date="2024-05-01 12:00:00")
+        # gallery-dl 以文件元数据为命名空间求值 --filter 表达式
+        if args.filter and not eval(args.filter, {}, metadata):
+            continue
+        path = os.path.join(args.directory, f"{tweet_id}_{num}.{'mp4' if item['type'] == 'video' else 'jpg'}")
+        with open(path, "wb") as f:
+            f.write(b"media")
+        if args.write_metadata:
+            with open(f"{path}.json", "w", encoding="utf-8") as f:
+                json.dump(metadata, f)
+        print(path, flush=True)
+
+if failed:
+    with open(args.error_file, "w", encoding="utf-8") as f:
+        f.write("\\n".join(failed) + "\\n")
+    sys.exit(1)
+"""
+
+
+class FakeGalleryDl:
+    """PATH 中替代 gallery-dl 的脚本：按 tweets 中预置的媒体元数据写出文件与 --write-metadata 旁路文件"""
+
+    def __init__(self, directory):
+        self.tweets_path = directory / "tweets.json"
+        self.log_path = directory / "calls.log"
+        self.tweets = {}
+
+    def write(self):
+        self.tweets_path.write_text(json.dumps(self.tweets), encoding="utf-8")
+
+    @property
+    def calls(self) -> list:
+        """每次启动 gallery-dl 的命令行参数"""
+        if not self.log_path.exists():
+            return []
+        return [json.loads(line) for line in self.log_path.read_text(encoding="utf-8").splitlines()]
+
+
+@pytest.fixture
+def fake_gallery_dl(tmp_path, monkeypatch):
+    """
+    用假的 gallery-dl 替换 PATH 中的可执行文件；
+    测试向 fake.tweets 写入 {tweet_id: [媒体元数据]} 后调用 fake.write()，不在其中的推文视为下载失败
+    """
+    directory = tmp_path / "fake-gallery-dl"
+    directory.mkdir()
+    script = directory / "gallery-dl"
+    script.write_text(f"#!{sys.executable}\n" + textwrap.dedent(FAKE_GALLERY_DL), encoding="utf-8")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+
+    fake = FakeGalleryDl(directory)
+    fake.write()
+    monkeypatch.setenv("PATH", f"{directory}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("FAKE_GALLERY_DL_TWEETS", str(fake.tweets_path))
+    monkeypatch.setenv("FAKE_GALLERY_DL_LOG", str(fake.log_path))
+    return fake
@@ -0,0 +1,164 @@
+"""MagnetScraper：在本地伪 nyaa 服务器上离线验证批量搜索与结果解析"""
+
+import urllib.parse
+from datetime import datetime, timezone
+from html import escape
+
+from core.http_session import HttpSession
+from core.magnet_scraper import MagnetScraper, parse_nyaa_rss
+
+PAGE_SIZE = MagnetScraper.PAGE_SIZE
+
+
+def infohash(index: int) -> str:
+    return f"{index:040x}"
+
+
+class FakeNyaa:
+    """
+    按 nyaa 的规则返回搜索结果的本地服务器：q 以 | 分隔为 OR 条件 (大小写不敏感的子串匹配)，
+    每页 PAGE_SIZE 条；HTML 结果页支持 p= 翻页，RSS 与真实站点一样忽略 p=
+    """
+
+    def __init__(self, local_server, catalog: list):
+        # catalog: [(标题, 做种数)]，列表顺序即发布顺序 (越靠后越新)
+        self.catalog = catalog
+        self.requests = []
+        self.url = local_server(self.handle) + "/"
+
+    def handle(self, request):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(request.path).query, keep_blank_values=True)
+        self.requests.append(query)
+        rows = self.search(query)
+        if "page" in query:
+            body, content_type = self.rss(rows), "application/xml"
+        else:
+            body, content_type = self.html(rows), "text/html"
+        data = body.encode()
+        request.send_response(200)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def search(self, query: dict) -> list:
+        terms = [t.upper() for t in query["q"][0].split("|") if t]
+        rows = [(i, title, seeders) for i, (title, seeders) in enumerate(self.catalog)
+                if any(term in title.upper() for term in terms)]
+        if query.get("s") == ["id"]:
+            rows.sort(key=lambda row: row[0], reverse=True)
+        else:
+            rows.sort(key=lambda row: row[2], reverse=True)
+        page = 1 if "page" in query else int(query.get("p", ["1"])[0])
+        return rows[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+
+    @staticmethod
+    def rss(rows: list) -> str:
+        items = "".join(
+            f"<item><title>{escape(title)}</title><link>magnet:?xt=urn:btih:{infohash(i)}</link>"
+            f"<pubDate>Mon, 01 Jan 2024 00:00:00 -0000</pubDate><nyaa:seeders>{seeders}</nyaa:seeders>"
+            f"<nyaa:infoHash>{infohash(i)}</nyaa:infoHash><nyaa:size>1.5 GiB</nyaa:size></item>"
+            for i, title, seeders in rows
+        )
+        return ('<?xml version="1.0" encoding="utf-8"?>'
+                '<rss xmlns:nyaa="https://sukebei.nyaa.si/xmlns/nyaa" version="2.0">'
+                f"<channel><title>Nyaa</title><link>https://sukebei.nyaa.si/</link>{items}</channel></rss>")
+
+    @staticmethod
+    def html(rows: list) -> str:
+        trs = "".join(
+            f'<tr><td>Art</td><td><a href="/view/{i}" title="{escape(title)}">{escape(title)}</a></td>'
+            f'<td><a href="magnet:?xt=urn:btih:{infohash(i)}">m</a></td><td>1.5 GiB</td>'
+            f"<td>2024-01-01</td><td>{seeders}</td><td>0</td></tr>"
+            for i, title, seeders in rows
+        )
+        return f"<html><body><table><tbody>{trs}</tbody></table></body></html>"
+
+
+def scraper_for(server: FakeNyaa, backend: str = "rss") -> MagnetScraper:
+    scraper = MagnetScraper(HttpSession(host_rate=1000, host_burst=100), backend=backend)
+    scraper.BASE_URL = server.url
+    return scraper
+
+
+def test_search_many_packs_keywords_into_few_or_queries(local_server):
+    keywords = [f"ABC-{n:03d}" for n in range(1, 125)]
+    catalog = [(f"[FHD] ABC-{n:03d} 中文字幕", n) for n in range(1, 125, 2)]
+    # 编号更长的标题不能被误分派给 ABC-100
+    catalog.append(("ABC-1000 other", 999))
+
+    server = FakeNyaa(local_server, catalog)
+    scraper = scraper_for(server)
+    matched = scraper.search_many(keywords)
+
+    assert len(server.requests) == len(scraper._pack_queries(keywords)) < 5
+    for n in range(1, 125):
+        titles = [row["title"] for row in matched[f"ABC-{n:03d}"]]
+        assert titles == ([f"[FHD] ABC-{n:03d} 中文字幕"] if n % 2 else [])
+
+
+def test_search_many_splits_batch_when_page_is_full(local_server):
+    catalog = [(f"XYZ-001 release {i}", 100 + i) for i in range(PAGE_SIZE + 5)]
+    # 做种数最少，合并查询的第一页里被截断
+    catalog.append(("XYZ002 rare", 1))
+
+    server = FakeNyaa(local_server, catalog)
+    matched = scraper_for(server).search_many(["XYZ-001", "XYZ-002"], max_results=3)
+
+    assert len(server.requests) == 3
+    assert [row["title"] for row in matched["XYZ-002"]] == ["XYZ002 rare"]
+    assert len(matched["XYZ-001"]) == 3
+    assert matched["XYZ-001"][0]["seeders"] == 100 + PAGE_SIZE + 4
+
+
+def test_parse_nyaa_rss_builds_magnet_from_infohash():
+    data = FakeNyaa.rss([]).replace("</channel>", (
+        "<item><title>ABC-001 [中文字幕]</title><link>https://sukebei.nyaa.si/download/1.torrent</link>"
+        "<pubDate>Tue, 02 Jan 2024 03:04:05 -0000</pubDate><nyaa:seeders>12</nyaa:seeders>"
+        "<nyaa:infoHash>ABCDEF0123456789ABCDEF0123456789ABCDEF01</nyaa:infoHash><nyaa:size>700.0 MiB</nyaa:size></item>"
+        "<item><title>no magnet</title><link>https://sukebei.nyaa.si/download/2.torrent</link></item>"
+        "</channel>")).encode()
+
+    results = parse_nyaa_rss(data)
+
+    assert len(results) == 1
+    result = results[0]
+    assert result["infohash"] == "abcdef0123456789abcdef0123456789abcdef01"
+    assert result["magnet"].startswith("magnet:?xt=urn:btih:abcdef0123456789abcdef0123456789abcdef01&dn=ABC-001")
+    assert "&tr=" in result["magnet"]
+    assert result["published"] == datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert (result["size_bytes"], result["seeders"]) == (700 * 1024 ** 2, 12)
+
+
+def test_parse_nyaa_rss_stops_reading_chunks_after_max_results():
+    data = FakeNyaa.rss([(i, f"ABC-{i:03d}", i) for i in range(50)]).encode()
+    consumed = []
+
+    def chunks():
+        for start in range(0, len(data), 64):
+            consumed.append(start)
+            yield data[start:start + 64]
+
+    results = parse_nyaa_rss(chunks(), max_results=2)
+
+    assert [r["title"] for r in results] == ["ABC-000", "ABC-001"]
+    assert len(consumed) < len(data) // 64 / 2
+
+
+def test_rss_search_streams_feed_and_limits_results(local_server):
+    catalog = [(f"ABC-001 v{i}", i) for i in range(30)]
+    server = FakeNyaa(local_server, catalog)
+    results = scraper_for(server).search_keyword("ABC-001", max_results=5)
+
+    assert server.requests[0]["page"] == ["rss"]
+    assert [r["seeders"] for r in results] == [29, 28, 27, 26, 25]
+
+
+def test_find_new_releases_pages_through_html_with_rss_default(local_server):
+    catalog = [(f"[FHD] ABC-{n:03d}", 5) for n in range(1, 201)]
+    server = FakeNyaa(local_server, catalog)
+    releases = scraper_for(server, backend="rss").find_new_releases("ABC", last_number=20)
+
+    assert sorted(releases) == list(range(21, 201))
+    assert all("page" not in query for query in server.requests)
+    assert sorted(int(query["p"][0]) for query in server.requests) == [1, 2, 3]
@@ -0,0 +1,153 @@
+"""MediaDownloader：在支持/不支持 Range 的本地 HTTP 服务器上离线验证单流、分段与续传"""
+
+import os
+import json
+import asyncio
+import hashlib
+from datetime import datetime
+
+from core.media_downloader import MediaDownloader
+
+POSTED_AT = "2024-05-01T12:00:00+00:00"
+SEGMENT_SIZE = 1024
+
+
+class FakeMediaServer:
+    """按路径返回预置内容的本地服务器，可关闭 Range 支持或让指定分段返回 500"""
+
+    def __init__(self, local_server, files: dict, ranges: bool = True, failing_offsets: set = ()):
+        self.files = files
+        self.ranges = ranges
+        self.failing_offsets = set(failing_offsets)
+        self.requests = []
+        self.url = local_server(self.handle, protocol_version="HTTP/1.1")
+
+    def _headers(self, request, status: int, length: int, extra: dict = None):
+        request.send_response(status)
+        request.send_header("Content-Length", str(length))
+        if self.ranges:
+            request.send_header("Accept-Ranges", "bytes")
+        for name, value in (extra or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+
+    def handle(self, request):
+        body = self.files[request.path]
+        if request.command == "HEAD":
+            self.requests.append(("HEAD", request.path, None))
+            self._headers(request, 200, len(body))
+            return
+        range_header = request.headers.get("Range")
+        self.requests.append(("GET", request.path, range_header))
+        if not range_header or not self.ranges:
+            self._headers(request, 200, len(body))
+            request.wfile.write(body)
+            return
+        start, end = (int(v) for v in range_header.removeprefix("bytes=").split("-"))
+        if start in self.failing_offsets:
+            self._headers(request, 500, 0)
+            return
+        chunk = body[start:end + 1]
+        self._headers(request, 206, len(chunk), {"Content-Range": f"bytes {start}-{end}/{len(body)}"})
+        request.wfile.write(chunk)
+
+    def range_requests(self, path: str) -> list:
+        return [r[2] for r in self.requests if r[0] == "GET" and r[1] == path and r[2]]
+
+
+def tweet(base_url: str, path: str, media_type: str) -> dict:
+    return {"tweet_id": "100", "href": "/someone/status/100", "author": "someone", "datetime": POSTED_AT,
+            "media": [{"type": media_type, "url": f"{base_url}{path}"}]}
+
+
+def download(directory: str, record: dict) -> tuple[dict, list]:
+    items = []
+
+    async def on_file(item):
+        items.append(item)
+
+    async def run():
+        downloader = MediaDownloader(directory, "someone", max_retries=0, on_file=on_file)
+        downloader.SEGMENT_THRESHOLD = 4 * SEGMENT_SIZE
+        downloader.SEGMENT_SIZE = SEGMENT_SIZE
+        async with downloader:
+            return await downloader.download_tweets([record])
+
+    return asyncio.run(run()), items
+
+
+def test_photo_is_single_get_with_mtime_and_sha1(tmp_path, local_server):
+    body = os.urandom(3000)
+    server = FakeMediaServer(local_server, {"/photo.jpg": body})
+    outcome, items = download(str(tmp_path), tweet(server.url, "/photo.jpg", "photo"))
+
+    path = tmp_path / "100_1.jpg"
+    assert outcome == {"https://x.com/someone/status/100": True}
+    assert server.requests == [("GET", "/photo.jpg", None)]
+    assert path.read_bytes() == body
+    assert os.listdir(tmp_path) == ["100_1.jpg"]
+    assert os.path.getmtime(path) == datetime.fromisoformat(POSTED_AT).timestamp()
+    assert items[0].sha1 == hashlib.sha1(body).hexdigest()
+    assert (items[0].tweet_id, items[0].num, items[0].size) == ("100", 1, len(body))
+
+
+def test_large_video_is_fetched_in_range_segments(tmp_path, local_server):
+    body = os.urandom(5 * SEGMENT_SIZE + 100)
+    server = FakeMediaServer(local_server, {"/video.mp4": body})
+    outcome, items = download(str(tmp_path), tweet(server.url, "/video.mp4", "video"))
+
+    assert all(outcome.values())
+    assert (tmp_path / "100_1.mp4").read_bytes() == body
+    assert os.listdir(tmp_path) == ["100_1.mp4"]
+    assert sorted(server.range_requests("/video.mp4")) == sorted(
+        f"bytes={start}-{min(start + SEGMENT_SIZE, len(body)) - 1}" for start in range(0, len(body), SEGMENT_SIZE)
+    )
+    assert items[0].size == len(body) and items[0].sha1 is None
+
+
+def test_video_without_range_support_falls_back_to_single_stream(tmp_path, local_server):
+    body = os.urandom(5 * SEGMENT_SIZE)
+    server = FakeMediaServer(local_server, {"/video.mp4": body}, ranges=False)
+    outcome, _ = download(str(tmp_path), tweet(server.url, "/video.mp4", "video"))
+
+    assert all(outcome.values())
+    assert (tmp_path / "100_1.mp4").read_bytes() == body
+    assert [r[0] for r in server.requests] == ["HEAD", "GET"]
+    assert server.range_requests("/video.mp4") == []
+
+
+def test_failed_segment_keeps_progress_and_next_run_resumes(tmp_path, local_server):
+    body = os.urandom(5 * SEGMENT_SIZE)
+    target = tmp_path / "100_1.mp4"
+    # 并发 4 段，第 5 段要等前面某段完成后才开始，失败时至少有一段已记入进度
+    server = FakeMediaServer(local_server, {"/video.mp4": body}, failing_offsets={4 * SEGMENT_SIZE})
+    outcome, items = download(str(tmp_path), tweet(server.url, "/video.mp4", "video"))
+
+    assert outcome == {"https://x.com/someone/status/100": False}
+    assert not items and not target.exists()
+    with open(tmp_path / "100_1.mp4.part.json", encoding="utf-8") as f:
+        state = json.load(f)
+    assert 4 not in state["done"] and state["done"]
+
+    server = FakeMediaServer(local_server, {"/video.mp4": body})
+    outcome, _ = download(str(tmp_path), tweet(server.url, "/video.mp4", "video"))
+
+    assert all(outcome.values())
+    assert target.read_bytes() == body
+    assert os.listdir(tmp_path) == ["100_1.mp4"]
+    fetched = {int(r.removeprefix("bytes=").split("-")[0]) // SEGMENT_SIZE for r in server.range_requests("/video.mp4")}
+    assert fetched == set(range(5)) - set(state["done"])
+
+
+def test_resume_discards_sidecar_when_size_changes(tmp_path, local_server):
+    body = os.urandom(5 * SEGMENT_SIZE)
+    (tmp_path / "100_1.mp4.part").write_bytes(b"\0" * (4 * SEGMENT_SIZE))
+    (tmp_path / "100_1.mp4.part.json").write_text(
+        json.dumps({"size": 4 * SEGMENT_SIZE, "segment_size": SEGMENT_SIZE, "done": [0, 1, 2, 3]}))
+
+    server = FakeMediaServer(local_server, {"/video.mp4": body})
+    outcome, _ = download(str(tmp_path), tweet(server.url, "/video.mp4", "video"))
+
+    assert all(outcome.values())
+    assert (tmp_path / "100_1.mp4").read_bytes() == body
+    assert len(server.range_requests("/video.mp4")) == 5
@@ -0,0 +1,82 @@
+"""矩阵任务状态目录的合并"""
+
+import os
+import json
+import shutil
+
+from core.scan_state import HighWaterStore, ScanCheckpointStore
+from core.media_archive import MediaArchive
+from tasks.merge_state import merge_state
+
+
+def mark(tweet_id: str, since: str, scanned_at: str) -> dict:
+    return {"tweet_id": tweet_id, "datetime": scanned_at, "since": since, "scanned_at": scanned_at}
+
+
+def write_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def test_merge_combines_marks_media_and_checkpoints(tmp_path):
+    base = tmp_path / "state"
+    write_json(str(base / "high_water.json"), {
+        "alice": {"115": mark("10", "2026-01-01T00:00:00+00:00", "2026-02-01T00:00:00+00:00")},
+        "bob": {"115": mark("20", "2026-01-01T00:00:00+00:00", "2026-02-01T00:00:00+00:00")},
+    })
+    checkpoints = ScanCheckpointStore(str(base / "checkpoints"))
+    checkpoints.save("alice", "1年", {})
+    checkpoints.save("bob", "1年", {})
+    archive = MediaArchive(str(base / "media_archive.sqlite3"))
+    archive.add("1", 1, "115")
+    archive.close()
+
+    # 两个矩阵任务从同一份状态出发：A 处理 alice (扫描完成，删除断点)，B 处理 bob (断点更新)
+    part_a, part_b = tmp_path / "a", tmp_path / "b"
+    shutil.copytree(base, part_a)
+    shutil.copytree(base, part_b)
+    HighWaterStore(str(part_a / "high_water.json")).cover(
+        "alice", "115", "30", None, "2025-01-01T00:00:00+00:00", "2026-03-01T00:00:00+00:00")
+    ScanCheckpointStore(str(part_a / "checkpoints")).clear("alice")
+    archive_a = MediaArchive(str(part_a / "media_archive.sqlite3"))
+    archive_a.add("30", 1, "115")
+    archive_a.record_media_count("30", 2)
+    archive_a.close()
+    ScanCheckpointStore(str(part_b / "checkpoints")).save("bob", "1年", {"5": {}}, "2025-06-01T00:00:00+00:00")
+    archive_b = MediaArchive(str(part_b / "media_archive.sqlite3"))
+    archive_b.add("40", 1, "115")
+    archive_b.close()
+
+    merge_state(str(base), [str(part_a), str(part_b)])
+
+    high_water = HighWaterStore(str(base / "high_water.json"))
+    assert high_water.get("alice", "115")["tweet_id"] == "30"
+    assert high_water.get("alice", "115")["since"] == "2025-01-01T00:00:00+00:00"
+    assert high_water.get("bob", "115")["tweet_id"] == "20"
+
+    merged = ScanCheckpointStore(str(base / "checkpoints"))
+    assert merged.load("alice", "1年") is None
+    assert merged.load("bob", "1年")["tweets"] == {"5": {}}
+
+    archive = MediaArchive(str(base / "media_archive.sqlite3"))
+    try:
+        assert all(archive.contains(t, 1, "115") for t in ("1", "30", "40"))
+        assert archive.archived_tweet_ids(["30"], ["115"]) == set()
+    finally:
+        archive.close()
+
+
+def test_merge_into_empty_target_takes_every_source(tmp_path):
+    sources = []
+    for destination, tweet_id in (("115", "1"), ("quark", "2")):
+        source = tmp_path / destination
+        HighWaterStore(str(source / "high_water.json")).cover(
+            "alice", destination, tweet_id, None, "2026-01-01T00:00:00+00:00", "2026-02-01T00:00:00+00:00")
+        sources.append(str(source))
+
+    merge_state(str(tmp_path / "state"), sources)
+
+    high_water = HighWaterStore(str(tmp_path / "state" / "high_water.json"))
+    assert high_water.get("alice", "115")["tweet_id"] == "1"
+    assert high_water.get("alice", "quark")["tweet_id"] == "2"
@@ -0,0 +1,164 @@
+"""XTimelineClient 与时间线解析：在本地伪 GraphQL 服务器上离线验证"""
+
+import json
+import asyncio
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+from core.x_graphql import XTimelineClient, parse_timeline_payload, parse_tweet_result
+
+COOKIES = json.dumps([{"name": "ct0", "value": "csrf"}, {"name": "auth_token", "value": "token"}])
+
+
+def tweet_result(tweet_id: str, screen_name: str = "someone", media: list = None, **legacy) -> dict:
+    result = {
+        "__typename": "Tweet",
+        "rest_id": tweet_id,
+        "core": {"user_results": {"result": {"legacy": {"screen_name": screen_name}}}},
+        "legacy": {"id_str": tweet_id, "created_at": "Wed Oct 10 20:19:24 +0000 2018", **legacy},
+    }
+    if media is not None:
+        result["legacy"]["extended_entities"] = {"media": media}
+    return result
+
+
+def photo(name: str) -> dict:
+    return {"type": "photo", "media_url_https": f"https://pbs.twimg.com/media/{name}.jpg",
+            "original_info": {"width": 1200, "height": 800}}
+
+
+def timeline_page(results: list, bottom: str = None, pinned: dict = None) -> dict:
+    entries = [{"content": {"itemContent": {"tweet_results": {"result": r}}}} for r in results]
+    if bottom:
+        entries.append({"content": {"cursorType": "Bottom", "value": bottom}})
+    instructions = [{"type": "TimelineAddEntries", "entries": entries}]
+    if pinned:
+        instructions.insert(0, {"type": "TimelinePinEntry",
+                                "entry": {"content": {"itemContent": {"tweet_results": {"result": pinned}}}}})
+    return {"data": {"user": {"result": {"timeline": {"timeline": {"instructions": instructions}}}}}}
+
+
+class FakeGraphQL:
+    """按 GraphQL 操作名与游标返回预置分页的本地服务器"""
+
+    def __init__(self, local_server, pages: dict):
+        self.pages = pages
+        self.requests = []
+        self.url = local_server(self.handle) + "/i/api/graphql"
+
+    def handle(self, request):
+        parsed = urlparse(request.path)
+        operation = parsed.path.rsplit("/", 1)[-1]
+        variables = json.loads(parse_qs(parsed.query)["variables"][0])
+        self.requests.append((operation, variables, request.headers.get("x-csrf-token")))
+        if operation == "UserByScreenName":
+            body = {"data": {"user": {"result": {"__typename": "User", "rest_id": "42"}}}}
+        else:
+            body = self.pages[variables.get("cursor")]
+        data = json.dumps(body).encode()
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+
+async def collect(client_base: str) -> tuple[str, list]:
+    pages = []
+    async with XTimelineClient(COOKIES, api_base=client_base) as client:
+        user_id = await client.fetch_user_id("someone")
+        async for records, cursor in client.iter_timeline(user_id):
+            pages.append(([r["tweet_id"] for r in records], cursor))
+    return user_id, pages
+
+
+def test_client_follows_bottom_cursor_until_empty_page(local_server):
+    pages = {
+        None: timeline_page([tweet_result("3", media=[photo("c")]), tweet_result("2", media=[photo("b")])], "c1"),
+        "c1": timeline_page([tweet_result("1", media=[photo("a")])], "c2"),
+        "c2": timeline_page([], "c3"),
+    }
+    server = FakeGraphQL(local_server, pages)
+    user_id, collected = asyncio.run(collect(server.url))
+
+    assert user_id == "42"
+    assert collected == [(["3", "2"], "c1"), (["1"], "c2"), ([], "c3")]
+    timeline_requests = [r for r in server.requests if r[0] == "UserMedia"]
+    assert [r[1].get("cursor") for r in timeline_requests] == [None, "c1", "c2"]
+    assert all(r[1]["userId"] == "42" and r[2] == "csrf" for r in timeline_requests)
+
+
+def test_client_stops_when_cursor_repeats(local_server):
+    pages = {
+        None: timeline_page([tweet_result("2")], "same"),
+        "same": timeline_page([tweet_result("1")], "same"),
+    }
+    server = FakeGraphQL(local_server, pages)
+    _, collected = asyncio.run(collect(server.url))
+    assert collected == [(["2"], "same"), (["1"], "same")]
+
+
+def test_client_requires_csrf_cookie():
+    with pytest.raises(ValueError):
+        asyncio.run(XTimelineClient("[]", api_base="http://127.0.0.1:9").__aenter__())
+
+
+def test_retweet_uses_original_tweet_media_and_author():
+    original = tweet_result("100", screen_name="artist", media=[photo("orig")],
+                            created_at="Mon Jan 01 00:00:00 +0000 2024")
+    retweet = tweet_result("200", screen_name="someone", retweeted_status_result={"result": original})
+
+    record = parse_tweet_result(retweet)
+
+    assert record["tweet_id"] == "100"
+    assert record["is_retweet"] is True
+    assert record["author"] == "artist"
+    assert record["href"] == "/artist/status/100"
+    assert record["datetime"] == "2024-01-01T00:00:00+00:00"
+    assert record["has_photo"] and not record["has_video"]
+
+
+def test_visibility_wrapper_is_unwrapped():
+    wrapped = {"__typename": "TweetWithVisibilityResults", "tweet": tweet_result("7", media=[photo("x")])}
+    record = parse_tweet_result(wrapped)
+    assert record["tweet_id"] == "7"
+    assert record["is_retweet"] is False
+
+
+def test_tombstone_is_ignored():
+    tombstone = {"__typename": "TweetTombstone", "tombstone": {"text": {"text": "This Post is unavailable."}}}
+    assert parse_tweet_result(tombstone) is None
+
+    records, cursor = parse_timeline_payload(timeline_page([tombstone, tweet_result("5")], "next"))
+    assert [r["tweet_id"] for r in records] == ["5"]
+    assert cursor == "next"
+
+
+def test_video_keeps_mp4_variants_sorted_by_bitrate():
+    video = {
+        "type": "video",
+        "media_url_https": "https://pbs.twimg.com/ext_tw_video_thumb/1/pu/img/thumb.jpg",
+        "original_info": {"width": 1920, "height": 1080},
+        "video_info": {
+            "duration_millis": 12345,
+            "variants": [
+                {"content_type": "application/x-mpegURL", "url": "https://video.twimg.com/pl.m3u8"},
+                {"content_type": "video/mp4", "bitrate": 832000, "url": "https://video.twimg.com/low.mp4"},
+                {"content_type": "video/mp4", "bitrate": 2176000, "url": "https://video.twimg.com/high.mp4"},
+            ],
+        },
+    }
+    record = parse_tweet_result(tweet_result("9", media=[video]))
+    media = record["media"][0]
+
+    assert record["has_video"] and not record["has_photo"]
+    assert media["url"] == "https://video.twimg.com/high.mp4"
+    assert media["bitrate"] == 2176000
+    assert media["duration_ms"] == 12345
+    assert [v["bitrate"] for v in media["variants"]] == [2176000, 832000]
+
+
+def test_pinned_entry_is_flagged():
+    records, _ = parse_timeline_payload(timeline_page([tweet_result("2")], pinned=tweet_result("1")))
+    assert {r["tweet_id"]: r["pinned"] for r in records} == {"1": True, "2": False}
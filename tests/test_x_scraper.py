@@ -0,0 +1,257 @@
+"""XScraper：用预置的时间线与假 gallery-dl 离线验证下载前跳过、归档范围的推进与提前停止"""
+
+import os
+import json
+import asyncio
+from functools import partial
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core import x_scraper
+from core.x_scraper import XScraper
+from core.download_pool import GalleryDlPool
+from core.scan_state import HighWaterStore
+from core.media_archive import MediaArchive
+from core.media_manifest import MediaItem
+from core.media_policy import MediaPolicy
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("X_STATE_DIR", str(tmp_path / "state"))
+    # 失败推文的重试不等待
+    monkeypatch.setattr(x_scraper, "GalleryDlPool", partial(GalleryDlPool, backoff_seconds=0))
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = MediaArchive(str(tmp_path / "archive.sqlite3"))
+    yield archive
+    archive.close()
+
+
+def dom_tweet(tweet_id: str, hours_ago: float = 1, **fields) -> dict:
+    """DOM 模式的推文记录 (没有 media 列表)"""
+    posted_at = NOW - timedelta(hours=hours_ago)
+    return {"tweet_id": tweet_id, "datetime": posted_at.isoformat(), "has_photo": True, "has_video": False,
+            "href": f"/someone/status/{tweet_id}", "pinned": False, **fields}
+
+
+def scraper_for(tmp_path, timeline: list, stop_reason: str = "time_limit", **kwargs) -> XScraper:
+    """发现阶段直接返回 timeline 的 XScraper (不启动浏览器)"""
+    kwargs.setdefault("media_policy", MediaPolicy())
+    scraper = XScraper("someone", time_range="3天", download_root=str(tmp_path / "downloads"),
+                       browser_pool=object(), **kwargs)
+
+    async def scrape(pool):
+        tweets = scraper._collected_tweets({t["tweet_id"]: t for t in timeline})
+        scraper._record_scan_stats({"scrolls": 1, "wait_seconds": 0.0, "stop_reason": stop_reason}, tweets)
+        return list(tweets.values())
+
+    scraper._scrape_with_pool = scrape
+    return scraper
+
+
+def test_dom_tweet_count_from_gallery_dl_skips_second_run(tmp_path, archive, fake_gallery_dl):
+    fake_gallery_dl.tweets = {"100": [{"type": "photo"}, {"type": "photo"}]}
+    fake_gallery_dl.write()
+
+    first = scraper_for(tmp_path, [dom_tweet("100")], destination="115", archive=archive)
+    items = asyncio.run(first.fetch_media_files())
+    assert [(item.tweet_id, item.num, item.media_count) for item in items] == [("100", 1, 2), ("100", 2, 2)]
+    for item in items:
+        archive.add(item.tweet_id, item.num, "115")
+
+    second = scraper_for(tmp_path, [dom_tweet("100")], destination="115", archive=archive)
+    assert asyncio.run(second.fetch_media_files()) == []
+    assert second.skipped_tweet_ids == {"100"}
+    assert len(fake_gallery_dl.calls) == 1
+
+
+def test_failed_dom_tweet_does_not_record_count(tmp_path, archive, fake_gallery_dl):
+    fake_gallery_dl.tweets = {"100": [{"type": "photo"}]}
+    fake_gallery_dl.write()
+
+    scraper = scraper_for(tmp_path, [dom_tweet("100"), dom_tweet("101")], destination="115", archive=archive)
+    asyncio.run(scraper.fetch_media_files())
+
+    assert scraper.download_results == {"100": True, "101": False}
+    assert archive.connection.execute("SELECT tweet_id, media_count FROM tweets").fetchall() == [("100", 1)]
+
+
+def test_tweet_fully_rejected_by_gallery_dl_filter_does_not_pin_range(tmp_path, fake_gallery_dl):
+    fake_gallery_dl.tweets = {"100": [{"type": "photo", "width": 400, "height": 300}],
+                              "101": [{"type": "photo", "width": 2000, "height": 1500}]}
+    fake_gallery_dl.write()
+
+    scraper = scraper_for(tmp_path, [dom_tweet("100", hours_ago=2), dom_tweet("101")], destination="115",
+                          media_policy=MediaPolicy(min_image_width=1000))
+    items = asyncio.run(scraper.fetch_media_files())
+    scraper.mark_archived(items)
+
+    assert [item.tweet_id for item in items] == ["101"]
+    assert scraper.download_results == {"100": True, "101": True}
+    assert scraper.policy_skipped_ids == {"100"}
+    mark = scraper.high_water_store.get("someone", "115")
+    assert mark["tweet_id"] == "101"
+    assert mark["scanned_at"] == scraper.scan_started_at.isoformat()
+
+
+def test_each_user_gets_own_cookie_file_removed_after_download(tmp_path, fake_gallery_dl):
+    fake_gallery_dl.tweets = {"100": [{"type": "photo"}]}
+    fake_gallery_dl.write()
+    cookies = json.dumps([{"name": "auth_token", "value": "token", "domain": ".x.com"}])
+
+    scraper = scraper_for(tmp_path, [dom_tweet("100")], cookies_raw=cookies)
+    asyncio.run(scraper.fetch_media_files())
+
+    args = fake_gallery_dl.calls[0]
+    cookie_file = args[args.index("--cookies") + 1]
+    assert cookie_file == os.path.join(str(tmp_path / "downloads"), ".someone_cookies.txt")
+    assert not os.path.exists(cookie_file)
+
+
+def ago(days: float = 0, hours: float = 0) -> datetime:
+    return NOW - timedelta(days=days, hours=hours)
+
+
+def item(tweet_id: str, num: int = 1) -> MediaItem:
+    return MediaItem(path=f"{tweet_id}_{num}.jpg", tweet_id=tweet_id, num=num)
+
+
+def scanned(timeline: list, since: datetime, stop_reason: str = "time_limit", **kwargs) -> XScraper:
+    """发现阶段已结束、扫描从 NOW 连续覆盖到 since 的 XScraper"""
+    scraper = XScraper("someone", time_range="3天", media_policy=MediaPolicy(), **kwargs)
+    scraper.tweets = {t["tweet_id"]: t for t in timeline}
+    scraper.scan_stats = {"stop_reason": stop_reason, "reached_floor": stop_reason in XScraper.REACHED_FLOOR_STOP_REASONS}
+    scraper.scan_started_at = NOW
+    scraper.scanned_since = since
+    return scraper
+
+
+def cover(destination: str, tweet_id: str, posted_at: datetime, since: datetime, scanned_at: datetime):
+    HighWaterStore().cover("someone", destination, tweet_id, posted_at.isoformat(), since.isoformat(),
+                           scanned_at.isoformat())
+
+
+@pytest.mark.parametrize("case", ["upload_failed", "download_failed", "not_downloaded"])
+def test_unfinished_tweet_caps_range_upper_bound(case):
+    timeline = [dom_tweet("100", hours_ago=10), dom_tweet("101", hours_ago=5), dom_tweet("102", hours_ago=1)]
+    scraper = scanned(timeline, ago(days=3), destination="115")
+    archived, failed = [item("100"), item("102")], []
+    if case == "upload_failed":
+        failed = [item("101")]
+    elif case == "download_failed":
+        # 部分文件已上传，但有媒体下载失败
+        archived.append(item("101"))
+        scraper.download_results = {"100": True, "101": False, "102": True}
+
+    scraper.mark_archived(archived, failed)
+
+    mark = HighWaterStore().get("someone", "115")
+    assert mark["tweet_id"] == "100"
+    assert mark["since"] == ago(days=3).isoformat()
+    assert mark["scanned_at"] == timeline[1]["datetime"]
+
+
+def test_incomplete_scan_does_not_advance_range():
+    cover("115", "50", ago(days=4), ago(days=10), ago(days=2))
+    scraper = scanned([dom_tweet("100")], ago(days=3), stop_reason="stalled", destination="115")
+
+    scraper.mark_archived([item("100")])
+
+    assert HighWaterStore().get("someone", "115")["tweet_id"] == "50"
+
+
+def test_contiguous_range_is_merged_with_old_range():
+    cover("115", "50", ago(days=4), ago(days=10), ago(days=2))
+    scraper = scanned([dom_tweet("100")], ago(days=3), destination="115")
+
+    scraper.mark_archived([item("100")])
+
+    mark = HighWaterStore().get("someone", "115")
+    assert (mark["tweet_id"], mark["since"], mark["scanned_at"]) == ("100", ago(days=10).isoformat(), NOW.isoformat())
+    assert scraper.high_water["since"] == ago(days=10).isoformat()
+
+
+def test_disjoint_range_replaces_old_range():
+    # 旧范围止于 5 天前，本次只扫到 3 天前，中间 2 天未覆盖
+    cover("115", "50", ago(days=6), ago(days=10), ago(days=5))
+    scraper = scanned([dom_tweet("100")], ago(days=3), destination="115")
+
+    scraper.mark_archived([item("100")])
+
+    mark = HighWaterStore().get("someone", "115")
+    assert (mark["tweet_id"], mark["since"], mark["scanned_at"]) == ("100", ago(days=3).isoformat(), NOW.isoformat())
+
+
+def test_multiple_destinations_use_intersection_of_ranges():
+    cover("115", "90", ago(days=1.5), ago(days=10), ago(days=1))
+    cover("quark", "80", ago(days=2.5), ago(days=5), ago(days=2))
+
+    scraper = XScraper("someone", destinations=["115", "quark"], media_policy=MediaPolicy())
+
+    assert scraper.high_water["tweet_id"] == "80"
+    assert scraper.high_water["since"] == ago(days=5).isoformat()
+    assert scraper.high_water["scanned_at"] == ago(days=2).isoformat()
+    tweets = [
+        dom_tweet("85", hours_ago=53),                    # 晚于 quark 的最新推文
+        dom_tweet("70", hours_ago=72),                    # 两个范围都已覆盖
+        dom_tweet("60", hours_ago=144),                   # 早于 quark 的下界
+        dom_tweet("75", hours_ago=70, is_retweet=True),  # 转推不代表时间线位置
+    ]
+    assert [t["tweet_id"] for t in scraper._drop_archived(tweets)] == ["85", "60", "75"]
+    # 任一目的地没有记录时完整扫描
+    assert XScraper("someone", destinations=["115", "google"], media_policy=MediaPolicy()).high_water is None
+
+
+class FakeTimelineClient:
+    """按页返回预置推文的 XTimelineClient 替身，记录被取走的页数"""
+
+    pages = []
+    fetched = 0
+
+    def __init__(self, cookies_raw: str):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def fetch_user_id(self, username: str) -> str:
+        return "42"
+
+    async def iter_timeline(self, user_id: str, cursor: str = None):
+        for number, page in enumerate(self.pages, 1):
+            FakeTimelineClient.fetched += 1
+            yield page, f"cursor{number}"
+
+
+@pytest.mark.parametrize("since_days, stop_reason, pages, kept", [
+    # 已归档范围覆盖到时间下限 (3 天前)：翻到最新已归档推文即停止
+    (10, "high_water", 2, ["103", "102", "101"]),
+    # 范围只覆盖到 2 天前：继续翻页直到时间下限，只剔除范围内的推文
+    (2, "time_limit", 3, ["103", "102", "101", "99", "98"]),
+])
+def test_scan_stops_at_high_water_only_when_range_reaches_floor(monkeypatch, since_days, stop_reason, pages, kept):
+    FakeTimelineClient.pages = [
+        [dom_tweet("103", hours_ago=1), dom_tweet("102", hours_ago=2)],
+        [dom_tweet("101", hours_ago=3), dom_tweet("100", hours_ago=25)],
+        [dom_tweet("99", hours_ago=60), dom_tweet("98", hours_ago=96)],
+    ]
+    FakeTimelineClient.fetched = 0
+    monkeypatch.setattr(x_scraper, "XTimelineClient", FakeTimelineClient)
+    cover("115", "100", ago(hours=25), ago(days=since_days), ago(hours=12))
+
+    scraper = XScraper("someone", time_range="3天", discovery_mode="http", destination="115",
+                       media_policy=MediaPolicy())
+    tweets = asyncio.run(scraper.discover_tweets())
+
+    assert scraper.scan_stats["stop_reason"] == stop_reason
+    assert FakeTimelineClient.fetched == pages
+    assert [t["tweet_id"] for t in tweets] == kept